@@ -0,0 +1,17 @@
+import numpy as np
+
+
+def random_blobs(rng, batch_size: int, height: int, width: int, max_blobs: int = 6) -> np.ndarray:
+    """
+    Random probability maps of shape (batch_size, height, width, 1),
+    each of them contains up to `max_blobs` gaussian blobs,
+    so predictions and groundtruths have overlapping and touching boxes.
+    """
+    yy, xx = np.meshgrid(np.arange(height), np.arange(width), indexing='ij')
+    prob = np.zeros((batch_size, height, width, 1), dtype=np.float32)
+    for i in range(batch_size):
+        for _ in range(rng.integers(0, max_blobs + 1)):
+            cy, cx = rng.uniform(0, height), rng.uniform(0, width)
+            radius = rng.uniform(1, 6)
+            prob[i, ..., 0] = np.maximum(prob[i, ..., 0], np.exp(-((yy - cy)**2 + (xx - cx)**2) / (2 * radius**2)))
+    return prob
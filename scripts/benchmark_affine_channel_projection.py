@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark `AffineChannelProjection` against the two-layer path
+`SklearnStandardScaler` followed by `SklearnPCALayer`.
+
+If `--scaler-pca` is not given, a random scaler and PCA are used,
+which is enough to compare the speed of both paths.
+The projection folded from sklearn-like scaler and PCA, where the PCA has its own `mean_`,
+is also checked against `scaler.transform` followed by `pca.transform`.
+"""
+import argparse
+import numpy as np
+import tensorflow as tf
+import time
+from types import SimpleNamespace
+
+from tc_formation.data.scaler_pca import ScalerPCA, StreamingMoments
+from tc_formation.layers.affine_channel_projection import AffineChannelProjection
+from tc_formation.layers.sklearn_pca import SklearnPCALayer
+from tc_formation.layers.sklearn_standard_scaler import SklearnStandardScaler
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        '--scaler-pca',
+        dest='scaler_pca',
+        help='Path to the artifact saved by `ScalerPCA.save()`.')
+    parser.add_argument(
+        '--channels',
+        default=135,
+        type=int,
+        help='Number of input channels when using random scaler and PCA. Default to 135.')
+    parser.add_argument(
+        '--nb-pca',
+        dest='nb_pca',
+        default=32,
+        type=int,
+        help='Number of principal components when using random scaler and PCA. Default to 32.')
+    parser.add_argument(
+        '--batch-size',
+        dest='batch_size',
+        default=256,
+        type=int,
+        help='Batch size. Default to 256.')
+    parser.add_argument(
+        '--patch-size',
+        dest='patch_size',
+        default=31,
+        type=int,
+        help='Size (in grid points) of each patch. Default to 31.')
+    parser.add_argument(
+        '--iterations',
+        default=50,
+        type=int,
+        help='Number of timed iterations. Default to 50.')
+
+    return parser.parse_args(args)
+
+
+def random_scaler_pca(nb_channels: int, nb_pca: int) -> ScalerPCA:
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=(10000, nb_channels)) * rng.uniform(0.5, 10, nb_channels) + rng.normal(size=nb_channels)
+    return ScalerPCA.fit(StreamingMoments.from_values(values), nb_pca)
+
+
+def check_sklearn_pca_mean(scaler_pca: ScalerPCA) -> float:
+    """
+    :returns: max absolute difference to `(((x - scaler.mean_) / scaler.scale_) - pca.mean_) @ pca.components_.T`.
+    """
+    rng = np.random.default_rng(1)
+    nb_channels = len(scaler_pca.mean_)
+    pca = SimpleNamespace(
+        components_=scaler_pca.components_,
+        mean_=rng.normal(size=nb_channels),
+        explained_variance_=scaler_pca.explained_variance_)
+    x = rng.normal(size=(1000, nb_channels)) * scaler_pca.scale_ + scaler_pca.mean_
+
+    expected = ((x - scaler_pca.mean_) / scaler_pca.scale_ - pca.mean_) @ pca.components_.T
+    projection = AffineChannelProjection.from_sklearn(scaler_pca, pca)
+    return np.max(np.abs(projection(x.astype(np.float32)).numpy() - expected))
+
+
+def time_layer(layer, inputs: tf.Tensor, iterations: int) -> float:
+    fn = tf.function(layer)
+
+    # Warm up, so tracing is not timed.
+    fn(inputs).numpy()
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        outputs = fn(inputs)
+    outputs.numpy()
+    return (time.perf_counter() - start) / iterations
+
+
+def main(args=None):
+    args = parse_args(args)
+
+    scaler_pca = (ScalerPCA.load(args.scaler_pca)
+                  if args.scaler_pca is not None
+                  else random_scaler_pca(args.channels, args.nb_pca))
+    nb_channels = len(scaler_pca.mean_)
+
+    scaler = SklearnStandardScaler(scaler_pca)
+    pca = SklearnPCALayer(scaler_pca.components_)
+
+    def two_layers(x):
+        # The scaler keeps float64 means and stds, while the PCA layer is float32,
+        # so inputs have to be cast before and after scaling.
+        x = scaler.call(tf.cast(x, tf.float64))
+        return pca.call(tf.cast(x, tf.float32))
+
+    fused = AffineChannelProjection.from_sklearn(scaler_pca, scaler_pca)
+
+    inputs = tf.random.normal(
+        (args.batch_size, args.patch_size, args.patch_size, nb_channels), dtype=tf.float32)
+
+    max_diff = np.max(np.abs(fused(inputs).numpy() - two_layers(inputs).numpy()))
+    print(f'Max absolute difference: {max_diff:.3e}')
+    print(f'Max absolute difference to sklearn transforms with PCA mean: {check_sklearn_pca_mean(scaler_pca):.3e}')
+
+    two_layers_time = time_layer(two_layers, inputs, args.iterations)
+    fused_time = time_layer(fused, inputs, args.iterations)
+    print(f'Scaler + PCA: {two_layers_time * 1e3:.2f}ms/batch')
+    print(f'AffineChannelProjection: {fused_time * 1e3:.2f}ms/batch ({two_layers_time / fused_time:.2f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark `bb_evaluation.evaluate` against `bb.bb_confusion_matrix`
+called for each sample and each IoU threshold,
+and check that the `sequential` matching gives the same counts.
+"""
+import argparse
+import numpy as np
+import time
+
+try:
+    from .bb_benchmark_utils import *
+except ImportError:
+    from bb_benchmark_utils import *
+
+from tc_formation.metrics import bb
+from tc_formation.metrics import bb_evaluation
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        '--samples',
+        default=1460,
+        type=int,
+        help='Number of samples, default to a year of 6-hourly predictions.')
+    parser.add_argument(
+        '--height',
+        default=41,
+        type=int,
+        help='Height of the grid. Default to 41.')
+    parser.add_argument(
+        '--width',
+        default=161,
+        type=int,
+        help='Width of the grid. Default to 161.')
+    parser.add_argument(
+        '--iou-thresholds',
+        dest='iou_thresholds',
+        nargs='+',
+        default=[0.1, 0.2, 0.3, 0.4, 0.5],
+        type=float,
+        help='IoU thresholds. Default to 0.1 to 0.5.')
+
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    args = parse_args(args)
+
+    rng = np.random.default_rng(0)
+    y_true = random_blobs(rng, args.samples, args.height, args.width)
+    y_pred = random_blobs(rng, args.samples, args.height, args.width)
+
+    start = time.perf_counter()
+    old_counts = np.asarray([
+        [bb.bb_confusion_matrix(gt, pred, iou_threshold=threshold) for gt, pred in zip(y_true, y_pred)]
+        for threshold in args.iou_thresholds])
+    old_time = time.perf_counter() - start
+
+    for method in bb_evaluation.MATCHING_METHODS:
+        start = time.perf_counter()
+        _, aggregate = bb_evaluation.evaluate(y_true, y_pred, args.iou_thresholds, method=method)
+        new_time = time.perf_counter() - start
+        print(f'{method}: {old_time:.2f}s -> {new_time:.2f}s ({old_time / new_time:.1f}x)')
+        print(aggregate.to_string(index=False))
+
+        if method == 'sequential':
+            # (threshold, sample, [tp, tn, fp, fn]) summed over samples.
+            totals = old_counts.sum(axis=1)
+            same = (np.array_equal(totals[:, 0], aggregate['TP'].values)
+                    and np.array_equal(totals[:, 2], aggregate['FP'].values)
+                    and np.array_equal(totals[:, 3], aggregate['FN'].values))
+            print(f'Same counts as bb_confusion_matrix: {same}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark the graph-compatible `tf_iou_confusion_matrix` used by `BBoxesIoUMetric`
+against the previous implementation with `cv.findContours`
+(`BBoxesIoUMetric.iou_confusion_matrix`), and check that both give the same counts.
+
+Random blobs are drawn as discs on the grid,
+so predictions and groundtruths have overlapping and touching boxes.
+"""
+import argparse
+import numpy as np
+import tensorflow as tf
+import time
+
+try:
+    from .bb_benchmark_utils import *
+except ImportError:
+    from bb_benchmark_utils import *
+
+from tc_formation.metrics import bb
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        '--batch-size',
+        dest='batch_size',
+        default=64,
+        type=int,
+        help='Batch size. Default to 64.')
+    parser.add_argument(
+        '--height',
+        default=41,
+        type=int,
+        help='Height of the grid. Default to 41.')
+    parser.add_argument(
+        '--width',
+        default=161,
+        type=int,
+        help='Width of the grid. Default to 161.')
+    parser.add_argument(
+        '--iou-threshold',
+        dest='iou_threshold',
+        default=0.2,
+        type=float,
+        help='IoU threshold. Default to 0.2.')
+    parser.add_argument(
+        '--iterations',
+        default=10,
+        type=int,
+        help='Number of timed iterations. Default to 10.')
+
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    args = parse_args(args)
+
+    rng = np.random.default_rng(0)
+    y_true = random_blobs(rng, args.batch_size, args.height, args.width)
+    y_pred = random_blobs(rng, args.batch_size, args.height, args.width)
+
+    def old():
+        return bb.BBoxesIoUMetric.iou_confusion_matrix(
+            y_true, y_pred, iou_threshold=args.iou_threshold, pred_threshold=0.5)
+
+    new_fn = tf.function(lambda t, p: bb.tf_iou_confusion_matrix(t, p, iou_threshold=args.iou_threshold))
+    y_true_tf, y_pred_tf = tf.constant(y_true), tf.constant(y_pred)
+
+    def new():
+        return tuple(int(v) for v in new_fn(y_true_tf, y_pred_tf))
+
+    # Warm up, so tracing is not timed.
+    new_counts = new()
+    old_counts = old()
+    print(f'(tp, fp, fn): cv.findContours {old_counts}, tf {new_counts}')
+
+    start = time.perf_counter()
+    for _ in range(args.iterations):
+        old()
+    old_time = (time.perf_counter() - start) / args.iterations
+
+    start = time.perf_counter()
+    for _ in range(args.iterations):
+        new()
+    new_time = (time.perf_counter() - start) / args.iterations
+
+    print(f'cv.findContours: {old_time * 1e3:.2f}ms/batch')
+    print(f'tf: {new_time * 1e3:.2f}ms/batch ({old_time / new_time:.2f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark the polar transformations used by the polar analyzed vortex
+against the previous implementation with `scipy.ndimage.geometric_transform`,
+which evaluates a python callback for each output pixel.
+"""
+import argparse
+import numpy as np
+from scipy.ndimage import geometric_transform
+import time
+
+from tc_formation.vortex_removal import polar_transformations as pt
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        '--size',
+        default=20,
+        type=int,
+        help='Size (in grid points) of the TC region. Default to 20.')
+    parser.add_argument(
+        '--channels',
+        default=136,
+        type=int,
+        help='Number of channels. Default to 136.')
+    parser.add_argument(
+        '--iterations',
+        default=3,
+        type=int,
+        help='Number of timed iterations. Default to 3.')
+
+    return parser.parse_args(args)
+
+
+def geometric_cartesian_2_polar(img: np.ndarray, order=3):
+    h, w, c = img.shape
+    w_center = w / 2
+    h_center = h / 2
+    max_radius = int(np.sqrt(h*h + w*w) / 2.)
+
+    def _polar_2_cartesian_coords(polar_coords):
+        radius, theta, c = polar_coords
+        theta = theta * np.pi / 180
+        y = h_center - radius * np.sin(theta)
+        x = w_center + radius * np.cos(theta)
+        return y, x, c
+
+    return geometric_transform(
+        img,
+        _polar_2_cartesian_coords,
+        output_shape=(max_radius, 360, c),
+        order=order,
+        mode='constant',
+        cval=np.nan)
+
+
+def geometric_polar_2_cartesian(img: np.ndarray, original_img_shape: tuple[int, int, int], order=3):
+    h, w, _ = original_img_shape
+    h_center, w_center = h / 2, w / 2
+
+    def _cartesian_2_polar_coords(cartesian_coord):
+        y, x, c = cartesian_coord
+        radius = np.sqrt((h_center - y)**2 + (x - w_center)**2)
+        theta = np.arctan2(h_center - y, x - w_center)
+        theta = theta * 180. / np.pi
+        theta = theta if theta >= 0 else 360 + theta
+        return radius, theta, c
+
+    return geometric_transform(
+        img,
+        _cartesian_2_polar_coords,
+        output_shape=original_img_shape,
+        order=order,
+        mode='nearest')
+
+
+def time_fn(fn, iterations: int) -> tuple[float, np.ndarray]:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        result = fn()
+    return (time.perf_counter() - start) / iterations, result
+
+
+def main(args=None):
+    args = parse_args(args)
+
+    rng = np.random.default_rng(0)
+    img = rng.normal(size=(args.size, args.size, args.channels))
+
+    old_time, old_polar = time_fn(lambda: geometric_cartesian_2_polar(img), args.iterations)
+    new_time, new_polar = time_fn(lambda: pt.cartesian_2_polar(img), args.iterations)
+    print(f'cartesian_2_polar: {old_time * 1e3:.1f}ms -> {new_time * 1e3:.1f}ms ({old_time / new_time:.1f}x), '
+          f'max difference {np.nanmax(np.abs(old_polar - new_polar)):.3e}')
+
+    polar = np.nan_to_num(new_polar)
+    old_time, old_img = time_fn(lambda: geometric_polar_2_cartesian(polar, img.shape, order=1), args.iterations)
+    new_time, new_img = time_fn(lambda: pt.polar_2_cartesian(polar, img.shape, order=1), args.iterations)
+    print(f'polar_2_cartesian: {old_time * 1e3:.1f}ms -> {new_time * 1e3:.1f}ms ({old_time / new_time:.1f}x), '
+          f'max difference {np.max(np.abs(old_img - new_img)):.3e}')
+
+
+if __name__ == '__main__':
+    main()
@@ -2,19 +2,24 @@
 
 """
 This script is for detect and track storms candidate from NCEP FNL dataset.
-It uses Tempest Extremes' utilities to do so,
-specifically, it uses `DetectNodes` to detect storm candidates,
-and `StitchNodes` to merge these candidates across different times.
+Everything is done in-process by `tc_formation.detection`,
+which is the same as Tempest Extremes' utilities:
+storm candidates are detected as `DetectNodes` does,
+and these candidates are merged across different times as `StitchNodes` does.
+The output tracks are written as an IBTrACS .csv file,
+so it can be used as the best track of `create_labels_v2.py`.
 """
 
+from __future__ import annotations
+
 import argparse
-from datetime import datetime
 import glob
 import logging
-from multiprocessing import Pool
 import os
-import subprocess
-import tempfile
+import pandas as pd
+
+from tc_formation.detection import detect_nodes as dn
+from tc_formation.detection import stitch_nodes as sn
 
 
 logging.basicConfig(level=logging.INFO)
@@ -24,148 +29,91 @@ logger = logging.getLogger(__name__)
 def parse_arguments(args=None):
     parser = argparse.ArgumentParser()
 
-    parser.add_argument(
+    inputs = parser.add_mutually_exclusive_group(required=True)
+    inputs.add_argument(
         '--indir',
-        required=True,
         help='Path to directory contains all .nc files from NCEP FNL dataset.')
+    inputs.add_argument(
+        '--nodes',
+        nargs='+',
+        help='''
+        Path to already detected candidates, instead of detecting them from .nc files.
+        These can be `DetectNodes` output files (.dat),
+        or candidates saved by `--nodes-output` (.csv or .parquet).
+        ''')
     parser.add_argument(
         '--output',
         required=True,
         help='Path to output file')
+    parser.add_argument(
+        '--nodes-output',
+        dest='nodes_output',
+        help='Path to save the detected candidates, .dat files are in `DetectNodes` format.')
+    parser.add_argument(
+        '--processes',
+        type=int,
+        help='Number of processes to detect candidates. Default to the number of CPUs.')
+    parser.add_argument(
+        '--range',
+        default=8.0,
+        type=float,
+        help='Maximum distance (in degrees) between consecutive candidates of a track. Default to 8.0.')
+    parser.add_argument(
+        '--mintime',
+        default=54.0,
+        type=float,
+        help='Minimum duration (in hours) of a track. Default to 54.')
+    parser.add_argument(
+        '--maxgap',
+        default=24.0,
+        type=float,
+        help='Maximum time (in hours) between consecutive candidates of a track. Default to 24.')
 
     return parser.parse_args(args)
 
 
-def parse_date(nc_file_path: str) -> datetime:
-    filename, _ = os.path.splitext(os.path.basename(nc_file_path))
-    _, date, hour, minute, *_ = filename.split('_')
-    return datetime.strptime(f'{date}_{hour}_{minute}', '%Y%m%d_%H_%M')
-
-
-def add_time_dimension(nc_file_path: str) -> str:
-    """
-    Add time dimension to the given nc file
-    so that it can be processed properly by TempestExtremes's utilities.
-    The time dimension will be parsed from filename.
-    It will all so return the path to the new file with time dimension added.
-    Noted that the output file will be stored in current directory.
-    """
-    filename = os.path.basename(nc_file_path)
-    logger.info(f'\t ++ Adding time dimension to {filename}')
-
-    # Parse date from file path.
-    file_date = parse_date(nc_file_path)
-    date_str = file_date.strftime('%Y-%m-%d')
-    time_str = file_date.strftime('%H:%M:00')
+def detect_candidates(indir: str, processes: int | None, nodes_output: str | None) -> pd.DataFrame:
+    nc_files = sorted(glob.iglob(os.path.join(indir, '*.nc')))
+    logger.info(
+        f'=== Begin detecting low-pressure systems in the given {len(nc_files)} nc files\n'
+        '------------------------------------------------------------------')
+    nodes = pd.concat(dn.detect_nodes_in_files(nc_files, processes=processes), ignore_index=True)
 
-    add_time_output_file = f'tmp0_{file_date.strftime("%Y%m%d_%H_%M")}.nc'
-    set_time_output_file = f'tmp1_{file_date.strftime("%Y%m%d_%H_%M")}.nc'
+    if nodes_output is not None:
+        _, ext = os.path.splitext(nodes_output)
+        if ext == '.dat':
+            # Include times without any candidates, the same as `DetectNodes`.
+            dn.write_nodes_file(nodes, nodes_output, dates=[dn.parse_date(f) for f in nc_files])
+        elif ext == '.parquet':
+            nodes.to_parquet(nodes_output)
+        else:
+            nodes.to_csv(nodes_output, index=False)
 
-    # Add time dimension to nc file.
-    add_time_cmd = f'module load nco && ncecat -u time {nc_file_path} -O {add_time_output_file}'
-    subprocess.run(
-        add_time_cmd,
-        stdout=subprocess.DEVNULL,
-        stderr=subprocess.DEVNULL,
-        shell=True,
-        check=True)
-
-    # Set time dimension.
-    set_time_cmd = f'module load cdo && cdo -setreftime,{date_str},{time_str} -settaxis,{date_str},{time_str} {add_time_output_file} {set_time_output_file}'
-    subprocess.run(
-        set_time_cmd,
-        stdout=subprocess.DEVNULL,
-        stderr=subprocess.DEVNULL,
-        shell=True,
-        check=True)
-
-    logger.info(f'\t ++ DONE: Adding time dimension to {filename}')
-
-    return set_time_output_file
+    return nodes
 
 
 def main(args=None):
     arguments = parse_arguments(args)
 
-    # Make sure that we obtain the absolute path so that
-    # when we change to temporary directory,
-    # we can still work with files users given.
-    indir = os.path.abspath(arguments.indir)
-    output_path = os.path.abspath(arguments.output)
-
-    # Create temporary directory to store intermediate files.
-    with tempfile.TemporaryDirectory() as tmpdir:
-        logger.info(f'Changing working directory to {tmpdir} to avoid littering current directory.')
-
-        # Change working directory to `tmpdir` so that
-        # Tempest Extremes' utilities' intermediate files can be saved
-        # without populating user's working directory.
-        os.chdir(tmpdir)
-
-        # Add time dimension to the nc files.
-        nc_files = [os.path.join(indir, f) for f in glob.iglob(os.path.join(indir, '*.nc'))]
-        nb_files = len(nc_files)
-        logger.info(
-            f'=== Begin adding time dimension to the given {nb_files} nc files\n'
-            '---------------------------------------------------')
-        with Pool() as pool:
-            nc_files = pool.imap_unordered(add_time_dimension, nc_files)
-
-            # Make sure that the results are ordered.
-            nc_files = sorted(nc_files)
-
-        # Save these files to a text file so it can be processed by DetectNodes.
-        detect_nodes_inpath = 'DetectNodes_input.txt'
-        with open(detect_nodes_inpath, 'w') as detect_nodes_infile:
-            lines = [f'{f}\n' for f in nc_files]
-            detect_nodes_infile.writelines(lines)
-
-        # Call `DetectNodes` to process these files.
-        logger.info(
-            '=== Begin detecting low-pressure systems using `DetectNodes`\n'
-            '------------------------------------------------------------')
-        detect_nodes_out_prefix = 'DetectNodes_output'
-        subprocess.run(' '.join([
-                'DetectNodes',
-                 '--in_data_list', detect_nodes_inpath,
-                 '--out', detect_nodes_out_prefix,
-                 '--searchbymin pressfc',
-                 '--closedcontourcmd "pressfc,100.0,5.5,0"',
-                 '--mergedist 6.0',
-                 '--regional'
-             ]),
-            shell=True,
-            check=True)
-
-        # Since the above command output in separate text files,
-        # we have to put these text files into a list for `StitchNodes`.
-        stitch_nodes_inpath = 'StitchNodes_input.txt'
-        with open(stitch_nodes_inpath, 'w') as stitch_nodes_infile:
-            lines = [f'{detect_nodes_out_prefix}{i:06}.dat\n' for i in range(nb_files)]
-            stitch_nodes_infile.writelines(lines)
-
-        # Finally, call `StitchNodes` to process these files.
-        # But first, make sure that we can create the output file.
-        outputdir = os.path.dirname(output_path)
-        os.makedirs(outputdir, exist_ok=True)
-
-        # Now, we can let `StitchNodes` process our files.
-        logger.info(
-            '\n=== Begin connecting low-pressure systems to form tracks using `StitchNodes`\n'
-            '-----------------------------------------------------------------------------')
-        subprocess.run(' '.join([
-                'StitchNodes',
-                '--in_list', stitch_nodes_inpath,
-                '--out', output_path,
-                '--in_fmt "lon,lat"',
-                '--range 8.0',
-                '--mintime "54h"',
-                '--maxgap "24h"',
-                '--threshold "lat,<=,50.0,10;lat,>=,-50.0,10"'
-            ]),
-            shell=True,
-            check=True)
-
+    nodes = (detect_candidates(arguments.indir, arguments.processes, arguments.nodes_output)
+             if arguments.indir is not None
+             else sn.read_nodes(arguments.nodes))
+
+    logger.info(
+        '\n=== Begin connecting low-pressure systems to form tracks\n'
+        '---------------------------------------------------------')
+    track_ids = sn.stitch_nodes(
+        nodes,
+        max_range=arguments.range,
+        min_time_hours=arguments.mintime,
+        max_gap_hours=arguments.maxgap)
+    tracks = sn.nodes_to_tracks(nodes, track_ids)
+    logger.info(f'Found {tracks["SID"].nunique()} tracks from {len(nodes)} candidates.')
+
+    # Make sure that we can create the output file.
+    outputdir = os.path.dirname(os.path.abspath(arguments.output))
+    os.makedirs(outputdir, exist_ok=True)
+    sn.write_tracks(tracks, arguments.output)
 
 
 if __name__ == '__main__':
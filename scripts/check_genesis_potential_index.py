@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+"""
+Check that each per-parameter function of `genesis_potential_index`
+gives the same values as `genesis_potential_components()`,
+on the given observation file or on a random dataset.
+"""
+import argparse
+import numpy as np
+import xarray as xr
+
+from tc_formation.genesis_potential import genesis_potential_index as gpi
+
+
+# Per-parameter function of each component.
+PARAMETER_FUNCTIONS = dict(
+    vorticity=gpi.vorticity_parameter,
+    corriolis=gpi.corriolis_parameter,
+    vertical_shear=gpi.vertical_shear_parameter,
+    ocean_thermal=gpi.ocean_thermal_energy,
+    moist_stability=gpi.moist_stability_parameter,
+    relative_humidity=gpi.relative_humidity_parameter,
+    ocean_mask=gpi.ocean_mask,
+    thermal=gpi.thermal_parameter,
+    dynamic=gpi.dynamic_parameter,
+    gpi=gpi.genesis_potential_index,
+)
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        '--observation',
+        help='Path to an observation .nc file. Default to a random dataset.')
+
+    return parser.parse_args(args)
+
+
+def random_dataset() -> xr.Dataset:
+    rng = np.random.default_rng(0)
+    lev = np.asarray([1000, 950, 700, 600, 500, 200], dtype=np.float64)
+    lat = np.arange(5, 46, 1, dtype=np.float64)
+    lon = np.arange(100, 261, 1, dtype=np.float64)
+    shape_3d = (len(lev), len(lat), len(lon))
+    shape_2d = (len(lat), len(lon))
+
+    return xr.Dataset(
+        dict(
+            absvprs=(('lev', 'lat', 'lon'), rng.normal(0, 1e-4, shape_3d)),
+            ugrdprs=(('lev', 'lat', 'lon'), rng.normal(0, 10, shape_3d)),
+            vgrdprs=(('lev', 'lat', 'lon'), rng.normal(0, 10, shape_3d)),
+            hgtprs=(('lev', 'lat', 'lon'), rng.normal(3000, 2000, shape_3d)),
+            rhprs=(('lev', 'lat', 'lon'), rng.uniform(0, 100, shape_3d)),
+            tmpsfc=(('lat', 'lon'), rng.normal(300, 5, shape_2d)),
+        ),
+        coords=dict(lev=lev, lat=lat, lon=lon))
+
+
+def main(args=None):
+    args = parse_args(args)
+
+    if args.observation is not None:
+        ds = xr.load_dataset(args.observation, engine='netcdf4')
+    else:
+        ds = random_dataset()
+
+    components = gpi.genesis_potential_components(ds)
+    mismatches = []
+    for name, fn in PARAMETER_FUNCTIONS.items():
+        same = np.allclose(fn(ds), components[name], equal_nan=True)
+        print(f'{name}: {"OK" if same else "MISMATCH"}')
+        if not same:
+            mismatches.append(name)
+
+    assert not mismatches, f'Per-parameter functions differ from `genesis_potential_components()`: {mismatches}'
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+#!/bin/env python3
+
+"""
+This script computes the genesis potential index and all its components
+of a directory of `fnl_%Y%m%d_%H_%M.nc` observation files,
+and writes them as a single time series (see `tc_formation.genesis_potential.gpi_time_series`),
+optionally with monthly climatology of the components.
+
+Example:
+    scripts/create_genesis_potential_index.py \
+        --observations-dir <path_to_extracted_netcdf_output_dir> \
+        --output <path_to_gpi>.nc \
+        --climatology <path_to_gpi_climatology>.nc
+"""
+
+import argparse
+import glob
+import os
+from tc_formation.genesis_potential import gpi_time_series
+
+
+def parse_arguments(args=None):
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        '--observations-dir',
+        dest='observations_dir',
+        required=True,
+        help='Path to directory contains observation .nc files.')
+    parser.add_argument(
+        '--output', '-o',
+        required=True,
+        help='Path to the output time series, either .nc file or .zarr directory (requires `zarr`).')
+    parser.add_argument(
+        '--components',
+        nargs='+',
+        choices=gpi_time_series.TIME_COMPONENTS,
+        default=list(gpi_time_series.TIME_COMPONENTS),
+        help='Components to write. Default to all components.')
+    parser.add_argument(
+        '--climatology',
+        help='Path to write monthly climatology of the components as .nc file.')
+    parser.add_argument(
+        '--processes', '-p',
+        type=int,
+        default=8,
+        help='Number of parallel processes to use. Default is 8.')
+    parser.add_argument(
+        '--chunk-size',
+        dest='chunk_size',
+        type=int,
+        default=64,
+        help='Number of observation files computed at once by each process. Default is 64.')
+
+    return parser.parse_args(args)
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    paths = glob.glob(os.path.join(args.observations_dir, '*.nc'))
+
+    gpi_time_series.build_time_series(
+        paths,
+        args.output,
+        components=tuple(args.components),
+        processes=args.processes,
+        chunk_size=args.chunk_size,
+        climatology_path=args.climatology)
+    print(f'Created genesis potential index time series of {len(paths)} observations at {args.output}')
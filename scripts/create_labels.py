@@ -15,9 +15,11 @@ Update:
 import argparse
 from datetime import datetime, timedelta
 import glob
+import numpy as np
 import os
 import pandas as pd
 import re
+import tc_formation.data.label as tc_label
 from typing import Tuple, List
 
 
@@ -84,6 +86,17 @@ def parse_arguments(args=None):
         default=['DS', 'TC'],
         help='Only include best tracks from these storms type.')
 
+    parser.add_argument(
+        '--format',
+        dest='format',
+        choices=['csv', 'parquet'],
+        default='csv',
+        help='''
+        Output format of the label file. Default is csv.
+        Parquet stores list columns natively and dates as timestamps,
+        so loading the label doesn't have to parse python literals.
+        ''')
+
     return parser.parse_args(args)
 
 
@@ -249,74 +262,74 @@ def extract_tropical_cyclones_from_ibtracs_best_track(best_track_path: str, lati
     return pd.DataFrame(tc)
 
 
+def list_observations(observations_dir: str, observation_ranges: Tuple[datetime, datetime]) -> pd.DataFrame:
+    paths = glob.glob(os.path.join(observations_dir, '*.nc'))
+    observations = pd.DataFrame({
+        'Date': [parse_date_from_observation_filename(p) for p in paths],
+        'Path': paths,
+    })
+    in_range = (observation_ranges[0] <= observations['Date']) & (observations['Date'] <= observation_ranges[1])
+    return observations[in_range].reset_index(drop=True)
+
+
+def count_occurring_tc(dates: pd.Series, tc: pd.DataFrame) -> np.ndarray:
+    """
+    Count the number of TCs whose lifetime `[First Observed, Last Observed]` contains each date.
+    Since each lifetime is a closed interval,
+    this is the number of TCs first observed on or before the date,
+    minus the number of TCs last observed before the date.
+    """
+    dates = dates.values.astype('datetime64[ns]')
+    first_observed = np.sort(tc['First Observed'].values.astype('datetime64[ns]'))
+    last_observed = np.sort(tc['Last Observed'].values.astype('datetime64[ns]'))
+    return (np.searchsorted(first_observed, dates, side='right')
+            - np.searchsorted(last_observed, dates, side='left'))
+
+
 def create_labels(
         observations_dir: str,
         tc: pd.DataFrame,
         observation_ranges: Tuple[datetime, datetime],
         leadtimes: List[int]):
-    labels = []
-
-    for observation_filename in glob.iglob(os.path.join(observations_dir, '*.nc')):
-        observation_date = parse_date_from_observation_filename(observation_filename)
-        if not (observation_ranges[0] <= observation_date <= observation_ranges[1]):
-            continue
-
-        # Update version 3
-        # Add another column in the output for indicating whether the observation day has other TCs happening.
-        is_tc_occuring = (tc['First Observed'] <= observation_date) & (observation_date <= tc['Last Observed'])
-        is_tc_occuring = len(tc[is_tc_occuring]) > 0
-
-        has_tropical_cnt = 0
-
-        for leadtime in leadtimes:
-            next_leadtime = observation_date + timedelta(hours=leadtime)
-            has_tropical = tc['First Observed'] == next_leadtime
-            has_tropical_cnt += len(tc[has_tropical])
-
-            for _, tc_row in tc[has_tropical].iterrows():
-                observation_label = {
-                    'Date': observation_date,
-                    'TC': True,
-                    'TC Id': tc_row['Id'],
-                    'First Observed': tc_row['First Observed'],
-                    'Last Observed': tc_row['Last Observed'],
-                    'Latitude': tc_row['Latitude'],
-                    'Longitude': tc_row['Longitude'],
-                    'First Observed Type': tc_row['First Observed Type'],
-                    'Will Develop to TC': tc_row['Developing to TC'],
-                    'Developing Date': tc_row['Developing Date'],
-                    'Is Other TC Happening': is_tc_occuring, # v3
-                    'Path': observation_filename,
-                }
-                labels.append(observation_label)
-
-        if has_tropical_cnt == 0:
-            # Update version 2 for testing
-            # Instead of removing time where TC is happening,
-            # we will keep these days, but label it as negative,
-            # for the model to learn the pattern where TC is about to occur.
-            # if len(tc[is_tc_occuring]) == 0:
-            #     labels.append({
-            #         'Date': observation_date,
-            #         'TC': False,
-            #         'Path': observation_filename,
-            #     })
-            labels.append({
-                'Date': observation_date,
-                'TC': False,
-                'Path': observation_filename,
-                'Is Other TC Happening': is_tc_occuring, # v3
-            })
-
-    labels = pd.DataFrame(
-            labels,
-            columns=[
-                'Date', 'TC', 'TC Id', 'Is Other TC Happening',
-                'First Observed', 'Last Observed',
-                'Latitude', 'Longitude',
-                'First Observed Type', 'Will Develop to TC', 'Developing Date',
-                'Path'])
-    labels.sort_values(by='Date', inplace=True, ignore_index=True)
+    columns = [
+        'Date', 'TC', 'TC Id', 'Is Other TC Happening',
+        'First Observed', 'Last Observed',
+        'Latitude', 'Longitude',
+        'First Observed Type', 'Will Develop to TC', 'Developing Date',
+        'Path']
+
+    observations = list_observations(observations_dir, observation_ranges)
+
+    # Update version 3
+    # Add another column in the output for indicating whether the observation day has other TCs happening.
+    observations['Is Other TC Happening'] = count_occurring_tc(observations['Date'], tc) > 0
+
+    # Join observations with TCs first observed after each lead time.
+    tc = tc.rename(columns={
+        'Id': 'TC Id',
+        'Developing to TC': 'Will Develop to TC',
+    })
+    tc_columns = [
+        'TC Id', 'First Observed', 'Last Observed',
+        'Latitude', 'Longitude',
+        'First Observed Type', 'Will Develop to TC', 'Developing Date']
+    positives = []
+    for leadtime in leadtimes:
+        observations['First Observed'] = observations['Date'] + timedelta(hours=leadtime)
+        positives.append(observations.merge(tc[tc_columns], on='First Observed', how='inner'))
+    observations = observations.drop(columns='First Observed')
+    positives = pd.concat(positives, ignore_index=True)
+    positives['TC'] = True
+
+    # Update version 2 for testing
+    # Instead of removing time where TC is happening,
+    # we will keep these days, but label it as negative,
+    # for the model to learn the pattern where TC is about to occur.
+    negatives = observations[~observations['Path'].isin(positives['Path'])].copy()
+    negatives['TC'] = False
+
+    labels = pd.concat([positives, negatives], ignore_index=True).reindex(columns=columns)
+    labels.sort_values(by='Date', inplace=True, ignore_index=True, kind='stable')
     return labels
 
 # Update version 4:
@@ -332,23 +345,16 @@ def add_other_tc_happening_location(labels, best_track_from, best_track_path, la
     # mask &= (longitude_limits[0] < tc_df['LON']) & (tc_df['LON'] < longitude_limits[1])
     # tc_df = tc_df[mask]
 
-    # Loop through all day in the label,
-    # add another column for other tropical cyclones on that day.
-    other_tc_locations = []
-    for _, row in labels.iterrows():
-        if not row['Is Other TC Happening']:
-            other_tc_locations.append([])
-            continue
-
-        # Other TC happening in that day.
-        tc = tc_df[tc_df['ISO_TIME'] == row['Date']]
-        locations = [(r['LAT'], r['LON']) for _, r in tc.iterrows()]
-        # FIXME: this might happen when the storm temporarily move out of our domain of interest,
-        # comment this for now!
-        # assert len(locations) > 0, f'There may be something wrong with the script!! Check date: {row["Date"]}. Full row:\n{row}'
-        other_tc_locations.append(locations)
-
-    labels['Other TC Locations'] = other_tc_locations
+    # Group locations of all TCs by date once,
+    # then look up the locations of other TCs happening on each day in the label.
+    tc_df = tc_df.assign(Location=list(zip(tc_df['LAT'], tc_df['LON'])))
+    locations_by_date = tc_df.groupby('ISO_TIME', sort=False)['Location'].agg(list)
+
+    # FIXME: a day might have no locations when the storm temporarily move out of our domain of interest.
+    other_tc_locations = labels['Date'].map(locations_by_date)
+    labels['Other TC Locations'] = [
+        locations if happening and isinstance(locations, list) else []
+        for happening, locations in zip(labels['Is Other TC Happening'], other_tc_locations)]
     return labels
 
 
@@ -403,6 +409,6 @@ if __name__ == '__main__':
     leadtime_str = '_'.join(f'{l}h' for l in args.leadtime)
     basins_str = '_'.join(f'{b}' for b in args.basins)
     # Update version 4, please search in this file for comment what this version changes.
-    output_path = os.path.join(args.observations_dir, f'tc_{args.best_track_from}_{leadtime_str}_{basins_str}_v4.csv')
-    labels.to_csv(output_path, index=False)
+    output_path = os.path.join(args.observations_dir, f'tc_{args.best_track_from}_{leadtime_str}_{basins_str}_v4.{args.format}')
+    tc_label.write_label(labels, output_path, index=False)
     print(f'DONE: output to {output_path}')
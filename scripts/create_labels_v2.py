@@ -15,6 +15,7 @@ from datetime import datetime, timedelta
 import glob
 import os
 import pandas as pd
+import tc_formation.data.label as tc_label
 from tqdm import tqdm
 import xarray as xr
 
@@ -48,6 +49,17 @@ def parse_arguments(args=None):
         type=int,
         help='The lead time to generate the data. Default is 0h.')
 
+    parser.add_argument(
+        '--format',
+        dest='format',
+        choices=['csv', 'parquet'],
+        default='csv',
+        help='''
+        Output format of the label file. Default is csv.
+        Parquet stores list columns natively and dates as timestamps,
+        so loading the label doesn't have to parse python literals.
+        ''')
+
     return parser.parse_args(args)
 
 
@@ -196,8 +208,8 @@ def main(args=None):
 
     labels_df = create_labels(files_genesis_df, best_track_df)
     output_path = os.path.join(
-        args.observations_dir, f'tc_{args.leadtime}h.csv')
-    labels_df.to_csv(output_path)
+        args.observations_dir, f'tc_{args.leadtime}h.{args.format}')
+    tc_label.write_label(labels_df, output_path)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,60 @@
+#!/bin/env python3
+
+"""
+This script converts a directory of `fnl_%Y%m%d_%H_%M.nc` observation files
+into a memory-mapped observation store (see `tc_formation.data.observation_store`),
+so data loaders can read observations as zero-copy slices
+instead of decoding netcdf files for every sample.
+
+Example:
+    scripts/create_observation_store.py \
+        --observations-dir <path_to_extracted_netcdf_output_dir> \
+        --subset "{'absvprs': [900, 750], 'rhprs': [750], 'capesfc': True}" \
+        --output-dir <path_to_store>
+"""
+
+import argparse
+from ast import literal_eval
+from collections import OrderedDict
+from tc_formation.data.observation_store import ObservationStore
+
+
+def parse_arguments(args=None):
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        '--observations-dir',
+        dest='observations_dir',
+        required=True,
+        help='Path to directory contains observation .nc files.')
+    parser.add_argument(
+        '--subset',
+        required=True,
+        help='''
+        Variables and pressure levels to extract, as python dictionary literal,
+        for instance: "{'absvprs': [900, 750], 'capesfc': True}"
+        ''')
+    parser.add_argument(
+        '--output-dir', '-o',
+        dest='output_dir',
+        required=True,
+        help='Path to directory to store the observation store.')
+    parser.add_argument(
+        '--processes', '-p',
+        type=int,
+        default=8,
+        help='Number of parallel processes to use. Default is 8.')
+
+    return parser.parse_args(args)
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    subset = OrderedDict(literal_eval(args.subset))
+
+    store = ObservationStore.build(
+        args.observations_dir,
+        args.output_dir,
+        subset,
+        processes=args.processes)
+    print(f'Created observation store with shape {store.shape} at {args.output_dir}')
@@ -9,9 +9,11 @@ from __future__ import annotations
 import argparse
 from datetime import datetime, timedelta
 import glob
+import numpy as np
 import os
 import pandas as pd
 import re
+import tc_formation.data.label as tc_label
 
 
 def parse_arguments(args=None):
@@ -32,9 +34,10 @@ def parse_arguments(args=None):
     parser.add_argument(
         '--time-range',
         dest='time_range',
+        nargs='+',
         type=int,
-        default=24,
-        help='Time ranges to produce label. Must dividable to 6.')
+        default=[24],
+        help='Time ranges to produce label, each must be dividable to 6. Multiple time ranges will produce multiple label files.')
 
     parser.add_argument(
         '--exclude-0h',
@@ -50,6 +53,13 @@ def parse_arguments(args=None):
         default=False,
         help='Whether we should prepend additional class for the case no genesis in the next given hours. Default is False, which means no additional class will be added.')
 
+    parser.add_argument(
+        '--format',
+        dest='output_format',
+        choices=['csv', 'parquet'],
+        default='csv',
+        help='Output format of the label file. Default is csv. Parquet stores list columns natively instead of python literals.')
+
     return parser.parse_args(args)
 
 
@@ -120,71 +130,106 @@ def extract_tc_genesis(ibtracs: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFram
     return genesis_df, remaining_df
 
 
-def create_range_output(
-        reanalysis_files: pd.DataFrame,
-        ibtracs: pd.DataFrame,
-        time_range: int,
-        exclude_0h: bool,
-        include_no_genesis_class: bool) -> pd.DataFrame:
-    assert time_range % 6 == 0, f'Invalid time range, {time_range} must dividable by 6'
-    genesis_df, remaining_df = extract_tc_genesis(ibtracs)
-
-    df = []
-    for _, reanalysis in reanalysis_files.iterrows():
-        genesis_gt = []
-        genesis_loc = []
-        genesis_sid = []
+def _group_by_date(df: pd.DataFrame, values: list) -> pd.Series:
+    """
+    Group `values` (one per row of `df`) by date into lists,
+    preserving the order of rows within each date.
+    """
+    return pd.Series(values, index=df.index, dtype=object).groupby(df['Date'], sort=False).agg(list)
 
-        reanalysis_date = reanalysis['Date']
 
-        # First, check if we have TC genesis in our time ranges.
-        for tidx in range(1 if exclude_0h else 0, time_range // 6 + 1):
-            future_date = reanalysis_date + timedelta(hours=tidx * 6)
-            matched = genesis_df['Date'] == future_date
+def _lookup_by_date(grouped: pd.Series, dates: pd.Series) -> list[list]:
+    values = grouped.reindex(dates.values).tolist()
+    return [v if isinstance(v, list) else [] for v in values]
 
-            loc = []
-            sid = []
-            genesis_gt.append(1 if matched.sum() > 0 else 0)
-            for _, row in genesis_df[matched].iterrows():
-                loc.append((row['Latitude'], row['Longitude']))
-                sid.append(row['SID'])
 
-            genesis_loc.append(loc)
-            genesis_sid.append(sid)
+def create_range_outputs(
+        reanalysis_files: pd.DataFrame,
+        ibtracs: pd.DataFrame,
+        time_ranges: list[int],
+        exclude_0h: bool,
+        include_no_genesis_class: bool) -> dict[int, pd.DataFrame]:
+    """
+    Create outputs for multiple time ranges at once.
+    TC genesis and other TCs are grouped by date once,
+    then joined with the reanalysis dates at each 6-hour offset.
+    """
+    for time_range in time_ranges:
+        assert time_range % 6 == 0, f'Invalid time range, {time_range} must dividable by 6'
 
-        # Second, prepend a flag to let the model know if we don't have any TC genesis.
+    genesis_df, remaining_df = extract_tc_genesis(ibtracs)
+    genesis_loc_by_date = _group_by_date(
+        genesis_df, list(zip(genesis_df['Latitude'], genesis_df['Longitude'])))
+    genesis_sid_by_date = _group_by_date(genesis_df, genesis_df['SID'].tolist())
+    other_tc_by_date = _group_by_date(
+        remaining_df, list(zip(remaining_df['SID'], remaining_df['Latitude'], remaining_df['Longitude'])))
+
+    dates = reanalysis_files['Date']
+
+    # First, check if we have TC genesis at each offset of the longest time range,
+    # shorter time ranges just take the first few offsets.
+    offsets = range(1 if exclude_0h else 0, max(time_ranges) // 6 + 1)
+    genesis_loc = [_lookup_by_date(genesis_loc_by_date, dates + timedelta(hours=tidx * 6)) for tidx in offsets]
+    genesis_sid = [_lookup_by_date(genesis_sid_by_date, dates + timedelta(hours=tidx * 6)) for tidx in offsets]
+    genesis_gt = np.stack(
+        [(dates + timedelta(hours=tidx * 6)).isin(genesis_df['Date']).values for tidx in offsets],
+        axis=1).astype(np.int64).reshape((len(dates), len(offsets)))
+
+    # Then, check if we have other mature tropical cyclones in current observation.
+    other_tcs = _lookup_by_date(other_tc_by_date, dates)
+
+    outputs = {}
+    for time_range in time_ranges:
+        nb_offsets = len(range(1 if exclude_0h else 0, time_range // 6 + 1))
+        gt = genesis_gt[:, :nb_offsets]
+
+        # Prepend a flag to let the model know if we don't have any TC genesis.
         if include_no_genesis_class:
-            genesis_gt = [0 if sum(genesis_gt) > 0 else 1] + genesis_gt
-
-        # Third, check if we have other mature tropical cyclones in current observation.
-        matched = remaining_df['Date'] == reanalysis_date
-        other_tcs = []
-        for _, row in remaining_df[matched].iterrows():
-            other_tcs.append((row['SID'], row['Latitude'], row['Longitude']))
-
-        # Finally, store our observations info.
-        df.append(dict(
-            Date=reanalysis_date,
-            Genesis=genesis_gt,
-            Genesis_Location=genesis_loc,
-            Genesis_SID=genesis_sid,
+            gt = np.concatenate([(gt.sum(axis=1, keepdims=True) == 0).astype(np.int64), gt], axis=1)
+
+        outputs[time_range] = pd.DataFrame(dict(
+            Date=dates.values,
+            Genesis=gt.tolist(),
+            Genesis_Location=[[locs[i] for locs in genesis_loc[:nb_offsets]] for i in range(len(dates))],
+            Genesis_SID=[[sids[i] for sids in genesis_sid[:nb_offsets]] for i in range(len(dates))],
             Other_TC=other_tcs,
-            Path=reanalysis['Path']
+            Path=reanalysis_files['Path'].values,
         ))
 
-    return pd.DataFrame(df)
+    return outputs
 
 
-def save_groundtruth(gt: pd.DataFrame, *, output_dir: str, time_range: int, exclude_0h: bool, include_no_genesis_class: bool) -> None:
+def create_range_output(
+        reanalysis_files: pd.DataFrame,
+        ibtracs: pd.DataFrame,
+        time_range: int,
+        exclude_0h: bool,
+        include_no_genesis_class: bool) -> pd.DataFrame:
+    return create_range_outputs(
+        reanalysis_files,
+        ibtracs,
+        time_ranges=[time_range],
+        exclude_0h=exclude_0h,
+        include_no_genesis_class=include_no_genesis_class)[time_range]
+
+
+def save_groundtruth(gt: pd.DataFrame, *, output_dir: str, time_range: int, exclude_0h: bool, include_no_genesis_class: bool, output_format: str = 'csv') -> None:
     def create_output_name():
         exclude_0h_info = 'no_0h' if exclude_0h else 'with_0h'
         exclude_genesis_info = 'with_genesis_class' if include_no_genesis_class else 'no_genesis_class'
         time_range_info = f'{time_range}h'
 
-        return f'tc_time_range_{time_range_info}_{exclude_0h_info}_{exclude_genesis_info}.csv'
+        return f'tc_time_range_{time_range_info}_{exclude_0h_info}_{exclude_genesis_info}.{output_format}'
 
     output_path = os.path.join(output_dir, create_output_name())
-    gt.to_csv(output_path, index=False)
+    if tc_label.is_parquet(output_path):
+        # Other TCs are (SID, lat, lon) tuples of mixed types,
+        # so they are stored as structs.
+        gt = gt.copy()
+        gt['Other_TC'] = [[dict(SID=sid, Latitude=lat, Longitude=lon) for sid, lat, lon in other_tcs]
+                          for other_tcs in gt['Other_TC']]
+
+    tc_label.write_label(gt, output_path, index=False)
 
 
 def main(args=None):
@@ -193,20 +238,21 @@ def main(args=None):
     latitudes, longitudes = parse_latitudes_longitudes_from_reanalysis_dir(args.reanalysis_data)
     ibtracs_df = load_ibtracs(args.best_track, latitudes=latitudes, longitudes=longitudes)
     reanalysis_df = list_reanalysis_files(args.reanalysis_data)
-    gt = create_range_output(
+    outputs = create_range_outputs(
             reanalysis_df,
             ibtracs_df,
-            time_range=args.time_range,
+            time_ranges=args.time_range,
             exclude_0h=args.exclude_0h,
             include_no_genesis_class=args.include_no_genesis_class)
 
-    save_groundtruth(
-        gt,
-        output_dir=args.reanalysis_data,
-        time_range=args.time_range,
-        exclude_0h=args.exclude_0h,
-        include_no_genesis_class=args.include_no_genesis_class)
-
+    for time_range, gt in outputs.items():
+        save_groundtruth(
+            gt,
+            output_dir=args.reanalysis_data,
+            time_range=time_range,
+            exclude_0h=args.exclude_0h,
+            include_no_genesis_class=args.include_no_genesis_class,
+            output_format=args.output_format)
 
 if __name__ == '__main__':
     main()
@@ -20,12 +20,11 @@ from collections import OrderedDict, namedtuple
 from datetime import datetime, timedelta
 from functools import reduce
 import glob
-from multiprocessing import Pool
 import numpy as np
 import os
 import pandas as pd
+from tc_formation.binary_classifications.data.patch_extraction import genesis_mask, sliding_window_patches
 import tensorflow as tf
-from tqdm import tqdm
 import xarray as xr
 
 
@@ -103,6 +102,7 @@ def parse_args(args=None):
         required=True,
         help='Path to output file.')
 
+    add_sharding_arguments(parser)
     return parser.parse_args(args)
 
 
@@ -122,55 +122,41 @@ def extract_dataset_samples(args: ProcessArgs) -> list[str]:
     row, domain_size, stride, all_variables, no_capesfc = args
     ds = xr.load_dataset(row['Path'], engine='netcdf4')
     lat, lon = ds['lat'].values, ds['lon'].values
-    latmin, latmax = lat.min(), lat.max()
-    lonmin, lonmax = lon.min(), lon.max()
-
     g_lat, g_lon = row['LAT'], row['LON']
 
     variables_order = list(VARIABLES_ORDER)
     if all_variables and no_capesfc:
         variables_order.remove('capesfc')
 
-    results = []
-    for lt in np.arange(latmin, latmax, stride):
-        for ln in np.arange(lonmin, lonmax, stride):
-            if ((lt + domain_size) > latmax) or ((ln + domain_size) > lonmax):
-                continue
-
-            if g_lat is None:
-                genesis = False
-            else:
-                if not isinstance(g_lat, list):
-                    g_lat = [g_lat]
-                    g_lon = [g_lon]
-
-                genesis = any(
-                    (lt < glt < lt + domain_size) and (ln < gln < ln + domain_size)
-                    for glt, gln in zip(g_lat, g_lon))
-
-            patch = ds.sel(lat=slice(lt, lt + domain_size), lon=slice(ln, ln + domain_size))
-            patch = (extract_subset(patch, SUBSET)
-                     if not all_variables
-                     else extract_all_variables(patch, variables_order))
-            patch_example = to_example(
-                patch, np.asarray([lt, ln]), genesis, row['Path'])
-            results.append(patch_example.SerializeToString())
+    # Extract variables of the full domain once,
+    # then all patches are just windows over it.
+    values = (extract_subset(ds, SUBSET)
+              if not all_variables
+              else extract_all_variables(ds, variables_order))
+    patches, origins = sliding_window_patches(values, lat, lon, domain_size, stride)
+    genesis = (np.zeros(len(origins), dtype=bool)
+               if g_lat is None
+               else genesis_mask(origins, domain_size, g_lat, g_lon))
+
+    results = [
+        to_example(patch, origin, bool(is_genesis), row['Path']).SerializeToString()
+        for patch, origin, is_genesis in zip(patches, origins, genesis)]
 
     return results
 
 
 def extract_dataset_samples_parallel(
         genesis_df: pd.DataFrame, outputfile: str, *,
-        domain_size: float, stride: float, processes: int, desc: str, all_variables: bool, no_capesfc: bool):
-    with Pool(processes) as pool:
-        tasks = pool.imap_unordered(
-            extract_dataset_samples, 
-            (ProcessArgs(r, domain_size, stride, all_variables, no_capesfc) for _, r in genesis_df.iterrows()))
-
-        with tf.io.TFRecordWriter(outputfile) as writer:
-            for results in tqdm(tasks, total=len(genesis_df), desc=desc):
-                for r in results:
-                    writer.write(r)
+        domain_size: float, stride: float, processes: int, desc: str, all_variables: bool, no_capesfc: bool,
+        shards: int = None, compression: str = None):
+    write_tfrecords(
+        extract_dataset_samples,
+        [ProcessArgs(r, domain_size, stride, all_variables, no_capesfc) for _, r in genesis_df.iterrows()],
+        outputfile,
+        processes=processes,
+        desc=desc,
+        shards=shards,
+        compression=compression)
 
 
 def main(args=None):
@@ -237,7 +223,9 @@ def main(args=None):
             domain_size=args.domain_size, stride=args.stride,
             processes=args.processes, desc=desc,
             all_variables=args.all_variables,
-            no_capesfc=args.no_capesfc)
+            no_capesfc=args.no_capesfc,
+            shards=args.shards,
+            compression=args.compression)
 
 
 if __name__ == '__main__':
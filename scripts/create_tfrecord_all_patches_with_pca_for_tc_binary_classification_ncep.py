@@ -5,8 +5,11 @@ This script will extract all patches in a .nc file from NCEP/FNL data
 to create binary genesis classification dataset in tfrecords format
 and also perform PCA on the data.
 
-PCA is first performed on train dataset using sklearn Incremental PCA,
+The standard scaler and PCA are fitted on train dataset
+from the mean and covariance accumulated in a single parallel pass,
 then applied to other datasets.
+The fitted scaler and PCA are saved with `ScalerPCA.save()`,
+which can be loaded by `SklearnStandardScaler.load()` and `SklearnPCALayer.load()`.
 """
 try:
     from .tc_binary_classification_helpers import *
@@ -25,12 +28,11 @@ from datetime import datetime, timedelta
 from functools import reduce
 import glob
 from multiprocessing import Pool
-from multiprocessing.pool import ThreadPool
 import numpy as np
 import os
 import pandas as pd
-from sklearn.decomposition import IncrementalPCA
-from sklearn.preprocessing import StandardScaler
+from tc_formation.binary_classifications.data.patch_extraction import genesis_mask, sliding_window_patches
+from tc_formation.data.scaler_pca import ScalerPCA, StreamingMoments
 import tensorflow as tf
 from tqdm import tqdm
 import xarray as xr
@@ -92,7 +94,14 @@ def parse_args(args=None):
         '--outfile',
         required=True,
         help='Path to output file.')
+    parser.add_argument(
+        '--scaler-pca',
+        dest='scaler_pca',
+        help='Path to the fitted scaler and PCA (.npz). '
+             'If the file exists, it is reused instead of fitting again. '
+             'Default to <outfile>_scaler_pca.npz')
 
+    add_sharding_arguments(parser)
     return parser.parse_args(args)
 
 
@@ -117,46 +126,26 @@ def to_example(value: np.ndarray, pos: np.ndarray, genesis: bool, path: str):
     return tf.train.Example(features=tf.train.Features(feature=feature))
 
 
-ProcessArgs = namedtuple('ProcessArgs', ['row', 'domain_size', 'stride', 'scaler', 'pca'])
+ProcessArgs = namedtuple('ProcessArgs', ['row', 'domain_size', 'stride', 'scaler_pca'])
 def extract_dataset_samples(args: ProcessArgs) -> list[str]:
-    row, domain_size, stride, scaler, pca = args
+    row, domain_size, stride, scaler_pca = args
     ds = xr.load_dataset(row['Path'], engine='netcdf4')
     lat, lon = ds['lat'].values, ds['lon'].values
-    latmin, latmax = lat.min(), lat.max()
-    lonmin, lonmax = lon.min(), lon.max()
-
     g_lat, g_lon = row['LAT'], row['LON']
 
-    results = []
-    for lt in np.arange(latmin, latmax, stride):
-        for ln in np.arange(lonmin, lonmax, stride):
-            if ((lt + domain_size) > latmax) or ((ln + domain_size) > lonmax):
-                continue
-
-            if g_lat is None:
-                genesis = False
-            else:
-                if not isinstance(g_lat, list):
-                    g_lat = [g_lat]
-                    g_lon = [g_lon]
-
-                genesis = any(
-                    (lt < glt < lt + domain_size) and (ln < gln < ln + domain_size)
-                    for glt, gln in zip(g_lat, g_lon))
-
-            patch = ds.sel(lat=slice(lt, lt + domain_size), lon=slice(ln, ln + domain_size))
-            patch = extract_all_variables(patch, VARIABLES_ORDER)
-
-            # Reshape patch so that we can perform PCA.
-            patch_original_shape = patch.shape
-            patch = patch.reshape((-1, patch_original_shape[-1]))
-            patch = scaler.transform(patch)
-            patch = pca.transform(patch)
-            patch = patch.reshape(tuple(patch_original_shape[:2]) + (-1,))
-
-            patch_example = to_example(
-                patch, np.asarray([lt, ln]), genesis, row['Path'])
-            results.append(patch_example.SerializeToString())
+    # Extract and transform all variables of the full domain once,
+    # then all patches are just windows over it,
+    # so overlapping grid points are not transformed again.
+    values = extract_all_variables(ds, VARIABLES_ORDER)
+    values = scaler_pca.transform(values)
+    patches, origins = sliding_window_patches(values, lat, lon, domain_size, stride)
+    genesis = (np.zeros(len(origins), dtype=bool)
+               if g_lat is None
+               else genesis_mask(origins, domain_size, g_lat, g_lon))
+
+    results = [
+        to_example(patch, origin, bool(is_genesis), row['Path']).SerializeToString()
+        for patch, origin, is_genesis in zip(patches, origins, genesis)]
 
     return results
 
@@ -164,51 +153,39 @@ def extract_dataset_samples(args: ProcessArgs) -> list[str]:
 def extract_dataset_samples_parallel(
         genesis_df: pd.DataFrame, outputfile: str, *,
         domain_size: float, stride: float, processes: int, desc: str,
-        scaler: StandardScaler, pca: IncrementalPCA):
-    with Pool(processes) as pool:
-        tasks = pool.imap_unordered(
-            extract_dataset_samples, 
-            (ProcessArgs(r, domain_size, stride, scaler, pca)
-             for _, r in genesis_df.iterrows()))
-
-        with tf.io.TFRecordWriter(outputfile) as writer:
-            for results in tqdm(tasks, total=len(genesis_df), desc=desc):
-                for r in results:
-                    writer.write(r)
-
-
-def load_path(path: str):
+        scaler_pca: ScalerPCA,
+        shards: int = None, compression: str = None):
+    write_tfrecords(
+        extract_dataset_samples,
+        [ProcessArgs(r, domain_size, stride, scaler_pca) for _, r in genesis_df.iterrows()],
+        outputfile,
+        processes=processes,
+        desc=desc,
+        shards=shards,
+        compression=compression)
+
+
+def file_moments(path: str) -> StreamingMoments:
     ds = xr.load_dataset(path, engine='netcdf4')
     values = extract_all_variables(ds, VARIABLES_ORDER)
-    nb_variables = values.shape[-1]
-    return values.reshape(-1, nb_variables)
+    return StreamingMoments.from_values(values)
 
 
-def perform_pca(genesis_df: pd.DataFrame, n_components: int, scaler: StandardScaler):
+def fit_scaler_pca(genesis_df: pd.DataFrame, n_components: int, processes: int) -> ScalerPCA:
+    """
+    Fit standard scaler and PCA by reading each file only once:
+    moments of each file are computed in parallel, then merged.
+    """
     files = genesis_df['Path'].unique()
-    pca = IncrementalPCA(n_components)
-
-    with ThreadPool(4) as pool:
-        tasks = pool.imap_unordered(load_path, files)
+    moments = None
 
-        for values in tqdm(tasks, total=len(files), desc='PCA'):
-            values = scaler.transform(values)
-            pca.partial_fit(values)
-
-    return pca
-
-
-def standard_scaler(genesis_df: pd.DataFrame):
-    files = genesis_df['Path'].unique()
-    scaler = StandardScaler()
-
-    with ThreadPool(4) as pool:
-        tasks = pool.imap_unordered(load_path, files)
+    with Pool(processes) as pool:
+        tasks = pool.imap_unordered(file_moments, files)
 
-        for values in tqdm(tasks, total=len(files), desc='Standard Scaler'):
-            scaler.partial_fit(values)
+        for m in tqdm(tasks, total=len(files), desc='Scaler & PCA'):
+            moments = m if moments is None else moments.merge(m)
 
-    return scaler
+    return ScalerPCA.fit(moments, n_components)
 
 
 def main(args=None):
@@ -254,15 +231,24 @@ def main(args=None):
     val_genesis_df = genesis_df[(dates >= TRAIN_DATE_END) & (dates < VAL_DATE_END)]
     test_genesis_df = genesis_df[dates > VAL_DATE_END]
 
-    scaler = standard_scaler(train_genesis_df)
-    pca = perform_pca(train_genesis_df, args.nb_pca, scaler)
-    print(f'{args.nb_pca} chosen principal components explain {pca.explained_variance_ratio_.sum()}')
-    print(pca.explained_variance_ratio_)
-
     # Create output directories.
     outdir = os.path.dirname(outfile)
     os.makedirs(outdir, exist_ok=True)
 
+    scaler_pca_path = args.scaler_pca
+    if scaler_pca_path is None:
+        scaler_pca_path = f'{os.path.splitext(outfile)[0]}_scaler_pca.npz'
+
+    if os.path.isfile(scaler_pca_path):
+        scaler_pca = ScalerPCA.load(scaler_pca_path)
+        assert scaler_pca.n_components == args.nb_pca, f'{scaler_pca_path} has {scaler_pca.n_components} components.'
+    else:
+        scaler_pca = fit_scaler_pca(train_genesis_df, args.nb_pca, args.processes)
+        scaler_pca.save(scaler_pca_path)
+
+    print(f'{args.nb_pca} chosen principal components explain {scaler_pca.explained_variance_ratio_.sum()}')
+    print(scaler_pca.explained_variance_ratio_)
+
     tasks = [
         ('Train', train_genesis_df),
         ('Val', val_genesis_df),
@@ -283,8 +269,9 @@ def main(args=None):
             stride=args.stride,
             processes=args.processes,
             desc=desc,
-            pca=pca,
-            scaler=scaler)
+            scaler_pca=scaler_pca,
+            shards=args.shards,
+            compression=args.compression)
 
 
 if __name__ == '__main__':
@@ -18,12 +18,10 @@ import argparse
 from collections import namedtuple
 from datetime import datetime, timedelta
 import glob
-from multiprocessing import Pool
 import numpy as np
 import os
 import pandas as pd
 import tensorflow as tf
-from tqdm import tqdm
 import xarray as xr
 
 
@@ -78,6 +76,7 @@ def parse_args(args=None):
         required=True,
         help='Path to output file.')
 
+    add_sharding_arguments(parser)
     return parser.parse_args(args)
 
 
@@ -164,15 +163,14 @@ def main(args=None):
     genesis_df = genesis_df[genesis_df['Date_file'] < args.till_date]
 
     # Process these files in parallel.
-    with Pool(args.processes) as pool:
-        tasks = pool.imap_unordered(
-            convert_nc_file_to_tfrecord,
-            [ProcessArgs(row, args.no_capesfc) for _, row in genesis_df.iterrows()])
-
-        assert not os.path.isfile(outfile), f'Output file exists! {outfile=}'
-        with tf.io.TFRecordWriter(outfile) as writer:
-            for result in tqdm(tasks, total=len(genesis_df), desc='Extracting'):
-                writer.write(result)
+    write_tfrecords(
+        convert_nc_file_to_tfrecord,
+        [ProcessArgs(row, args.no_capesfc) for _, row in genesis_df.iterrows()],
+        outfile,
+        processes=args.processes,
+        desc='Extracting',
+        shards=args.shards,
+        compression=args.compression)
 
 
 if __name__ == '__main__':
@@ -15,6 +15,8 @@ import os
 from tqdm.auto import tqdm
 import xarray as xr
 
+from tc_formation.binary_classifications.data.patch_extraction import patch_origins
+
 
 def parse_arguments(args=None):
     parser = argparse.ArgumentParser()
@@ -61,24 +63,26 @@ def extract_patches(args: ExtractPatchesArgs):
     ds = xr.load_dataset(path, engine='netcdf4')
 
     lat, lon = ds['lat'].values, ds['lon'].values
-    minlat, maxlat = lat.min(), lat.max()
-    minlon, maxlon = lon.min(), lon.max()
-
-    for domain_lower_lat in np.arange(minlat, maxlat, stride):
-        domain_upper_lat = domain_lower_lat + domain_size
-
-        for domain_lower_lon in np.arange(minlon, maxlon, stride):
-            domain_upper_lon = domain_lower_lon + domain_size
-
-            if (domain_upper_lat <= maxlat) and (domain_upper_lon <= maxlon):
-                patch = ds.sel(
-                    lat=slice(domain_lower_lat, domain_upper_lat),
-                    lon=slice(domain_lower_lon, domain_upper_lon))
-
-                # Save patch.
-                outfilename = f'{filename}_{domain_lower_lat:.2f}_{domain_lower_lon:.2f}{ext}'
-                outpath = os.path.join(args.outdir, outfilename)
-                patch.to_netcdf(outpath, format='NETCDF4')
+    lat_origins, lon_origins = patch_origins(lat, lon, domain_size, stride)
+
+    # Index ranges of all patches are computed at once,
+    # they are the same as `ds.sel(lat=slice(origin, origin + domain_size))`.
+    lat_starts = np.searchsorted(lat, lat_origins, side='left')
+    lat_stops = np.searchsorted(lat, lat_origins + domain_size, side='right')
+    lon_starts = np.searchsorted(lon, lon_origins, side='left')
+    lon_stops = np.searchsorted(lon, lon_origins + domain_size, side='right')
+
+    # Each patch is still written as its own netcdf file.
+    for lower_lat, lat_start, lat_stop in zip(lat_origins, lat_starts, lat_stops):
+        for lower_lon, lon_start, lon_stop in zip(lon_origins, lon_starts, lon_stops):
+            patch = ds.isel(
+                lat=slice(lat_start, lat_stop),
+                lon=slice(lon_start, lon_stop))
+
+            # Save patch.
+            outfilename = f'{filename}_{lower_lat:.2f}_{lower_lon:.2f}{ext}'
+            outpath = os.path.join(args.outdir, outfilename)
+            patch.to_netcdf(outpath, format='NETCDF4')
 
 
 def should_keep_file(path: str, keep_hours: list[int]):
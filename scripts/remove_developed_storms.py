@@ -14,6 +14,7 @@ from multiprocessing import Pool
 import os
 import pandas as pd
 from shutil import copyfile
+from tc_formation.data.best_track_index import BestTrackIndex
 import tc_formation.vortex_removal.vortex_removal as vr
 from tqdm import tqdm
 import xarray as xr
@@ -48,41 +49,59 @@ def parse_arguments(args=None):
         default=4,
         help='Number of parallel processes to use.',
     )
+    parser.add_argument(
+        '--batch-size', '-b',
+        dest='batch_size',
+        type=int,
+        default=16,
+        help='Number of files to remove vortex at once in each process.',
+    )
+    parser.add_argument(
+        '--analyzed-vortex',
+        dest='analyzed_vortex',
+        choices=vr.ANALYZED_VORTEX_METHODS,
+        default='gaussian',
+        help='How to obtain the analyzed vortex field. Default to gaussian.',
+    )
 
     return parser.parse_args(args)
 
 
 DevelopedStormsRemovalArgs = namedtuple(
     'DevelopedStormsRemovalArgs',
-    ['filepath', 'developed_storms_locations', 'storm_radius', 'outdir'])
+    ['filepaths', 'developed_storms_locations', 'storm_radius', 'analyzed_vortex', 'outdir'])
 def remove_developed_storms_if_necessary(args: DevelopedStormsRemovalArgs):
-    path = args.filepath
-    output_path = os.path.join(args.outdir, os.path.basename(path))
-
-    storms_locations = args.developed_storms_locations
-    if len(storms_locations) == 0:
-        # If there is not developed storms in the domain,
-        # then just copy the file to the output folder.
-        copyfile(path, output_path)
-    else:
-        data = xr.open_dataset(path, engine='netcdf4')
-        data = vr.remove_vortex_ds(data, storms_locations, args.storm_radius)
+    output_paths = [os.path.join(args.outdir, os.path.basename(path)) for path in args.filepaths]
+
+    batch = []
+    for path, output_path, storms_locations in zip(args.filepaths, output_paths, args.developed_storms_locations):
+        if len(storms_locations) == 0:
+            # If there is not developed storms in the domain,
+            # then just copy the file to the output folder.
+            copyfile(path, output_path)
+        else:
+            batch.append((path, output_path, storms_locations))
+
+    # Files with developed storms are processed together.
+    datasets = [xr.open_dataset(path, engine='netcdf4') for path, _, _ in batch]
+    datasets = vr.remove_vortex_ds_batch(
+        datasets, [storms_locations for _, _, storms_locations in batch], args.storm_radius,
+        analyzed_vortex=args.analyzed_vortex)
+    for data, (_, output_path, _) in zip(datasets, batch):
         data.to_netcdf(output_path)
 
-    return output_path
+    return output_paths
 
 
 def find_developed_storms(files_df: pd.DataFrame, developed_storms_df: pd.DataFrame) -> pd.DataFrame:
-    results = []
+    index = BestTrackIndex.from_dataframe(developed_storms_df, lat_column='Lat', lon_column='Lon')
 
-    for _, file_row in files_df.iterrows():
-        storms_in_the_day = developed_storms_df[developed_storms_df['Date'] == file_row['Date']]
-        developed_storms_locations = [
-            (row['Lat'], row['Lon']) for _, row in storms_in_the_day.iterrows()
-        ]
+    results = []
+    for path, date in zip(files_df['Path'], files_df['Date']):
+        lats, lons = index.positions_at(date)
         results.append({
-            'Path': file_row['Path'],
-            'Storms Locations': developed_storms_locations,
+            'Path': path,
+            'Storms Locations': list(zip(lats, lons)),
         })
 
     return pd.DataFrame(results)
@@ -147,14 +166,22 @@ def main(args=None):
     # Create output directory.
     os.makedirs(args.outdir)
 
+    paths = files_with_developed_storms_df['Path'].tolist()
+    storms_locations = files_with_developed_storms_df['Storms Locations'].tolist()
     with Pool(args.processes) as pool:
         tasks = pool.imap_unordered(
             remove_developed_storms_if_necessary,
-            [DevelopedStormsRemovalArgs(row['Path'], row['Storms Locations'], args.radius, args.outdir)
-             for _, row in files_with_developed_storms_df.iterrows()])
-
-        for _ in tqdm(tasks, total=len(files_with_developed_storms_df), desc='Removing Vortex'):
-            pass
+            [DevelopedStormsRemovalArgs(
+                paths[i:i + args.batch_size],
+                storms_locations[i:i + args.batch_size],
+                args.radius,
+                args.analyzed_vortex,
+                args.outdir)
+             for i in range(0, len(paths), args.batch_size)])
+
+        with tqdm(total=len(paths), desc='Removing Vortex') as pbar:
+            for output_paths in tasks:
+                pbar.update(len(output_paths))
 
 
 if __name__ == '__main__':
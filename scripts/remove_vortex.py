@@ -1,9 +1,9 @@
 import argparse
-from ast import literal_eval
 from multiprocessing import Pool
 import os
 import pandas as pd
 from shutil import copyfile
+import tc_formation.data.label as tc_label
 from tc_formation.vortex_removal import vortex_removal as vr
 import xarray as xr
 
@@ -15,7 +15,7 @@ def parse_arguments(args=None):
             '--label', '-l',
             type=str,
             required=True,
-            help='Path to .csv label file.',
+            help='Path to .csv or .parquet label file.',
     )
     parser.add_argument(
             '--output-dir', '-o',
@@ -36,54 +36,77 @@ def parse_arguments(args=None):
             default=4,
             help='Number of parallel processes to use.',
     )
+    parser.add_argument(
+            '--batch-size', '-b',
+            dest='batch_size',
+            type=int,
+            default=16,
+            help='Number of files to apply the removal algorithm at once in each process.',
+    )
     parser.add_argument(
             '--overwrite',
             type=bool,
             default=False,
             help='Overwrite the contents inside output directory.'
     )
+    parser.add_argument(
+            '--analyzed-vortex',
+            dest='analyzed_vortex',
+            choices=vr.ANALYZED_VORTEX_METHODS,
+            default='gaussian',
+            help='How to obtain the analyzed vortex field. Default to gaussian.',
+    )
 
     return parser.parse_args(args)
 
 
-def remove_vortex_if_necessary(row, output_dir, radius):
+def remove_vortex_if_necessary(rows, output_dir, radius, analyzed_vortex):
     """
-    If `row`'s other TC column is not empty,
+    For each of `rows`, if its other TC column is not empty,
     this function will apply the vortex removal algorithm and
     write results to `output_dir`.
     Otherwise, this will just copy netcdf file to output directory.
+    Files that need vortex removal are processed together as a batch.
 
     Returns
     -------
-        str
-           Path to output file. 
+        list[str]
+           Path to output files.
     """
-    path = row['Path']
-    output_path = os.path.join(output_dir, os.path.basename(path))
-
-    if len(row['Other TC Locations']) == 0:
-        copyfile(path, output_path)
-    else:
-        data = xr.open_dataset(path, engine='netcdf4')
-        print(radius)
-        data = vr.remove_vortex_ds(data, row['Other TC Locations'], radius)
+    output_paths = [os.path.join(output_dir, os.path.basename(row['Path'])) for row in rows]
+
+    batch = []
+    for row, output_path in zip(rows, output_paths):
+        if len(row['Other TC Locations']) == 0:
+            copyfile(row['Path'], output_path)
+        else:
+            batch.append((row, output_path))
+
+    datasets = [xr.open_dataset(row['Path'], engine='netcdf4') for row, _ in batch]
+    datasets = vr.remove_vortex_ds_batch(
+        datasets, [row['Other TC Locations'] for row, _ in batch], radius,
+        analyzed_vortex=analyzed_vortex)
+    for data, (_, output_path) in zip(datasets, batch):
         data.to_netcdf(output_path)
 
-    return output_path
+    return output_paths
 
 
-def process_file(row, output_dir, radius):
-    output_path = remove_vortex_if_necessary(row, output_dir, radius)
-    row['Path'] = output_path
-    return row
+def process_files(rows, output_dir, radius, analyzed_vortex):
+    output_paths = remove_vortex_if_necessary(rows, output_dir, radius, analyzed_vortex)
+    for row, output_path in zip(rows, output_paths):
+        row['Path'] = output_path
+    return rows
 
 
 if __name__ == '__main__':
     args = parse_arguments()
 
-    # Read .csv label file.
-    label = pd.read_csv(args.label)
-    label['Other TC Locations'] = label['Other TC Locations'].apply(literal_eval)
+    # Read .csv or .parquet label file.
+    label = (tc_label.read_parquet_label(args.label)
+             if tc_label.is_parquet(args.label)
+             else pd.read_csv(args.label))
+    label['Other TC Locations'] = tc_label.parse_locations(label['Other TC Locations'])
 
     # Make sure that the label file has the required column.
     assert 'Other TC Locations' in label.columns, 'Required label file v4+.'
@@ -91,14 +114,16 @@ if __name__ == '__main__':
     # Create output directory.
     os.makedirs(args.output_dir, exist_ok=args.overwrite)
 
-    # Process these files in parallel.
+    # Process these files in parallel, in batches of files.
+    rows = [row for _, row in label.iterrows()]
     with Pool(args.processes) as p:
-        processed_rows = p.starmap(
-                process_file,
-                [(row, args.output_dir, args.radius)
-                 for _, row in label.iterrows()])
+        processed_batches = p.starmap(
+                process_files,
+                [(rows[i:i + args.batch_size], args.output_dir, args.radius, args.analyzed_vortex)
+                 for i in range(0, len(rows), args.batch_size)])
+    processed_rows = [row for batch in processed_batches for row in batch]
 
     # Save the output
     df = pd.DataFrame(processed_rows)
     df = df.sort_values('Date')
-    df.to_csv(os.path.join(args.output_dir, os.path.basename(args.label)))
+    tc_label.write_label(df, os.path.join(args.output_dir, os.path.basename(args.label)))
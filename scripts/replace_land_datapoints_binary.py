@@ -6,28 +6,16 @@ Only work with binary datasets.
 from __future__ import annotations
 
 import argparse
-import cartopy.io.shapereader as shpreader
-import fiona
-from functools import wraps
 import glob
 from itertools import chain
 import os
 from multiprocessing import Pool
 import numpy as np
-import shapely.geometry as sgeom
-from shapely.prepared import prep
+from tc_formation.utils.land_sea_mask import LandSeaMask
 from tqdm.autonotebook import tqdm
 import xarray as xr
 
 
-def vectorized(otypes):
-    def _vectorized_decorator(func):
-        vectorized_fn = np.vectorize(func, otypes=otypes)
-        return wraps(func)(vectorized_fn)
-
-    return _vectorized_decorator
-
-
 def parse_arguments(args=None):
     parser = argparse.ArgumentParser()
 
@@ -37,37 +25,9 @@ def parse_arguments(args=None):
     return parser.parse_args(args)
 
 
-@vectorized([sgeom.Point])
-def create_points(lon, lat):
-    return sgeom.Point(lon, lat)
-
-
-@vectorized([bool])
-def is_point_on_ocean(ocean, point: sgeom.Point):
-    return ocean.contains(point)
-
-
-def ocean():
-    geoms = fiona.open(
-        shpreader.natural_earth(
-            resolution='110m',
-            category='physical',
-            name='ocean'))
-    ocean_geom = sgeom.MultiPolygon(
-        [sgeom.shape(geom['geometry'])
-        for geom in geoms])
-    ocean = prep(ocean_geom)
-    return np.array([ocean])
-
-
 def generate_ocean_mask(ds: xr.Dataset):
-    lat = ds['lat'].values
-    lon = ds['lon'].values
-    # Convert lon to what to be expected by Natural Earth
-    lon = np.where(lon < 180, lon, lon - 360)
-    xx, yy = np.meshgrid(lon, lat)
-    points = create_points(xx, yy)
-    return is_point_on_ocean(ocean(), points)
+    # The mask is rasterized once per grid, and reused for all files.
+    return LandSeaMask.for_grid(ds['lat'].values, ds['lon'].values, source='natural_earth').ocean
 
 
 def replace_land_data_points_with_avg_ocean_value(args: tuple[str, str]):
@@ -5,17 +5,15 @@ from __future__ import annotations
 
 
 import abc
-import cartopy.io.shapereader as shpreader
 from collections import namedtuple
 from dataclasses import dataclass
 from datetime import datetime, timedelta
-import fiona
 import glob
 import numpy as np
 import os
 import pandas as pd
-import shapely.geometry as sgeom
-from shapely.prepared import prep
+from tc_formation.data.best_track_index import BestTrackIndex
+from tc_formation.utils.land_sea_mask import LandSeaMask
 import time
 import xarray as xr
 
@@ -179,22 +177,9 @@ def is_position_in_dataset(pos: Position, ds: xr.Dataset) -> bool:
 
 
 def is_position_on_ocean(pos: Position) -> bool:
-    # TODO: check if this is correct??
-    geoms = fiona.open(
-                shpreader.natural_earth(
-                    resolution='110m', category='physical', name='ocean'))
-
-    ocean_geom = sgeom.MultiPolygon([sgeom.shape(geom['geometry'])
-                                    for geom in geoms])
-
-    ocean = prep(ocean_geom)
-
-    # Due to Natural Earth's longitude is from -180W to 180E,
-    # and our longitude is from 0 to 360, we have to convert
-    # to what Natural Earth's longitude.
-    lon = pos.lon if pos.lon < 180 else pos.lon - 360
-
-    return ocean.contains(sgeom.Point(lon, pos.lat))
+    # The ocean geometry is rasterized once into a global mask,
+    # so this is just an array lookup.
+    return LandSeaMask.global_mask(source='natural_earth').is_ocean(pos.lat, pos.lon)
 
 
 def suggest_negative_patch_center(pos_center: Position, distances: list[float], ds: xr.Dataset) -> Position:
@@ -228,23 +213,11 @@ def suggest_negative_patch_center(pos_center: Position, distances: list[float],
     raise ValueError('Cannot suggest negative center. Please check your code again!!!')
 
 
-def does_patch_contain_TC(date: datetime, patch: PatchPosition, best_track: pd.DataFrame) -> bool:
-    lat_min = patch.lat_min
-    lat_max = patch.lat_max
-    lon_min = patch.lon_min
-    lon_max = patch.lon_max
-    
-    best_track = best_track[best_track['Date'] == date]
-    tc_lon = best_track['LON']
-    tc_lat = best_track['LAT']
-
-    tc_in_domain = best_track[
-        (tc_lon >= lon_min)
-        & (tc_lon <= lon_max)
-        & (tc_lat >= lat_min)
-        & (tc_lat <= lat_max)]
-
-    return len(tc_in_domain) > 0
+def do_patches_contain_TC(date: datetime, patches: list[PatchPosition], best_track_index: BestTrackIndex) -> np.ndarray:
+    """
+    Whether each of the patches contains any TC at the given date.
+    """
+    return best_track_index.any_in_boxes(date, np.asarray(patches, dtype=np.float64))
 
 
 def neg_output_dir(output_dir: str):
@@ -263,7 +236,7 @@ class PositiveAndNegativePatchesExtractor(abc.ABC):
             detailed_best_track: pd.DataFrame,
             raise_cannot_find_negative_patch: bool = True) -> None:
         self.raise_cannot_find_negative_patch = raise_cannot_find_negative_patch
-        self.detailed_best_track = detailed_best_track
+        self.best_track_index = BestTrackIndex.from_dataframe(detailed_best_track)
 
     @abc.abstractmethod
     def load_dataset(self, path: str) -> xr.Dataset:
@@ -333,19 +306,26 @@ class PositiveAndNegativePatchesExtractor(abc.ABC):
         save_patch(pos_patch, pos_center, True)
 
         # Extract suitable negative patch.
+        # All candidates are checked against the best track at once,
+        # and the first one without TC is used.
+        neg_centers = []
         try:
             for neg_center in suggest_negative_patch_center(pos_center, distances, ds):
-                neg_patch_pos = suggest_patch_position(neg_center, ds, domain_size)
-                if not does_patch_contain_TC(row['OriginalDate'], neg_patch_pos, self.detailed_best_track):
-                    neg_patch = extract_patch(neg_patch_pos, ds)
-                    save_patch(neg_patch, neg_center, False)
-                    break
-
-        except ValueError as e:
-            if self.raise_cannot_find_negative_patch:
-                raise e
-            else:
-                print(f'Ignore generating negative patch for file {row["Path"]}.')
+                neg_centers.append(neg_center)
+        except ValueError:
+            pass
+
+        neg_patches_pos = [suggest_patch_position(c, ds, domain_size) for c in neg_centers]
+        contain_tc = do_patches_contain_TC(row['OriginalDate'], neg_patches_pos, self.best_track_index)
+        candidates = np.flatnonzero(~contain_tc)
+        if len(candidates) > 0:
+            idx = candidates[0]
+            neg_patch = extract_patch(neg_patches_pos[idx], ds)
+            save_patch(neg_patch, neg_centers[idx], False)
+        elif self.raise_cannot_find_negative_patch:
+            raise ValueError('Cannot suggest negative center. Please check your code again!!!')
+        else:
+            print(f'Ignore generating negative patch for file {row["Path"]}.')
 
 
 def list_reanalysis_files(path: str) -> pd.DataFrame:
@@ -1,6 +1,18 @@
 from datetime import datetime
+import json
+import multiprocessing as mp
+from multiprocessing import Pool
 import numpy as np
+import os
 import tensorflow as tf
+from tqdm import tqdm
+import traceback
+
+
+# Suffix of the manifest file written next to the shards.
+MANIFEST_SUFFIX = '.manifest.json'
+
+COMPRESSION_TYPES = ['GZIP', 'ZLIB']
 
 
 def bytes_feature(value):
@@ -28,3 +40,165 @@ def numpy_feature(value: np.ndarray, dtype=np.float32):
 def date_feature(date: datetime):
     datenum = date.timestamp()
     return float_feature([datenum])
+
+
+def add_sharding_arguments(parser):
+    parser.add_argument(
+        '--shards',
+        type=int,
+        default=None,
+        help='Write the output as this number of shards directly from the worker processes, '
+             'along with a manifest file. Must be at least the number of processes, '
+             'so every process writes its own shards. '
+             'Default is to write a single file from the main process.')
+    parser.add_argument(
+        '--compression',
+        choices=COMPRESSION_TYPES,
+        default=None,
+        help='Compression of the shards, only available with --shards.')
+    return parser
+
+
+def shard_path(outfile: str, index: int, nb_shards: int) -> str:
+    """
+    Path of the shard, which has the format `<name>-00000-of-00010<ext>`.
+    """
+    fn, ext = os.path.splitext(outfile)
+    return f'{fn}-{index:05d}-of-{nb_shards:05d}{ext}'
+
+
+def manifest_path(outfile: str) -> str:
+    fn, _ = os.path.splitext(outfile)
+    return f'{fn}{MANIFEST_SUFFIX}'
+
+
+def write_tfrecords(
+        process_fn, tasks: list, outfile: str, *,
+        processes: int, desc: str, shards: int = None, compression: str = None):
+    """
+    Process `tasks` in parallel with `process_fn` and write the results to tfrecords file(s).
+
+    :param process_fn: picklable function that converts a task into a serialized example,
+    or a list of serialized examples.
+    :param shards: if None, all examples are written to `outfile` from the main process.
+    Otherwise, examples are written to this number of shards,
+    and each shard is written by a worker process directly.
+    """
+    assert shards is not None or compression is None, 'Compression is only available with sharded output.'
+
+    if shards is None:
+        assert not os.path.isfile(outfile), f'Output file exists! {outfile=}'
+        with Pool(processes) as pool:
+            results = pool.imap_unordered(process_fn, tasks)
+            with tf.io.TFRecordWriter(outfile) as writer:
+                for result in tqdm(results, total=len(tasks), desc=desc):
+                    for record in _as_records(result):
+                        writer.write(record)
+        return
+
+    write_sharded_tfrecords(
+        process_fn, tasks, outfile,
+        shards=shards, processes=processes, desc=desc, compression=compression)
+
+
+def write_sharded_tfrecords(
+        process_fn, tasks: list, outfile: str, *,
+        shards: int, processes: int, desc: str, compression: str = None) -> dict:
+    """
+    Write the examples as `shards` files directly from the worker processes,
+    so the main process doesn't have to receive and write every example.
+    Each worker owns its own writers, i.e. shards `w, w + processes, ...` of worker `w`,
+    and is fed tasks one by one from a shared queue, so all workers are busy until the end.
+    A manifest containing the number of records of each shard is written next to the shards,
+    which can be passed to the data loaders instead of the list of shards.
+
+    :param shards: number of shards, which must be at least `processes`
+    so that every worker has a shard to write to.
+    :returns: the manifest.
+    """
+    assert shards >= processes > 0, f'Number of shards must be at least the number of processes. {shards=}, {processes=}'
+    assert compression is None or compression in COMPRESSION_TYPES, f'Invalid compression {compression}'
+
+    paths = [shard_path(outfile, i, shards) for i in range(shards)]
+    for path in paths + [manifest_path(outfile)]:
+        assert not os.path.isfile(path), f'Output file exists! {path=}'
+
+    task_queue = mp.Queue()
+    result_queue = mp.Queue()
+    workers = [mp.Process(
+                    target=_shard_worker,
+                    args=(process_fn, paths[w::processes], compression, task_queue, result_queue))
+               for w in range(processes)]
+    for worker in workers:
+        worker.start()
+
+    for task in tasks:
+        task_queue.put(task)
+    # One sentinel for each worker to close its shards.
+    for _ in workers:
+        task_queue.put(None)
+
+    counts = {}
+    finished = 0
+    try:
+        with tqdm(total=len(tasks), desc=desc) as progress:
+            while finished < len(workers):
+                kind, value = result_queue.get()
+                if kind == 'task':
+                    progress.update(1)
+                elif kind == 'shards':
+                    counts.update(value)
+                    finished += 1
+                else:
+                    raise RuntimeError(f'Worker failed to write shards:\n{value}')
+    finally:
+        for worker in workers:
+            if finished < len(workers):
+                worker.terminate()
+            worker.join()
+
+    manifest = dict(
+        compression=compression,
+        total_records=sum(counts.values()),
+        shards=[dict(path=os.path.basename(path), records=counts[path]) for path in paths],
+    )
+    _write_json(manifest_path(outfile), manifest)
+    return manifest
+
+
+def _as_records(result) -> list:
+    return [result] if isinstance(result, bytes) else result
+
+
+def _shard_worker(process_fn, paths: list[str], compression: str, task_queue, result_queue):
+    try:
+        options = tf.io.TFRecordOptions(compression_type=compression or '')
+
+        # Write to temporary files first,
+        # so an interrupted run never leaves valid-looking partial shards.
+        writers = [tf.io.TFRecordWriter(f'{path}.tmp', options) for path in paths]
+        counts = [0] * len(paths)
+
+        # Tasks are distributed to the worker's shards in a round-robin manner,
+        # so shards are roughly of the same size.
+        for i, task in enumerate(iter(task_queue.get, None)):
+            shard = i % len(paths)
+            for record in _as_records(process_fn(task)):
+                writers[shard].write(record)
+                counts[shard] += 1
+            result_queue.put(('task', None))
+
+        for writer, path in zip(writers, paths):
+            writer.close()
+            os.replace(f'{path}.tmp', path)
+
+        result_queue.put(('shards', dict(zip(paths, counts))))
+    except Exception:
+        result_queue.put(('error', traceback.format_exc()))
+
+
+def _write_json(path: str, value: dict):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as outfile:
+        json.dump(value, outfile, indent=2)
+    os.replace(tmp_path, path)
@@ -0,0 +1,103 @@
+"""
+Extract all patches of a full domain at once.
+
+Instead of calling `ds.sel(lat=slice(...), lon=slice(...))` and extracting variables for each patch,
+the channel-last array of the full domain is extracted once,
+and patches are strided windows over that array.
+"""
+from __future__ import annotations
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+# Tolerance (in grid points) when converting degrees to grid indices.
+_EPS = 1e-6
+
+
+def patch_origins(latitudes: np.ndarray, longitudes: np.ndarray, domain_size: float, stride: float) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Lower-left corners (lat, lon) of all patches that fit inside the domain,
+    the same as looping over `np.arange(minlat, maxlat, stride)` x `np.arange(minlon, maxlon, stride)`.
+    """
+    lat_origins = np.arange(latitudes.min(), latitudes.max(), stride)
+    lon_origins = np.arange(longitudes.min(), longitudes.max(), stride)
+    lat_origins = lat_origins[lat_origins + domain_size <= latitudes.max()]
+    lon_origins = lon_origins[lon_origins + domain_size <= longitudes.max()]
+    return lat_origins, lon_origins
+
+
+def sliding_window_patches(
+        values: np.ndarray,
+        latitudes: np.ndarray,
+        longitudes: np.ndarray,
+        domain_size: float,
+        stride: float) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Extract all patches of size `domain_size` (in degrees) every `stride` degrees.
+
+    :param values: channel-last array of shape (lat, lon, channel) of the full domain.
+    :param latitudes: evenly spaced ascending latitudes of the domain.
+    :param longitudes: evenly spaced ascending longitudes of the domain.
+    :returns: patches of shape (N, h, w, channel), and their origins (lat, lon) of shape (N, 2).
+    Patches are ordered by latitude, then longitude.
+    """
+    assert values.shape[:2] == (len(latitudes), len(longitudes)), 'Values must be of shape (lat, lon, channel).'
+    lat_res = _resolution(latitudes, 'latitudes')
+    lon_res = _resolution(longitudes, 'longitudes')
+
+    # Number of grid points inside [origin, origin + domain_size].
+    patch_shape = (int(np.floor(domain_size / lat_res + _EPS)) + 1,
+                   int(np.floor(domain_size / lon_res + _EPS)) + 1)
+
+    lat_origins, lon_origins = patch_origins(latitudes, longitudes, domain_size, stride)
+    lat_starts = np.ceil((lat_origins - latitudes[0]) / lat_res - _EPS).astype(int)
+    lon_starts = np.ceil((lon_origins - longitudes[0]) / lon_res - _EPS).astype(int)
+
+    # Windows of shape (lat, lon, h, w, channel), this is just a view.
+    windows = sliding_window_view(values, patch_shape, axis=(0, 1))
+    windows = np.moveaxis(windows, 2, -1)
+
+    # Origins not lying on the grid might push the last patch out of the domain by one grid point.
+    lat_starts = np.minimum(lat_starts, windows.shape[0] - 1)
+    lon_starts = np.minimum(lon_starts, windows.shape[1] - 1)
+    windows = _take_starts(_take_starts(windows, lat_starts, axis=0), lon_starts, axis=1)
+
+    patches = windows.reshape((-1,) + windows.shape[2:])
+    origins = np.stack(np.meshgrid(lat_origins, lon_origins, indexing='ij'), axis=-1).reshape((-1, 2))
+    return patches, origins
+
+
+def genesis_mask(origins: np.ndarray, domain_size: float, genesis_latitudes, genesis_longitudes) -> np.ndarray:
+    """
+    Whether each patch strictly contains any of the genesis locations.
+
+    :param origins: origins (lat, lon) of the patches, of shape (N, 2).
+    :returns: boolean array of shape (N,).
+    """
+    glat = np.atleast_1d(np.asarray(genesis_latitudes, dtype=np.float64))
+    glon = np.atleast_1d(np.asarray(genesis_longitudes, dtype=np.float64))
+    if len(glat) == 0:
+        return np.zeros(len(origins), dtype=bool)
+
+    lat, lon = origins[:, 0:1], origins[:, 1:2]
+    inside = ((lat < glat[None, :]) & (glat[None, :] < lat + domain_size)
+              & (lon < glon[None, :]) & (glon[None, :] < lon + domain_size))
+    return np.any(inside, axis=1)
+
+
+def _resolution(axis: np.ndarray, name: str) -> float:
+    steps = np.diff(axis)
+    assert len(steps) > 0 and np.all(steps > 0), f'{name} must be ascending.'
+    assert np.allclose(steps, steps[0]), f'{name} must be evenly spaced.'
+    return float(steps[0])
+
+
+def _take_starts(windows: np.ndarray, starts: np.ndarray, axis: int) -> np.ndarray:
+    # Evenly spaced starts can be taken with slicing, which keeps the result a view.
+    if len(starts) > 1 and np.all(np.diff(starts) == starts[1] - starts[0]) and starts[1] > starts[0]:
+        index = [slice(None)] * windows.ndim
+        index[axis] = slice(starts[0], starts[-1] + 1, starts[1] - starts[0])
+        return windows[tuple(index)]
+
+    return np.take(windows, starts, axis=axis)
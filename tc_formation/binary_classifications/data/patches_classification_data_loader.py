@@ -1,5 +1,6 @@
 """
-Don't use this. It is extremely slow!!
+Load full observations as smaller patches.
+Patches are windows over the full domain, see `patch_extraction.py`.
 """
 from __future__ import annotations
 
@@ -13,6 +14,7 @@ import tensorflow as tf
 from typing import Union, Iterator
 import xarray as xr
 
+from .patch_extraction import sliding_window_patches
 from .utils import *
 
 
@@ -83,16 +85,16 @@ def load_xr_dataset_as_patches(path: str, subset: SubsetDict, domain_size: float
     ds = fill_missing_values(ds)
 
     try:
-        patches, coords = zip(*extract_patches(ds, domain_size=domain_size, stride=stride))
-        patches = (extract_subset(p, subset) for p in patches)
-        patches = [p[None, ...] for p in patches]
-        patches = resize_to_the_smallest_size(patches)
-        patches = np.concatenate(patches, axis=0)
+        # Extract the subset of the full domain once,
+        # then all patches are windows over it, so they all have the same size.
+        values = extract_subset(ds, subset)
+        patches, coords = sliding_window_patches(
+            values, ds['lat'].values, ds['lon'].values, domain_size, stride)
     except Exception as e:
         logging.error(f'Cannot extract patches from file: {path}', e)
         raise e
 
-    return patches, np.asarray(coords), path
+    return patches.astype(np.float64), coords.astype(np.float64), path
 
 
 def extract_patches(ds: xr.Dataset, domain_size: float, stride: float) -> Iterator[tuple[xr.Dataset, tuple[float, float]]]:
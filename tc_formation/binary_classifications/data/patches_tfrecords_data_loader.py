@@ -1,47 +1,29 @@
 from __future__ import annotations
 
-import numpy as np
 import tensorflow as tf
 
-from ...data.tfd_utils import new_py_function
+from .tfrecords_utils import decode_float32, open_tfrecords, parse_in_batches, read_data_shape
 
 
 class PatchesTFRecordDataLoader():
-    def load_dataset(self, path: str, batch_size: int) -> tf.data.Dataset:
-        ds = tf.data.TFRecordDataset(path)
-        ds = ds.map(_parse_dataset)
-        ds = ds.map(
-            lambda d: new_py_function(
-                lambda d: _parse_binary_dataset(
-                    data=d['data'],
-                    datashape=d['data_shape'],
-                    position=d['position'],
-                    filename=d['filename'],
-                ),
-                [d],
-                Tout=[tf.float64, tf.float64, tf.string],
-                name='parse_binary_dataset',
-            ),
-            num_parallel_calls=tf.data.AUTOTUNE)
+    def load_dataset(self, path: str | list[str], batch_size: int) -> tf.data.Dataset:
+        datashape = read_data_shape(path)
 
+        ds = open_tfrecords(path)
+        ds = parse_in_batches(ds, lambda records: _parse_dataset(records, datashape))
         ds = ds.batch(batch_size)
         return ds.prefetch(tf.data.AUTOTUNE)
 
 
 _patches_dataset_description = dict(
     data=tf.io.FixedLenFeature([], tf.string),
-    data_shape=tf.io.RaggedFeature(dtype=tf.int64),
     position=tf.io.FixedLenFeature([], tf.string),
     filename=tf.io.FixedLenFeature([], tf.string),
 )
 
-def _parse_dataset(example_proto):
-    results = tf.io.parse_single_example(
-        example_proto, _patches_dataset_description)
-    return results
-
-
-def _parse_binary_dataset(*, data, datashape, position, filename):
-    data = np.frombuffer(data.numpy(), dtype=np.float32).reshape(datashape.numpy())
-    position = np.frombuffer(position.numpy(), dtype=np.float32)
-    return data, position, filename.numpy().decode('utf-8')
+def _parse_dataset(example_protos, datashape):
+    results = tf.io.parse_example(
+        example_protos, _patches_dataset_description)
+    data = decode_float32(results['data'], datashape)
+    position = tf.io.decode_raw(results['position'], tf.float32)
+    return data, position, results['filename']
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import glob
+import json
+import os
+import tensorflow as tf
+
+
+# Number of records to parse at once,
+# the parsed records are unbatched afterward so this doesn't affect the output.
+PARSE_BATCH_SIZE = 256
+
+# Suffix of the manifest written by `scripts/tfrecords_utils.py` along with the shards.
+MANIFEST_SUFFIX = '.manifest.json'
+
+
+def list_tfrecords_files(path: str | list[str]) -> tuple[list[str], str | None]:
+    """
+    Resolve the tfrecords files to read, which can be given as:
+    * a list of files,
+    * a manifest of shards, or the output path given when the shards were written,
+    * a glob pattern (e.g. `data-*-of-00016.tfrecords`),
+    * a single file.
+
+    :returns: the files and their compression type (only known from the manifest).
+    """
+    if isinstance(path, (list, tuple)):
+        return list(path), None
+
+    manifest = path if path.endswith(MANIFEST_SUFFIX) else f'{os.path.splitext(path)[0]}{MANIFEST_SUFFIX}'
+    if not os.path.isfile(path) and os.path.isfile(manifest):
+        with open(manifest, 'r') as infile:
+            content = json.load(infile)
+
+        outdir = os.path.dirname(manifest)
+        files = [os.path.join(outdir, shard['path']) for shard in content['shards']]
+        return files, content.get('compression')
+
+    if glob.has_magic(path):
+        files = sorted(glob.glob(path))
+        assert len(files) > 0, f'No tfrecords file matches {path}'
+        return files, None
+
+    return [path], None
+
+
+def open_tfrecords(path: str | list[str], compression_type: str | None = None) -> tf.data.Dataset:
+    """
+    Open tfrecords file(s), where shards are read in parallel and interleaved.
+
+    :param compression_type: compression of the files,
+    if None, it is read from the manifest (if any), otherwise files are assumed to be uncompressed.
+    """
+    files, manifest_compression = list_tfrecords_files(path)
+    if compression_type is None:
+        compression_type = manifest_compression
+
+    return tf.data.TFRecordDataset(
+        files,
+        compression_type=compression_type or '',
+        num_parallel_reads=tf.data.AUTOTUNE if len(files) > 1 else None)
+
+
+def read_data_shape(path: str | list[str]) -> tuple[int, ...]:
+    """
+    Read `data_shape` of the first record,
+    all records written by our `scripts/create_tfrecord_*` scripts have the same shape.
+    """
+    for record in open_tfrecords(path).take(1):
+        example = tf.io.parse_single_example(
+            record, dict(data_shape=tf.io.RaggedFeature(dtype=tf.int64)))
+        return tuple(example['data_shape'].numpy().tolist())
+
+    raise ValueError(f'No record found in {path}')
+
+
+def decode_float32(data: tf.Tensor, shape: tuple[int, ...]) -> tf.Tensor:
+    """
+    Decode a batch of raw float32 bytes into a tensor of shape `(batch, *shape)`.
+    """
+    data = tf.io.decode_raw(data, tf.float32)
+    return tf.reshape(data, (-1,) + tuple(shape))
+
+
+def parse_in_batches(ds: tf.data.Dataset, parse_batch_fn) -> tf.data.Dataset:
+    """
+    Parse records in batches with `parse_batch_fn`,
+    which should only use tensorflow ops (e.g. `tf.io.parse_example` and `tf.io.decode_raw`)
+    so that parsing runs in parallel without holding the GIL.
+    """
+    ds = ds.batch(PARSE_BATCH_SIZE)
+    ds = ds.map(parse_batch_fn, num_parallel_calls=tf.data.AUTOTUNE)
+    return ds.unbatch()
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+
+class BestTrackIndex:
+    """
+    Index of best track positions grouped by timestamp.
+
+    Positions are sorted by date into contiguous arrays,
+    so positions at a given time are just a slice found with binary search,
+    instead of filtering the whole best track dataframe with `df['Date'] == date`.
+    """
+
+    def __init__(
+            self,
+            dates: np.ndarray,
+            latitudes: np.ndarray,
+            longitudes: np.ndarray,
+            sids: np.ndarray | None = None):
+        dates = np.asarray(dates, dtype='datetime64[ns]')
+        order = np.argsort(dates, kind='stable')
+
+        self._latitudes = np.asarray(latitudes, dtype=np.float64)[order]
+        self._longitudes = np.asarray(longitudes, dtype=np.float64)[order]
+        self._sids = None if sids is None else np.asarray(sids, dtype=object)[order]
+
+        # Each unique date owns the positions in [starts[i], starts[i + 1]).
+        self._dates, starts = np.unique(dates[order], return_index=True)
+        self._starts = np.append(starts, len(order))
+
+    @classmethod
+    def from_dataframe(
+            cls,
+            df: pd.DataFrame,
+            date_column: str = 'Date',
+            lat_column: str = 'LAT',
+            lon_column: str = 'LON',
+            sid_column: str | None = 'SID') -> BestTrackIndex:
+        """
+        Build the index from IBTrACS or Thanh Anh's best track dataframe.
+        """
+        return cls(
+            df[date_column].values,
+            df[lat_column].values,
+            df[lon_column].values,
+            None if sid_column is None or sid_column not in df.columns else df[sid_column].values)
+
+    def __len__(self) -> int:
+        return len(self._latitudes)
+
+    @property
+    def dates(self) -> np.ndarray:
+        return self._dates
+
+    def _slice(self, date: datetime | np.datetime64) -> slice:
+        date = np.datetime64(pd.Timestamp(date).to_datetime64(), 'ns')
+        i = np.searchsorted(self._dates, date)
+        if i >= len(self._dates) or self._dates[i] != date:
+            return slice(0, 0)
+
+        return slice(self._starts[i], self._starts[i + 1])
+
+    def positions_at(self, date: datetime | np.datetime64) -> tuple[np.ndarray, np.ndarray]:
+        """
+        :returns: latitudes and longitudes of all storms at the given time.
+        """
+        s = self._slice(date)
+        return self._latitudes[s], self._longitudes[s]
+
+    def sids_at(self, date: datetime | np.datetime64) -> np.ndarray:
+        assert self._sids is not None, 'The index is built without storm ids.'
+        return self._sids[self._slice(date)]
+
+    def any_in_boxes(self, date: datetime | np.datetime64, boxes: np.ndarray) -> np.ndarray:
+        """
+        Check whether any storm at the given time is inside each of the boxes (bounds inclusive).
+
+        :param boxes: array of shape (N, 4), each row is (lat_min, lat_max, lon_min, lon_max).
+        :returns: boolean array of shape (N,).
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape((-1, 4))
+        lat, lon = self.positions_at(date)
+        if len(lat) == 0:
+            return np.zeros(len(boxes), dtype=bool)
+
+        inside = ((lat[None, :] >= boxes[:, 0:1])
+                  & (lat[None, :] <= boxes[:, 1:2])
+                  & (lon[None, :] >= boxes[:, 2:3])
+                  & (lon[None, :] <= boxes[:, 3:4]))
+        return np.any(inside, axis=1)
+
+    def any_in_box(
+            self,
+            date: datetime | np.datetime64,
+            lat_min: float,
+            lat_max: float,
+            lon_min: float,
+            lon_max: float) -> bool:
+        return bool(self.any_in_boxes(date, [(lat_min, lat_max, lon_min, lon_max)])[0])
@@ -3,7 +3,7 @@ from __future__ import annotations
 from . import utils as data_utils
 from collections import OrderedDict
 from datetime import datetime, timedelta
-from functools import reduce, partial
+from functools import partial
 import glob
 import tc_formation.data.label as label
 import numpy as np
@@ -11,6 +11,8 @@ import os
 import pandas as pd
 from pathlib import Path
 import tc_formation.data.tfd_utils as tfd_utils
+from tc_formation.data.tensor_cache import TensorCache
+import tc_formation.layers.tc_grid as tc_grid
 import tensorflow as tf
 from typing import Union, List
 import xarray as xr
@@ -110,47 +112,11 @@ def extract_variables_from_dataset(dataset: xr.Dataset, subset: OrderedDict | No
 
 """DEPRECATED: should favor the same method in label module."""
 def filter_in_leadtime(tc: pd.DataFrame, leadtimes: Union[List[int], int] = None):
-    if leadtimes is None:
-        return tc
-
-    if not isinstance(leadtimes, list):
-        leadtimes = [leadtimes]
-
-    # First, we will keep all negative cases.
-    mask = ~tc['TC']
-
-    # Then, loop through each lead time to get observations that belong to that leadtime.
-    observation_dates = parse_tc_datetime(tc['Date'])
-    tc_first_observed_dates = parse_tc_datetime(tc['First Observed'])
-    for leadtime in leadtimes:
-        leadtime = timedelta(hours=leadtime)
-        mask |= (tc_first_observed_dates - observation_dates) == leadtime
-
-    return tc[mask]
+    return label.filter_in_leadtime(tc, leadtimes)
 
 """DEPRECATED: should favor the same method in label module."""
 def group_observations_by_date(tc_labels: pd.DataFrame):
-    def concat_values(values):
-        return reduce(lambda agg, x: agg + [x], values, [])
-
-    grouped = tc_labels.groupby('Date')
-    tc_labels['TC'] = grouped['TC'].transform(
-            lambda has_tc: reduce(lambda agg, x: agg and x, has_tc, True))
-
-    concate_columns = [
-            'TC Id',
-            'First Observed',
-            'Last Observed',
-            'Latitude',
-            'Longitude',
-            'First Observed Type',
-            'Will Develop to TC',
-            'Developing Date',
-        ]
-    for col in concate_columns:
-        tc_labels[col] = grouped[col].transform(concat_values)
-
-    return tc_labels.drop_duplicates('Date', keep='first')
+    return label._group_observations_by_date(tc_labels)
 
 
 def load_data(
@@ -234,7 +200,8 @@ def load_data_v2(
         include_tc_position=False,
         subset=None,
         leadtime: Union[List[int], int] = None,
-        group_same_observations=False):
+        group_same_observations=False,
+        tensor_cache: TensorCache = None):
 
     if include_tc_position:
         raise ValueError('Under Construction!')
@@ -247,7 +214,7 @@ def load_data_v2(
 
         # Load given dataset to memory.
         dataset = dataset.map(lambda path, tc: tf.numpy_function(
-            partial(load_observation_data_v1, subset=subset),
+            partial(load_observation_data_v1, subset=subset, tensor_cache=tensor_cache),
             inp=[path, tc],
             Tout=([tf.float32, tf.float64]
                   if include_tc_position
@@ -340,7 +307,8 @@ def load_data_v1(
         include_tc_position=False,
         subset=None,
         leadtime: Union[List[int], int] = None,
-        group_same_observations=False):
+        group_same_observations=False,
+        tensor_cache: TensorCache = None):
     # Read labels from path.
     labels = pd.read_csv(labels_path)
 
@@ -376,7 +344,7 @@ def load_data_v1(
 
     # Load given dataset to memory.
     dataset = dataset.map(lambda path, tc: tf.numpy_function(
-        partial(load_observation_data_v1, subset=subset),
+        partial(load_observation_data_v1, subset=subset, tensor_cache=tensor_cache),
         inp=[path, tc],
         Tout=([tf.float32, tf.float64]
               if include_tc_position
@@ -412,7 +380,8 @@ def load_data_with_tc_probability(
         prefetch_batch=1,
         subset=None,
         tc_avg_radius_lat_deg=2,
-        leadtime: Union[List[int], int] = None):
+        leadtime: Union[List[int], int] = None,
+        tensor_cache: TensorCache = None):
     # Read labels from path.
     labels = pd.read_csv(labels_path, dtype={
         'TC Id': str,
@@ -428,21 +397,37 @@ def load_data_with_tc_probability(
     labels = group_observations_by_date(labels)
 
     # dataset = tf.data.Dataset.from_tensor_slices( (labels['Path'], np.where(labels['TC'], 1, 0)))
-    dataset = tf.data.Dataset.from_tensor_slices(dict(labels[['Path', 'TC', 'Latitude', 'Longitude']]))
+    dataset = tf.data.Dataset.from_tensor_slices({
+        'Path': labels['Path'],
+        'Centres': tc_grid.ragged_centres(tc_grid.tc_locations_from_labels(
+            labels['TC'], labels['Latitude'], labels['Longitude'])),
+    })
     
     if shuffle:
         dataset = dataset.shuffle(len(dataset))
 
     # Load given dataset to memory.
-    dataset = dataset.map(lambda row: tfd_utils.new_py_function(
-        partial(load_observation_data_with_tc_probability, subset=subset, tc_avg_radius_lat_deg=tc_avg_radius_lat_deg),
-        inp=[row],
-        Tout=[tf.float32, tf.float32],
-        name='load_observation_data'),
+    # Only the observation is loaded in python,
+    # the groundtruth is generated in-graph from the TC centres.
+    dataset = dataset.map(lambda row: (
+        tf.numpy_function(
+            partial(_load_observation, subset=subset, tensor_cache=tensor_cache),
+            inp=[row['Path']],
+            Tout=tf.float32,
+            name='load_observation_data'),
+        row['Centres']),
         num_parallel_calls=tf.data.AUTOTUNE,
         deterministic=False,
     )
 
+    # All observations share the same grid.
+    latitudes, longitudes = data_utils.load_coordinates_from_path(labels['Path'].iloc[0])
+    grid = tc_grid.TCGridProbability(latitudes, longitudes, tc_avg_radius_lat_deg=tc_avg_radius_lat_deg)
+    dataset = dataset.map(
+        lambda data, centres: (data, tc_grid.probability_to_groundtruth(grid.single(centres), softmax_output=False)),
+        num_parallel_calls=tf.data.AUTOTUNE,
+    )
+
     # Tensorflow should figure out the shape of the output of previous map,
     # but it doesn't, so we have to do it our self.
     # https://github.com/tensorflow/tensorflow/issues/31373#issuecomment-524666365
@@ -572,21 +557,32 @@ def load_observation_data(observation_path, label, include_tc_position, subset=N
     data = extract_variables_from_dataset(dataset, subset)
     return data, label if include_tc_position else [label]
 
-def load_observation_data_v1(path, tc, subset=None):
+def load_observation_data_v1(path, tc, subset=None, tensor_cache: TensorCache = None):
     # print(path)
-    dataset = xr.open_dataset(path.decode('utf-8'), engine='netcdf4')
+    path = path.decode('utf-8')
+    if tensor_cache is not None:
+        return tensor_cache.load(path, subset), [tc]
+
+    dataset = xr.open_dataset(path, engine='netcdf4')
     data = extract_variables_from_dataset(dataset, subset)
     return data, [tc]
 
+def _load_observation(path, subset=None, tensor_cache: TensorCache = None):
+    path = path.decode('utf-8')
+    return data_utils.load_variables_from_path(path, subset, tensor_cache=tensor_cache).astype(np.float32)
+
 def load_observation_data_with_tc_probability(
         row,
         tc_avg_radius_lat_deg=2,
         clip_threshold=0.1,
         subset=None,
-        sigmoid_output=True):
+        sigmoid_output=True,
+        tensor_cache: TensorCache = None):
     path = row['Path'].numpy().decode('utf-8')
     dataset = xr.open_dataset(path, engine='netcdf4')
-    data = extract_variables_from_dataset(dataset, subset)
+    data = (extract_variables_from_dataset(dataset, subset)
+            if tensor_cache is None
+            else tensor_cache.load(path, subset))
     
     groundtruth = np.zeros(data.shape[:-1])
 
@@ -1,17 +1,20 @@
-from ast import literal_eval
 import numpy as np
 import pandas as pd
+import tc_formation.data.label as label
+from tc_formation.data.observation_store import ObservationStore
+from tc_formation.data.tensor_cache import TensorCache
 from tc_formation.data.time_series import TimeSeriesTropicalCycloneDataLoader
 from tc_formation.data.time_series_addons import SingleTimeStepMixin
+from tc_formation.data.vortex_removal_stage import VortexRemovalStage
 import tc_formation.data.utils as data_utils
 import tc_formation.data.tfd_utils as tfd_utils
+import tc_formation.layers.tc_grid as tc_grid
 import tensorflow as tf
 from typing import List, Tuple
-import xarray as xr
 
 class TimeSeriesTCFormationDataLoader(TimeSeriesTropicalCycloneDataLoader):
-    def __init__(self, data_shape, previous_hours: List[int], subset=None, produce_other_tc_locations_mask=False, tc_avg_radius_lat_deg=3, clip_threshold=0.1):
-        super().__init__(data_shape, previous_hours=previous_hours, subset=subset)
+    def __init__(self, data_shape, previous_hours: List[int], subset=None, produce_other_tc_locations_mask=False, tc_avg_radius_lat_deg=3, clip_threshold=0.1, tensor_cache: TensorCache = None, store: ObservationStore = None, sliding_window: bool = False, observation_index_dir: str = None, vortex_removal: VortexRemovalStage = None):
+        super().__init__(data_shape, previous_hours=previous_hours, subset=subset, tensor_cache=tensor_cache, store=store, sliding_window=sliding_window, observation_index_dir=observation_index_dir, vortex_removal=vortex_removal)
         
         self._produce_other_tc_locations_mask = produce_other_tc_locations_mask
         self._tc_avg_radius_lat_deg = tc_avg_radius_lat_deg
@@ -23,48 +26,60 @@ class TimeSeriesTCFormationDataLoader(TimeSeriesTropicalCycloneDataLoader):
             assert 'Other TC Locations' in tc_df.columns, 'Producing other TCs locations requires labels v4+'
 
             # Convert from string to list.
-            tc_df['Other TC Locations'] = tc_df['Other TC Locations'].apply(literal_eval).apply(lambda x: np.asarray(x, dtype=np.float64))
+            tc_df['Other TC Locations'] = label.parse_locations(tc_df['Other TC Locations'])
 
         cls = TimeSeriesTCFormationDataLoader
 
         dataset = tf.data.Dataset.from_tensor_slices({
             'Path': np.asarray(tc_df['Path'].sum()).reshape((-1, len(self._previous_hours) + 1)),
             'TC': tc_df['TC'],
-            'Latitude': tc_df['Latitude'],
-            'Longitude': tc_df['Longitude'],
-            'Other TC Locations': tf.ragged.constant(tc_df['Other TC Locations']) if self._produce_other_tc_locations_mask else None,
+            'Other TC Locations': tc_grid.ragged_centres(
+                tc_df['Other TC Locations'] if self._produce_other_tc_locations_mask else [[]] * len(tc_df)),
         })
         print('Dataset created ...')
 
+        # Only the observations are loaded in python,
+        # the other TC locations mask is generated in-graph from the TC centres.
         dataset = dataset.map(
-            lambda row: tfd_utils.new_py_function(
-                    lambda row: cls._load_reanalysis_gt_and_mask(
-                            [path.decode('utf-8') for path in row['Path'].numpy()],
+            lambda row: (
+                tfd_utils.new_py_function(
+                    lambda paths: cls._load_reanalysis(
+                            [path.decode('utf-8') for path in paths.numpy()],
                             self._subset,
-                            row['TC'].numpy(),
-                            self._data_shape,
-                            self._produce_other_tc_locations_mask,
-                            row['Other TC Locations'].numpy(),
-                            self._tc_avg_radius_lat_deg,
-                            self._clip_threshold,
+                            self._frame_cache,
+                            self._store,
                         ),
-                    inp=[row],
-                    Tout=[tf.float32, tf.float32, tf.float32],
-                    name='load_reanalysis_gt_and_other_tc_mask',
+                    inp=[row['Path']],
+                    Tout=tf.float32,
+                    name='load_reanalysis',
                 ),
+                tf.cast(row['TC'], tf.float32)[None],
+                row['Other TC Locations'],
+            ),
             num_parallel_calls=tf.data.AUTOTUNE,
             deterministic=False,
         )
 
-        # Set the output shape.
-        dataset = dataset.map(
-                lambda X, Y, mask: cls._set_shape(X, Y, mask, len(self._previous_hours) + 1, self._data_shape))
-
         # If we don't need the locations mask,
         # just remove it from the output.
         if not self._produce_other_tc_locations_mask:
             print('Remove other tc locations mask from output ...')
-            dataset = dataset.map(lambda X, Y, _: (X, Y))
+            dataset = dataset.map(
+                    lambda X, Y, _: cls._set_shape(X, Y, None, len(self._previous_hours) + 1, self._data_shape)[:2])
+        else:
+            grid = self._create_tc_grid(tc_df, self._tc_avg_radius_lat_deg, self._clip_threshold)
+            dataset = dataset.map(
+                lambda X, Y, centres: (
+                    X,
+                    Y,
+                    tc_grid.probability_to_mask(grid.single(centres), self._clip_threshold, inside=0.0),
+                ),
+                num_parallel_calls=tf.data.AUTOTUNE,
+            )
+
+            # Set the output shape.
+            dataset = dataset.map(
+                    lambda X, Y, mask: cls._set_shape(X, Y, mask, len(self._previous_hours) + 1, self._data_shape))
 
         print('DONE creating dataset.')
         return dataset
@@ -80,6 +95,8 @@ class TimeSeriesTCFormationDataLoader(TimeSeriesTropicalCycloneDataLoader):
             other_tc_locations=other_tc_locations,
             tc_avg_radius_lat_deg=self._tc_avg_radius_lat_deg,
             clip_threshold=self._clip_threshold,
+            tensor_cache=self._frame_cache,
+            store=self._store,
         )
 
         if not self._produce_other_tc_locations_mask:
@@ -99,18 +116,21 @@ class TimeSeriesTCFormationDataLoader(TimeSeriesTropicalCycloneDataLoader):
         other_tc_locations: List[Tuple[float, float]],
         tc_avg_radius_lat_deg: int = 3,
         clip_threshold: float = 0.1,
+        tensor_cache: TensorCache = None,
+        store: ObservationStore = None,
     ):
         assert len(paths) > 0, 'Paths should have at least one element!'
 
         datasets = []
         for path in paths:
-            dataset = xr.open_dataset(path, engine='netcdf4')
-            latitudes = dataset['lat']
-            longitudes = dataset['lon']
-            dataset = data_utils.extract_variables_from_dataset(dataset, subset)
+            dataset = data_utils.load_variables_from_path(path, subset, tensor_cache, store)
             datasets.append(np.expand_dims(dataset, axis=0))
         datasets = np.concatenate(datasets, axis=0)
 
+        # All observations share the same grid,
+        # so we only need the coordinates of the last one.
+        latitudes, longitudes = data_utils.load_coordinates_from_path(paths[-1], store)
+
         mask = cls._create_other_tc_locations_mask(
             produce_mask,
             data_shape,
@@ -159,7 +179,8 @@ class TimeSeriesTCFormationDataLoader(TimeSeriesTropicalCycloneDataLoader):
     def _set_shape(cls, X, Y, mask, nb_previous_hours, data_shape):
         X.set_shape((nb_previous_hours,) + data_shape)
         Y.set_shape([1])
-        mask.set_shape(data_shape[:-1] + (1,))
+        if mask is not None:
+            mask.set_shape(data_shape[:-1] + (1,))
 
         return X, Y, mask
 
@@ -168,8 +189,8 @@ class TCFormationPredictionDataLoader(SingleTimeStepMixin, TimeSeriesTCFormation
     pass
 
 class TimeSeriesFocusedTCFormationDataLoader(TimeSeriesTropicalCycloneDataLoader):
-    def __init__(self, data_shape, previous_hours: List[int]=[], subset=None, tc_avg_radius_lat_deg=3, clip_threshold=0.1, easy=False):
-        super().__init__(data_shape, previous_hours=previous_hours, subset=subset)
+    def __init__(self, data_shape, previous_hours: List[int]=[], subset=None, tc_avg_radius_lat_deg=3, clip_threshold=0.1, easy=False, tensor_cache: TensorCache = None, store: ObservationStore = None, sliding_window: bool = False, observation_index_dir: str = None, vortex_removal: VortexRemovalStage = None):
+        super().__init__(data_shape, previous_hours=previous_hours, subset=subset, tensor_cache=tensor_cache, store=store, sliding_window=sliding_window, observation_index_dir=observation_index_dir, vortex_removal=vortex_removal)
 
         self._tc_avg_radius_lat_deg = tc_avg_radius_lat_deg
         self._clip_threshold = clip_threshold
@@ -186,38 +207,49 @@ class TimeSeriesFocusedTCFormationDataLoader(TimeSeriesTropicalCycloneDataLoader
             assert 'Other TC Locations' in tc_df.columns, 'Easy construction requires labels v4+'
 
             # Convert from string to list.
-            tc_df['Other TC Locations'] = tc_df['Other TC Locations'].apply(literal_eval).apply(lambda x: np.asarray(x, dtype=np.float64))
+            tc_df['Other TC Locations'] = label.parse_locations(tc_df['Other TC Locations'])
 
         cls = TimeSeriesFocusedTCFormationDataLoader
 
         dataset = tf.data.Dataset.from_tensor_slices({
             'Path': np.asarray(tc_df['Path'].sum()).reshape((-1, len(self._previous_hours) + 1)),
             'TC': tc_df['TC'],
-            'Latitude': tc_df['Latitude'],
-            'Longitude': tc_df['Longitude'],
-            'Other TC Locations': tf.ragged.constant(tc_df['Other TC Locations']) # if self._easy else None
+            'Latitude': np.asarray(tc_df['Latitude'], dtype=np.float32),
+            'Longitude': np.asarray(tc_df['Longitude'], dtype=np.float32),
         })
         print('Dataset created ...')
 
+        # Only the observations are loaded in python,
+        # the focused mask is generated in-graph.
         dataset = dataset.map(
-            lambda row: tfd_utils.new_py_function(
-                    lambda row: cls._load_reanalysis_gt_and_focused_mask(
-                            [path.decode('utf-8') for path in row['Path'].numpy()],
+            lambda row: (
+                tfd_utils.new_py_function(
+                    lambda paths: cls._load_reanalysis(
+                            [path.decode('utf-8') for path in paths.numpy()],
                             self._subset,
-                            row['TC'].numpy(),
-                            self._data_shape,
-                            [[row['Latitude'].numpy(), row['Longitude'].numpy()]],
-                            self._tc_avg_radius_lat_deg,
-                            self._clip_threshold,
+                            self._frame_cache,
+                            self._store,
                         ),
-                    inp=[row],
-                    Tout=[tf.float32, tf.float32, tf.float32],
-                    name='load_reanalysis_gt_and_other_tc_mask',
+                    inp=[row['Path']],
+                    Tout=tf.float32,
+                    name='load_reanalysis',
                 ),
+                row,
+            ),
             num_parallel_calls=tf.data.AUTOTUNE,
             deterministic=False,
         )
 
+        grid = self._create_tc_grid(tc_df, self._tc_avg_radius_lat_deg, self._clip_threshold)
+        dataset = dataset.map(
+            lambda X, row: (
+                X,
+                tf.cast(row['TC'], tf.float32)[None],
+                cls._create_focused_mask(grid, row, self._clip_threshold),
+            ),
+            num_parallel_calls=tf.data.AUTOTUNE,
+        )
+
         # Set the output shape.
         dataset = dataset.map(
                 lambda X, Y, mask: cls._set_shape(X, Y, mask, len(self._previous_hours) + 1, self._data_shape))
@@ -225,6 +257,23 @@ class TimeSeriesFocusedTCFormationDataLoader(TimeSeriesTropicalCycloneDataLoader
         print('DONE creating dataset.')
         return dataset
 
+    @classmethod
+    def _create_focused_mask(cls, grid: tc_grid.TCGridProbability, row: dict, clip_threshold: float) -> tf.Tensor:
+        """
+        In-graph version of `_create_tc_locations_mask` and `_create_fake_focused_mask_for_non_TC_observation`.
+        """
+        latitudes, longitudes = grid.latitudes, grid.longitudes
+
+        # Randomly create focused region for observations without TC.
+        random_centre = tf.stack([
+            tf.random.uniform([], float(np.min(latitudes)) + 20, float(np.max(latitudes)) - 5),
+            tf.random.uniform([], float(np.min(longitudes)) + 5, float(np.max(longitudes)) - 5),
+        ])
+        tc_centre = tf.stack([row['Latitude'], row['Longitude']])
+        centre = tf.where(tf.cast(row['TC'], tf.bool), tc_centre, random_centre)
+
+        return tc_grid.probability_to_mask(grid.single(centre[None]), clip_threshold, inside=1.0)
+
     def load_single_data(self, data_paths: List[str], has_tc: bool, latitude: float, longitude: float):
         cls = TimeSeriesFocusedTCFormationDataLoader
 
@@ -236,6 +285,8 @@ class TimeSeriesFocusedTCFormationDataLoader(TimeSeriesTropicalCycloneDataLoader
             tc_locations=[(latitude, longitude)],
             tc_avg_radius_lat_deg=self._tc_avg_radius_lat_deg,
             clip_threshold=self._clip_threshold,
+            tensor_cache=self._frame_cache,
+            store=self._store,
         )
 
         return data
@@ -250,18 +301,21 @@ class TimeSeriesFocusedTCFormationDataLoader(TimeSeriesTropicalCycloneDataLoader
         tc_locations: List[Tuple[float, float]],
         tc_avg_radius_lat_deg: int = 3,
         clip_threshold: float = 0.1,
+        tensor_cache: TensorCache = None,
+        store: ObservationStore = None,
     ):
         assert len(paths) > 0, 'Paths should have at least one element!'
 
         datasets = []
         for path in paths:
-            dataset = xr.open_dataset(path, engine='netcdf4')
-            latitudes = dataset['lat']
-            longitudes = dataset['lon']
-            dataset = data_utils.extract_variables_from_dataset(dataset, subset)
+            dataset = data_utils.load_variables_from_path(path, subset, tensor_cache, store)
             datasets.append(np.expand_dims(dataset, axis=0))
         datasets = np.concatenate(datasets, axis=0)
 
+        # All observations share the same grid,
+        # so we only need the coordinates of the last one.
+        latitudes, longitudes = data_utils.load_coordinates_from_path(paths[-1], store)
+
         mask = cls._create_tc_locations_mask(
             data_shape,
             latitudes,
@@ -1,36 +1,162 @@
-from datetime import timedelta
-from functools import reduce
+from ast import literal_eval
+import numpy as np
+import os
 import pandas as pd
 from typing import Union, List
 
 
-def _parse_tc_datetime(column: pd.Series):
-    return pd.to_datetime(column, format='%Y-%m-%d %H:%M:%S')
+_SECONDS_PER_HOUR = 3600
+
+# Columns of dates as int64 seconds since epoch,
+# so we only have to parse the datetime strings once.
+DATE_EPOCH_COLUMN = 'Date Epoch'
+FIRST_OBSERVED_EPOCH_COLUMN = 'First Observed Epoch'
 
+_CONCAT_COLUMNS = [
+    'TC Id',
+    'First Observed',
+    'Last Observed',
+    'Latitude',
+    'Longitude',
+    'First Observed Type',
+    'Will Develop to TC',
+    'Developing Date',
+    FIRST_OBSERVED_EPOCH_COLUMN,
+]
+
+
+# List columns of (lat, lon) pairs.
+LOCATION_COLUMNS = ['Other TC Locations']
+
+PARQUET_EXTENSION = '.parquet'
+
+
+def is_parquet(path: str) -> bool:
+    return os.path.splitext(path)[1] == PARQUET_EXTENSION
+
+
+def read_parquet_label(path: str) -> pd.DataFrame:
+    """
+    Read label stored as parquet,
+    where list columns are stored as native list columns instead of python literal strings,
+    and dates are stored as timestamps.
 
-def _group_observations_by_date(tc_labels: pd.DataFrame):
-    def concat_values(values):
-        return reduce(lambda agg, x: agg + [x], values, [])
+    Columns of (lat, lon) pairs are converted into float64 arrays of shape (k, 2),
+    which is the same as the result of `literal_eval` on the csv label.
+    """
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(path)
+    df = table.to_pandas()
+    for col in LOCATION_COLUMNS:
+        if col in df.columns:
+            df[col] = _location_arrays(table.column(col).combine_chunks())
+
+    return df
+
+
+def write_label(df: pd.DataFrame, path: str, **csv_kwargs):
+    """
+    Write label as parquet if `path` ends with `.parquet`, otherwise as csv.
+    """
+    # Locations might be parsed into arrays,
+    # convert them back to lists so they are written the same as the original labels.
+    df = df.copy()
+    for col in LOCATION_COLUMNS:
+        if col in df.columns:
+            df[col] = [[tuple(p) for p in np.asarray(x, dtype=np.float64).reshape((-1, 2)).tolist()]
+                       for x in df[col]]
+
+    if is_parquet(path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        # Give location columns an explicit type,
+        # otherwise they are stored as list<null> when there is no location at all.
+        location_type = pa.list_(pa.list_(pa.float64()))
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        for col in LOCATION_COLUMNS:
+            if col in table.column_names:
+                idx = table.column_names.index(col)
+                table = table.set_column(idx, pa.field(col, location_type), table.column(col).cast(location_type))
+
+        pq.write_table(table, path)
+    else:
+        df.to_csv(path, **csv_kwargs)
+
+
+def parse_locations(column: pd.Series) -> pd.Series:
+    """
+    Convert a column of (lat, lon) pairs into float64 arrays of shape (k, 2).
+    Columns read from csv label are python literal strings,
+    while columns read from parquet label are already arrays.
+    """
+    return column.apply(
+        lambda x: np.asarray(literal_eval(x) if isinstance(x, str) else x, dtype=np.float64).reshape((-1, 2)))
 
-    grouped = tc_labels.groupby('Date')
 
-    tc_labels['TC'] = grouped['TC'].transform(
-            lambda has_tc: reduce(lambda agg, x: agg and x, has_tc, True))
+def _location_arrays(column) -> np.ndarray:
+    # The column is list<list<double>>, so we can split the flat values
+    # by the outer offsets, instead of converting the pairs one by one.
+    import pyarrow as pa
+
+    offsets = column.offsets.to_numpy()
+    # Labels written without any location have list<null> columns.
+    points = (np.zeros((0, 2), dtype=np.float64)
+              if pa.types.is_null(column.type.value_type)
+              else column.flatten().flatten().to_numpy(zero_copy_only=False).astype(np.float64).reshape((-1, 2)))
+
+    result = np.empty(len(column), dtype=object)
+    for i, locations in enumerate(np.split(points, offsets[1:-1] - offsets[0])):
+        result[i] = locations
+    return result
 
-    concate_columns = [
-            'TC Id',
-            'First Observed',
-            'Last Observed',
-            'Latitude',
-            'Longitude',
-            'First Observed Type',
-            'Will Develop to TC',
-            'Developing Date',
-        ]
-    for col in concate_columns:
-        tc_labels[col] = grouped[col].transform(concat_values)
 
-    return tc_labels.drop_duplicates('Date', keep='first')
+def _to_epoch_seconds(column: pd.Series) -> np.ndarray:
+    """
+    Parse datetime strings into int64 seconds since epoch,
+    missing dates are set to -1.
+    """
+    dates = pd.to_datetime(column, format='%Y-%m-%d %H:%M:%S', errors='coerce')
+    return np.where(
+        dates.isna(),
+        -1,
+        dates.values.astype('datetime64[s]').astype(np.int64))
+
+
+def add_epoch_columns(tc: pd.DataFrame) -> pd.DataFrame:
+    tc = tc.copy()
+    tc[DATE_EPOCH_COLUMN] = _to_epoch_seconds(tc['Date'])
+    tc[FIRST_OBSERVED_EPOCH_COLUMN] = _to_epoch_seconds(tc['First Observed'])
+    return tc
+
+
+def _epoch_column(tc: pd.DataFrame, epoch_column: str, column: str) -> np.ndarray:
+    if epoch_column in tc.columns:
+        return tc[epoch_column].values.astype(np.int64)
+
+    return _to_epoch_seconds(tc[column])
+
+
+def _group_observations_by_date(tc_labels: pd.DataFrame):
+    """
+    Group rows of the same observation date into one row,
+    where the TC-related columns become lists of values of the grouped rows,
+    and the TC column is True only when all grouped rows have TC.
+    """
+    grouped = tc_labels.groupby('Date', sort=False)
+    grouped_tc = grouped['TC'].all()
+
+    concat_columns = [col for col in _CONCAT_COLUMNS if col in tc_labels.columns]
+    concatenated = grouped[concat_columns].agg(list)
+
+    result = tc_labels.drop_duplicates('Date', keep='first').copy()
+    dates = result['Date']
+    result['TC'] = grouped_tc.reindex(dates).values.astype(bool)
+    for col in concat_columns:
+        result[col] = concatenated[col].reindex(dates).values
+
+    return result
 
 
 def filter_in_leadtime(tc: pd.DataFrame, leadtimes: Union[List[int], int] = None):
@@ -40,29 +166,33 @@ def filter_in_leadtime(tc: pd.DataFrame, leadtimes: Union[List[int], int] = None
     if not isinstance(leadtimes, list):
         leadtimes = [leadtimes]
 
-    # First, we will keep all negative cases.
-    mask = ~tc['TC']
+    observation_dates = _epoch_column(tc, DATE_EPOCH_COLUMN, 'Date')
+    tc_first_observed_dates = _epoch_column(tc, FIRST_OBSERVED_EPOCH_COLUMN, 'First Observed')
+    leadtime_seconds = np.asarray(leadtimes, dtype=np.int64) * _SECONDS_PER_HOUR
 
-    # Then, loop through each lead time to get observations that belong to that leadtime.
-    observation_dates = _parse_tc_datetime(tc['Date'])
-    tc_first_observed_dates = _parse_tc_datetime(tc['First Observed'])
-    for leadtime in leadtimes:
-        leadtime = timedelta(hours=leadtime)
-        mask |= (tc_first_observed_dates - observation_dates) == leadtime
+    # Keep all negative cases,
+    # and positive cases that belong to one of the lead times.
+    mask = ~tc['TC'].values.astype(bool)
+    mask |= ((tc_first_observed_dates >= 0)
+             & np.isin(tc_first_observed_dates - observation_dates, leadtime_seconds))
 
     return tc[mask]
 
 
 def load_label(label_path, group_observation_by_date=True, leadtime=None) -> pd.DataFrame:
-    label = pd.read_csv(label_path, dtype={
-        'TC Id': str,
-        'First Observed': str,
-        'Last Observed': str,
-        'First Observed Type': str,
-        'Will Develop to TC': str,
-        'Developing Date': str,
-    })
-
+    if is_parquet(label_path):
+        label = read_parquet_label(label_path)
+    else:
+        label = pd.read_csv(label_path, dtype={
+            'TC Id': str,
+            'First Observed': str,
+            'Last Observed': str,
+            'First Observed Type': str,
+            'Will Develop to TC': str,
+            'Developing Date': str,
+        })
+
+    label = add_epoch_columns(label)
     label = filter_in_leadtime(label, leadtime)
     if group_observation_by_date:
         label = _group_observations_by_date(label)
@@ -1,6 +1,8 @@
 from .. import label as label
 from .. import tfd_utils as tfd_utils
 from .. import utils as data_utils
+from ..observation_store import ObservationStore
+from ..tensor_cache import TensorCache
 from ..time_series import TimeSeriesTropicalCycloneDataLoader
 from ..time_series_addons import SingleTimeStepMixin
 
@@ -9,7 +11,6 @@ import numpy as np
 import pandas as pd
 import tensorflow as tf
 from typing import List, Tuple
-import xarray as xr
 
 
 
@@ -28,6 +29,8 @@ class TimeSeriesTropicalCycloneOccurenceDataLoader(TimeSeriesTropicalCycloneData
                             [path.decode('utf-8') for path in row['Path'].numpy()],
                             self._subset,
                             row['TC'].numpy(),
+                            self._frame_cache,
+                            self._store,
                         ),
                     inp=[row],
                     Tout=[tf.float32, tf.float32],
@@ -53,12 +56,13 @@ class TimeSeriesTropicalCycloneOccurenceDataLoader(TimeSeriesTropicalCycloneData
             paths: List[str],
             subset: dict,
             has_tc: bool,
+            tensor_cache: TensorCache = None,
+            store: ObservationStore = None,
         ) -> Tuple[np.ndarray, np.ndarray]:
 
         datasets = []
         for path in paths:
-            dataset = xr.open_dataset(path, engine='netcdf4')
-            dataset = data_utils.extract_variables_from_dataset(dataset, subset)
+            dataset = data_utils.load_variables_from_path(path, subset, tensor_cache, store)
             datasets.append(np.expand_dims(dataset, axis=0))
         datasets = np.concatenate(datasets, axis=0)
 
@@ -1,12 +1,13 @@
 from .. import tfd_utils as tfd_utils
 from .. import utils as data_utils
+from ..tensor_cache import TensorCache
+from ..vortex_removal_stage import VortexRemovalStage
 from .time_range import TimeSeriesTimeRangeDataLoader
 
 import numpy as np
 import numpy.typing as npt
 import pandas as pd
 import tensorflow as tf
-import xarray as xr
 
 
 class TimeSeriesTropicalCycloneOccurenceTimeRangeDataLoader(TimeSeriesTimeRangeDataLoader):
@@ -27,6 +28,7 @@ class TimeSeriesTropicalCycloneOccurenceTimeRangeDataLoader(TimeSeriesTimeRangeD
                             [path.decode('utf-8') for path in row['Path'].numpy()],
                             row['Genesis'].numpy(),
                             self._subset,
+                            self._tensor_cache,
                         ),
                     inp=[row],
                     Tout=[tf.float32, tf.float32],
@@ -52,8 +54,8 @@ class TimeSeriesTropicalCycloneOccurenceTimeRangeDataLoader(TimeSeriesTimeRangeD
 
 
 class TropicalCycloneOccurenceTimeRangeDataLoader(TimeSeriesTropicalCycloneOccurenceTimeRangeDataLoader):
-    def __init__(self, data_shape: tuple[int, int, int], subset: dict) -> None:
-        super().__init__(data_shape, previous_hours=[], subset=subset)
+    def __init__(self, data_shape: tuple[int, int, int], subset: dict, tensor_cache: TensorCache = None, vortex_removal: VortexRemovalStage = None) -> None:
+        super().__init__(data_shape, previous_hours=[], subset=subset, tensor_cache=tensor_cache, vortex_removal=vortex_removal)
 
     def load_dataset(
             self,
@@ -70,11 +72,10 @@ def _remove_time_dim(X, y):
     return tf.squeeze(X, axis=1), y
 
 
-def _load_observations(paths: list[str], genesis: npt.NDArray, subset: dict = None) -> tuple[npt.NDArray, npt.NDArray]:
+def _load_observations(paths: list[str], genesis: npt.NDArray, subset: dict = None, tensor_cache: TensorCache = None) -> tuple[npt.NDArray, npt.NDArray]:
     observations = []
     for path in paths:
-        dataset = xr.load_dataset(path)
-        dataset = data_utils.extract_variables_from_dataset(dataset, subset)
+        dataset = data_utils.load_variables_from_path(path, subset, tensor_cache)
         observations.append(np.expand_dims(dataset, axis=0))
 
     observations = np.concatenate(observations, axis=0)
@@ -1,16 +1,25 @@
+from __future__ import annotations
+
+from .. import label, observation_index
+from ..tensor_cache import TensorCache
+from ..vortex_removal_stage import VortexRemovalStage
+
 import abc
 from ast import literal_eval
-from datetime import datetime, timedelta
 import numpy.typing as npt
 import os
 import pandas as pd
 import tensorflow as tf
 
 
-_TIME_STR_FMT = '%Y%m%d_%H_%M'
-
 def load_time_range_label(path: str) -> pd.DataFrame:
     assert os.path.isfile(path), f'Invalid time range label path: {path}'
+
+    # Parquet label already has list columns and timestamps,
+    # Other_TC are structs of SID, Latitude and Longitude instead of tuples.
+    if label.is_parquet(path):
+        return pd.read_parquet(path, engine='pyarrow')
+
     df = pd.read_csv(
         path,
         converters=dict(
@@ -29,10 +38,15 @@ class TimeSeriesTimeRangeDataLoader(abc.ABC):
     def __init__(self,
             data_shape: tuple[int, int, int],
             previous_hours: list[int] = [],
-            subset: dict = None) -> None:
+            subset: dict = None,
+            tensor_cache: TensorCache = None,
+            vortex_removal: VortexRemovalStage = None) -> None:
         self._data_shape = data_shape
         self._previous_hours = previous_hours
         self._subset = subset
+        self._tensor_cache = (vortex_removal.wrap(tensor_cache)
+                              if vortex_removal is not None
+                              else tensor_cache)
 
     @abc.abstractmethod
     def _process_to_dataset(self, label_df: pd.DataFrame) -> tf.data.Dataset:
@@ -51,10 +65,10 @@ class TimeSeriesTimeRangeDataLoader(abc.ABC):
 
         label_df = load_time_range_label(path)
         print(label_df.columns)
-        label_df['Path'] = label_df.apply(
-                lambda row: self._add_previous_hours_paths(row['Date'], row['Path']),
-                axis=1)
-        label_df = label_df[label_df['Path'].apply(_are_all_paths_valid)]
+        label_df['Path'], valid = observation_index.add_previous_observation_paths(
+                label_df['Path'],
+                offsets_hours=[0] + list(self._previous_hours))
+        label_df = label_df[valid]
         dataset = self._process_to_dataset(label_df)
 
         if caching:
@@ -66,23 +80,3 @@ class TimeSeriesTimeRangeDataLoader(abc.ABC):
         dataset = dataset.batch(batch_size)
         return dataset.prefetch(tf.data.AUTOTUNE)
 
-
-    def _add_previous_hours_paths(self, current: datetime, path: str) -> list[str]:
-        parent_dir = os.path.dirname(path)
-        filename, _ = os.path.splitext(os.path.basename(path))
-        prefix = filename.split('_')[0]
-
-        paths = [path]
-
-        for previous_hour in self._previous_hours:
-            previous_date = current - timedelta(hours=previous_hour)
-            previous_date_fn = f'{prefix}_{previous_date.strftime(_TIME_STR_FMT)}.nc'
-
-            previous_date_path = os.path.join(parent_dir, previous_date_fn)
-            paths.append(previous_date_path)
-
-        return paths
-
-
-def _are_all_paths_valid(paths: list[str]) -> bool:
-    return all(os.path.isfile(path) for path in paths)
@@ -1,12 +1,10 @@
 from __future__ import annotations
 
 from .. import label
+from .. import observation_index
 from .. import utils as data_utils
 
 import abc
-from datetime import datetime, timedelta
-from functools import partial
-import os
 import pandas as pd
 import tensorflow as tf
 
@@ -36,11 +34,11 @@ class TimeSeriesTropicalCycloneDataLoaderV2:
                 group_observation_by_date=True,
                 leadtime=leadtimes)
         print('Dataframe in memory')
-        tc_df['Path'] = tc_df['Path'].apply(
-            partial(_add_previous_observation_data_paths,
-                    previous_times=self._previous_hours))
+        tc_df['Path'], valid = observation_index.add_previous_observation_paths(
+            tc_df['Path'],
+            offsets_hours=sorted(self._previous_hours) + [0])
         print('Add previous hours')
-        tc_df = tc_df[tc_df['Path'].apply(_are_valid_paths)]
+        tc_df = tc_df[valid]
         print('Check previous hours valid')
         print(f'Remaining rows: {len(tc_df)}')
 
@@ -67,24 +65,3 @@ class TimeSeriesTropicalCycloneDataLoaderV2:
     def load_single_data(self, data_path):
         ...
 
-
-def _add_previous_observation_data_paths(path: str, previous_times: list[int]) -> list[str]:
-    dirpath = os.path.dirname(path)
-    name = os.path.basename(path)
-    name, _ = os.path.splitext(name)
-    # The date of the observation is embedded in the filename: `fnl_%Y%m%d_%H_%M.nc`
-    name_parts = name.split('_')
-    name_prefix = name_parts[0]
-    date_part = ''.join('_'.join(name_parts[1:]))
-
-    date = datetime.strptime(date_part, '%Y%m%d_%H_%M')
-
-    previous_times = previous_times.copy()
-    previous_times.sort()
-    dates = [date - timedelta(hours=time) for time in previous_times]
-    dates += [date]
-    return [os.path.join(dirpath, f"{name_prefix}_{d.strftime('%Y%m%d_%H_%M')}.nc") for d in dates]
-
-
-def _are_valid_paths(paths: list[str]) -> bool:
-    return all([os.path.isfile(p) for p in paths])
@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import numpy as np
+import os
+import pandas as pd
+
+
+_TIME_STR_FMT = '%Y%m%d_%H_%M'
+_SECONDS_PER_HOUR = 3600
+
+
+def parse_observation_filenames(filenames: pd.Series) -> tuple[pd.Series, np.ndarray]:
+    """
+    Vectorized parsing of observation filenames `<prefix>_%Y%m%d_%H_%M.nc`.
+
+    :returns: prefixes, and dates as int64 seconds since epoch.
+    Dates of filenames that cannot be parsed are set to -1.
+    """
+    stems = filenames.str.replace(r'\.nc$', '', regex=True)
+    parts = stems.str.split('_', n=1)
+    prefixes = parts.str[0]
+    dates = pd.to_datetime(parts.str[1], format=_TIME_STR_FMT, errors='coerce')
+    seconds = np.where(
+        dates.isna(),
+        -1,
+        dates.values.astype('datetime64[s]').astype(np.int64))
+    return prefixes, seconds
+
+
+class ObservationIndex:
+    """
+    Index of observation files `<prefix>_%Y%m%d_%H_%M.nc` inside a directory.
+
+    The directory is scanned only once, and the observation dates are kept
+    as sorted int64 arrays (seconds since epoch) per filename prefix,
+    so we can answer questions like "which dates have all t-6h, t-12h and t-18h observations?"
+    with numpy set operations, instead of calling `strptime` and `os.path.isfile` per row.
+    """
+
+    _SNAPSHOT_VERSION = 1
+
+    # Indices of directories opened in this process.
+    _opened: dict[str, ObservationIndex] = {}
+
+    def __init__(self, directory: str, filenames: list[str], directory_mtime_ns: int | None = None):
+        self._directory = directory
+        self._directory_mtime_ns = directory_mtime_ns
+
+        filenames = pd.Series(filenames, dtype=object)
+        filenames = filenames[filenames.str.endswith('.nc')]
+        prefixes, dates = parse_observation_filenames(filenames)
+
+        valid = dates >= 0
+        filenames = filenames.values[valid]
+        prefixes = prefixes.values[valid]
+        dates = dates[valid]
+
+        self._dates = {}
+        self._filenames = {}
+        for prefix in np.unique(prefixes):
+            mask = prefixes == prefix
+            order = np.argsort(dates[mask], kind='stable')
+            self._dates[prefix] = dates[mask][order]
+            self._filenames[prefix] = filenames[mask][order]
+
+    @property
+    def directory(self) -> str:
+        return self._directory
+
+    def dates(self, prefix: str = 'fnl') -> np.ndarray:
+        return self._dates.get(prefix, np.empty(0, dtype=np.int64))
+
+    @classmethod
+    def build(cls, directory: str) -> ObservationIndex:
+        mtime_ns = os.stat(directory).st_mtime_ns
+        with os.scandir(directory) as entries:
+            filenames = [entry.name for entry in entries]
+
+        return cls(directory, filenames, mtime_ns)
+
+    @classmethod
+    def open(cls, directory: str, snapshot_path: str | None = None) -> ObservationIndex:
+        """
+        Return the index of the given directory.
+        The index is reused within the same process,
+        and is also reused across processes if `snapshot_path` is given,
+        as long as the directory hasn't been modified.
+        """
+        directory = os.path.abspath(directory)
+        mtime_ns = os.stat(directory).st_mtime_ns
+
+        index = cls._opened.get(directory)
+        if index is not None and index._directory_mtime_ns == mtime_ns:
+            return index
+
+        index = None
+        if snapshot_path is not None and os.path.isfile(snapshot_path):
+            index = cls._load_snapshot(snapshot_path, directory, mtime_ns)
+
+        if index is None:
+            index = cls.build(directory)
+            if snapshot_path is not None:
+                index.save_snapshot(snapshot_path)
+
+        cls._opened[directory] = index
+        return index
+
+    def save_snapshot(self, path: str):
+        filenames = np.concatenate(
+            [self._filenames[prefix] for prefix in self._filenames] or [np.empty(0, dtype=object)])
+        np.savez(
+            path,
+            version=ObservationIndex._SNAPSHOT_VERSION,
+            directory=self._directory,
+            directory_mtime_ns=-1 if self._directory_mtime_ns is None else self._directory_mtime_ns,
+            filenames=filenames.astype(str))
+
+    @classmethod
+    def _load_snapshot(cls, path: str, directory: str, mtime_ns: int) -> ObservationIndex | None:
+        with np.load(path, allow_pickle=False) as snapshot:
+            is_valid = (int(snapshot['version']) == cls._SNAPSHOT_VERSION
+                        and str(snapshot['directory']) == directory
+                        and int(snapshot['directory_mtime_ns']) == mtime_ns)
+            if not is_valid:
+                return None
+
+            return cls(directory, snapshot['filenames'].tolist(), mtime_ns)
+
+    def windows(self, prefix: str, dates: np.ndarray, offsets_hours: list[int]) -> tuple[np.ndarray, np.ndarray]:
+        """
+        For each of the given dates, find observations at `date - offset` for every offset.
+
+        :param dates: int64 seconds since epoch.
+        :param offsets_hours: hours before each date, in the order of the output.
+        :returns: filenames of shape (len(dates), len(offsets_hours)),
+        and a boolean mask of dates that have all the observations.
+        """
+        available_dates = self.dates(prefix)
+        dates = np.asarray(dates, dtype=np.int64)
+
+        filenames = np.full((len(dates), len(offsets_hours)), None, dtype=object)
+        if len(available_dates) == 0:
+            return filenames, np.zeros(len(dates), dtype=bool)
+
+        available_filenames = self._filenames[prefix]
+        valid = np.ones(len(dates), dtype=bool)
+        for i, offset in enumerate(offsets_hours):
+            targets = dates - offset * _SECONDS_PER_HOUR
+            pos = np.searchsorted(available_dates, targets)
+            pos = np.clip(pos, 0, len(available_dates) - 1)
+
+            valid &= available_dates[pos] == targets
+            filenames[:, i] = available_filenames[pos]
+
+        return filenames, valid
+
+
+def add_previous_observation_paths(
+        paths: pd.Series,
+        offsets_hours: list[int],
+        snapshot_dir: str | None = None,
+        available_filenames: list[str] | None = None) -> tuple[pd.Series, np.ndarray]:
+    """
+    Vectorized replacement of building previous observation paths for each row,
+    then checking whether all of them exist.
+
+    :param paths: paths to the current observations.
+    :param offsets_hours: hours before the current observation, in the order of the output paths.
+    For instance, `[6, 12, 18, 0]` will give the paths to t-6h, t-12h, t-18h, and t observations.
+    :param snapshot_dir: if given, index snapshots of the observation directories will be stored here.
+    :param available_filenames: if given, these filenames are used instead of listing the observation directories,
+    e.g. observations available in an observation store.
+    :returns: a series where each row is a list of observation paths,
+    and a boolean mask of rows that have all the observations available.
+    """
+    paths = paths.astype(str)
+    directories = paths.map(os.path.dirname)
+    prefixes, dates = parse_observation_filenames(paths.map(os.path.basename))
+
+    result = np.empty(len(paths), dtype=object)
+    valid = np.zeros(len(paths), dtype=bool)
+    groups = pd.DataFrame({'directory': directories.values, 'prefix': prefixes.values}).groupby(['directory', 'prefix']).indices
+    for (directory, prefix), rows in groups.items():
+        if available_filenames is not None:
+            index = ObservationIndex(directory, available_filenames)
+        else:
+            snapshot_path = (None if snapshot_dir is None
+                             else os.path.join(snapshot_dir, f'{_snapshot_name(directory)}.npz'))
+            index = ObservationIndex.open(directory, snapshot_path)
+
+        filenames, ok = index.windows(prefix, dates[rows], offsets_hours)
+        ok &= dates[rows] >= 0
+        valid[rows] = ok
+        result[rows] = [[os.path.join(directory, f) for f in row_filenames] if row_ok else None
+                        for row_filenames, row_ok in zip(filenames, ok)]
+
+    return pd.Series(result, index=paths.index), valid
+
+
+def _snapshot_name(directory: str) -> str:
+    return os.path.abspath(directory).strip(os.sep).replace(os.sep, '_')
@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+from . import utils as data_utils
+from collections import OrderedDict
+from datetime import datetime
+from functools import partial
+import glob
+import json
+from multiprocessing import Pool
+import numpy as np
+import os
+import pandas as pd
+import xarray as xr
+
+
+_TIME_STR_FMT = '%Y%m%d_%H_%M'
+
+
+def parse_date_from_observation_path(path: str) -> datetime:
+    """
+    The date of the observation is embedded in the filename: `fnl_%Y%m%d_%H_%M.nc`
+    """
+    name, _ = os.path.splitext(os.path.basename(path))
+    date_part = '_'.join(name.split('_')[1:])
+    return datetime.strptime(date_part, _TIME_STR_FMT)
+
+
+class ObservationStore:
+    """
+    A directory contains all observations stacked into one contiguous
+    `(time, lat, lon, channel)` float32 array,
+    which is memory-mapped so reading an observation is just a zero-copy slice.
+
+    The directory layout is:
+    * `observations.npy`: the stacked observations.
+    * `index.csv`: the date and the original filename of each observation, in the same order as the stacked array.
+    * `metadata.json`: the subset used to extract the observations, and the lat/lon coordinates.
+
+    Use `ObservationStore.build()` (or `scripts/create_observation_store.py`)
+    to convert a directory of `fnl_%Y%m%d_%H_%M.nc` files into a store.
+    """
+
+    DATA_FILENAME = 'observations.npy'
+    INDEX_FILENAME = 'index.csv'
+    METADATA_FILENAME = 'metadata.json'
+
+    def __init__(self, store_dir: str):
+        metadata_path = os.path.join(store_dir, ObservationStore.METADATA_FILENAME)
+        assert os.path.isfile(metadata_path), f'Invalid observation store: {store_dir}'
+
+        with open(metadata_path, 'r') as f:
+            metadata = json.load(f)
+
+        self._store_dir = store_dir
+        self._subset = metadata['subset']
+        self._latitudes = np.asarray(metadata['lat'])
+        self._longitudes = np.asarray(metadata['lon'])
+
+        index = pd.read_csv(os.path.join(store_dir, ObservationStore.INDEX_FILENAME))
+        self._dates = pd.to_datetime(index['Date'], format='%Y-%m-%d %H:%M:%S')
+        self._filenames = index['Filename'].tolist()
+        self._date_to_idx = {date: idx for idx, date in enumerate(self._dates)}
+
+        # Memory-map the observations in read-only mode,
+        # the OS page cache will take care of the rest.
+        self._data = np.load(
+            os.path.join(store_dir, ObservationStore.DATA_FILENAME),
+            mmap_mode='r')
+        assert len(self._data) == len(self._dates), 'Mismatch between the observations and the index.'
+
+    @property
+    def subset(self) -> OrderedDict | None:
+        if self._subset is None:
+            return None
+
+        return OrderedDict((key, lev if isinstance(lev, bool) else tuple(lev))
+                           for key, lev in self._subset)
+
+    @property
+    def latitudes(self) -> np.ndarray:
+        return self._latitudes
+
+    @property
+    def longitudes(self) -> np.ndarray:
+        return self._longitudes
+
+    @property
+    def dates(self) -> pd.Series:
+        return self._dates
+
+    @property
+    def filenames(self) -> list[str]:
+        return self._filenames
+
+    @property
+    def data(self) -> np.ndarray:
+        return self._data
+
+    @property
+    def shape(self) -> tuple:
+        return self._data.shape
+
+    def index_of(self, path_or_date: str | datetime) -> int:
+        date = (parse_date_from_observation_path(path_or_date)
+                if isinstance(path_or_date, str)
+                else path_or_date)
+        return self._date_to_idx[pd.Timestamp(date)]
+
+    def __contains__(self, path_or_date: str | datetime) -> bool:
+        try:
+            self.index_of(path_or_date)
+            return True
+        except (KeyError, ValueError):
+            return False
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def load(self, path: str, subset: dict | None = None) -> np.ndarray:
+        """
+        Return the observation at the date embedded in `path` as a read-only view,
+        i.e. the observation file itself is never touched.
+
+        :param subset: if given, it must be the same as the subset used to build the store.
+        """
+        if subset is not None and data_utils.normalize_subset(subset) != self._subset:
+            raise ValueError(f'Requested subset does not match the subset of the store at {self._store_dir}')
+
+        return self._data[self.index_of(path)]
+
+    @classmethod
+    def build(
+            cls,
+            observation_dir: str,
+            store_dir: str,
+            subset: OrderedDict,
+            processes: int = 8) -> ObservationStore:
+        """
+        Convert all `.nc` files in `observation_dir` into a store at `store_dir`.
+        """
+        paths = glob.glob(os.path.join(observation_dir, '*.nc'))
+        assert len(paths) > 0, f'No observation file in {observation_dir}'
+        paths = sorted(paths, key=parse_date_from_observation_path)
+
+        # Use the first observation to figure out the shape and coordinates.
+        with xr.open_dataset(paths[0], engine='netcdf4') as ds:
+            latitudes = ds['lat'].values
+            longitudes = ds['lon'].values
+            sample = data_utils.extract_variables_from_dataset(ds, subset)
+
+        os.makedirs(store_dir, exist_ok=True)
+        data_path = os.path.join(store_dir, cls.DATA_FILENAME)
+        data = np.lib.format.open_memmap(
+            data_path,
+            mode='w+',
+            dtype=np.float32,
+            shape=(len(paths),) + sample.shape)
+        del data
+
+        # Each worker writes to its own rows of the memory-mapped array.
+        with Pool(processes) as pool:
+            pool.starmap(
+                partial(_write_observation, data_path=data_path, subset=subset, shape=sample.shape),
+                enumerate(paths))
+
+        pd.DataFrame({
+            'Date': [parse_date_from_observation_path(p) for p in paths],
+            'Filename': [os.path.basename(p) for p in paths],
+        }).to_csv(os.path.join(store_dir, cls.INDEX_FILENAME), index=False)
+
+        # Metadata is written last,
+        # so an incomplete store can never be opened.
+        with open(os.path.join(store_dir, cls.METADATA_FILENAME), 'w') as f:
+            json.dump(dict(
+                subset=data_utils.normalize_subset(subset),
+                lat=latitudes.tolist(),
+                lon=longitudes.tolist(),
+            ), f)
+
+        return cls(store_dir)
+
+
+def _write_observation(idx: int, path: str, data_path: str, subset: OrderedDict, shape: tuple):
+    with xr.open_dataset(path, engine='netcdf4') as ds:
+        values = data_utils.extract_variables_from_dataset(ds, subset)
+
+    assert values.shape == shape, f'Observation {path} has shape {values.shape}, expected {shape}'
+
+    data = np.load(data_path, mmap_mode='r+')
+    data[idx] = values
+    data.flush()
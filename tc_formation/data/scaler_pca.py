@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import numpy as np
+import os
+import tempfile
+
+
+class StreamingMoments:
+    """
+    Running mean and co-moment matrix of channel-last values,
+    which are accumulated batch by batch with Chan's parallel update of Welford's algorithm.
+
+    Moments of different batches (e.g. computed in different processes)
+    can be combined with `merge()`, so the data is only read once.
+    """
+
+    def __init__(self, nb_channels: int) -> None:
+        self.count = 0
+        self.mean = np.zeros(nb_channels, dtype=np.float64)
+        # Sum of outer products of deviations from the mean.
+        self.comoment = np.zeros((nb_channels, nb_channels), dtype=np.float64)
+
+    @classmethod
+    def from_values(cls, values: np.ndarray) -> StreamingMoments:
+        """
+        :param values: array of shape (..., C), all leading axes are treated as samples.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        values = values.reshape((-1, values.shape[-1]))
+
+        moments = cls(values.shape[-1])
+        moments.count = len(values)
+        if moments.count > 0:
+            moments.mean = values.mean(axis=0)
+            deviations = values - moments.mean
+            moments.comoment = deviations.T @ deviations
+
+        return moments
+
+    def update(self, values: np.ndarray) -> StreamingMoments:
+        return self.merge(StreamingMoments.from_values(values))
+
+    def merge(self, other: StreamingMoments) -> StreamingMoments:
+        assert self.mean.shape == other.mean.shape, 'Moments must have the same number of channels.'
+        count = self.count + other.count
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.mean, self.comoment = other.count, other.mean.copy(), other.comoment.copy()
+            return self
+
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * (other.count / count)
+        self.comoment = (self.comoment + other.comoment
+                         + np.outer(delta, delta) * (self.count * other.count / count))
+        self.count = count
+        return self
+
+    @property
+    def var(self) -> np.ndarray:
+        """Population variance, the same as sklearn's `StandardScaler.var_`."""
+        return np.diag(self.comoment) / self.count
+
+    def covariance(self, ddof: int = 1) -> np.ndarray:
+        return self.comoment / (self.count - ddof)
+
+
+class ScalerPCA:
+    """
+    Standard scaler followed by PCA, fitted from `StreamingMoments`.
+
+    The PCA basis is the eigenvectors of the covariance matrix of the standardized values,
+    which is what sklearn's `IncrementalPCA` converges to after `StandardScaler`,
+    but without reading the data a second time.
+    Attributes are named after sklearn's, so this can be passed to
+    `SklearnStandardScaler` and `SklearnPCALayer` in place of the sklearn objects.
+    """
+
+    def __init__(
+            self,
+            mean: np.ndarray,
+            var: np.ndarray,
+            components: np.ndarray,
+            explained_variance: np.ndarray,
+            explained_variance_ratio: np.ndarray) -> None:
+        self.mean_ = np.asarray(mean, dtype=np.float64)
+        self.var_ = np.asarray(var, dtype=np.float64)
+        # Zero variance channels are not scaled, the same as sklearn.
+        self.scale_ = np.where(self.var_ > 0, np.sqrt(self.var_), 1.0)
+        self.components_ = np.asarray(components, dtype=np.float64)
+        self.explained_variance_ = np.asarray(explained_variance, dtype=np.float64)
+        self.explained_variance_ratio_ = np.asarray(explained_variance_ratio, dtype=np.float64)
+
+    @property
+    def n_components(self) -> int:
+        return len(self.components_)
+
+    @classmethod
+    def fit(cls, moments: StreamingMoments, n_components: int) -> ScalerPCA:
+        assert moments.count > 1, 'At least 2 samples are required.'
+        var = moments.var
+        scale = np.where(var > 0, np.sqrt(var), 1.0)
+
+        # Covariance of the standardized values.
+        covariance = moments.covariance(ddof=1) / np.outer(scale, scale)
+        eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+
+        # Sort in descending order of explained variance.
+        order = np.argsort(eigenvalues)[::-1]
+        eigenvalues = np.clip(eigenvalues[order], 0, None)
+        eigenvectors = eigenvectors[:, order]
+
+        return cls(
+            mean=moments.mean,
+            var=var,
+            components=eigenvectors[:, :n_components].T,
+            explained_variance=eigenvalues[:n_components],
+            explained_variance_ratio=eigenvalues[:n_components] / eigenvalues.sum())
+
+    def scale(self, values: np.ndarray) -> np.ndarray:
+        return (values - self.mean_) / self.scale_
+
+    def transform(self, values: np.ndarray) -> np.ndarray:
+        """
+        Scale and project values of shape (..., C) into shape (..., n_components).
+        """
+        return self.scale(values) @ self.components_.T
+
+    def save(self, path: str):
+        # Write to a temporary file first,
+        # so other processes never read a partially written artifact.
+        outdir = os.path.dirname(path) or '.'
+        os.makedirs(outdir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=outdir, suffix='.npz')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(
+                    f,
+                    mean=self.mean_,
+                    var=self.var_,
+                    components=self.components_,
+                    explained_variance=self.explained_variance_,
+                    explained_variance_ratio=self.explained_variance_ratio_)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> ScalerPCA:
+        with np.load(path, allow_pickle=False) as artifact:
+            return cls(
+                mean=artifact['mean'],
+                var=artifact['var'],
+                components=artifact['components'],
+                explained_variance=artifact['explained_variance'],
+                explained_variance_ratio=artifact['explained_variance_ratio'])
@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+from . import utils as data_utils
+from collections import OrderedDict
+import numpy as np
+import os
+import threading
+
+
+# Observations are 6-hourly.
+_OBSERVATION_INTERVAL_HOURS = 6
+
+
+class SlidingWindowFrameBuffer:
+    """
+    Ring buffer of extracted observation frames,
+    so that time series samples sharing the same observations
+    (e.g. with `previous_hours=[6, 12, 18]`, each observation belongs to 4 samples)
+    decode each observation only once.
+
+    Frames are stored in a preallocated `(capacity, lat, lon, channel)` array,
+    and the oldest frame is overwritten when the buffer is full.
+    Therefore, samples must be processed in chronological order for the buffer to be effective.
+
+    The buffer has the same `load(path, subset)` interface as `TensorCache`,
+    so it can be passed wherever a tensor cache is accepted.
+    It assumes that all frames are extracted with the same `subset`.
+    """
+
+    def __init__(self, capacity: int, tensor_cache=None):
+        """
+        :param capacity: maximum number of frames to keep in memory.
+        :param tensor_cache: where to load frames that are not in the buffer from.
+        """
+        assert capacity > 0, 'Capacity must be positive.'
+        self._capacity = capacity
+        self._tensor_cache = tensor_cache
+        self._frames = None
+        self._slots = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_previous_hours(cls, previous_hours: list[int], tensor_cache=None, slack: int | None = None) -> SlidingWindowFrameBuffer:
+        """
+        Create a buffer large enough to hold every frame of a window,
+        plus `slack` frames to tolerate samples being loaded out of order by parallel map.
+        """
+        slack = os.cpu_count() if slack is None else slack
+        span = max(previous_hours, default=0) // _OBSERVATION_INTERVAL_HOURS + 1
+        return cls(span + slack, tensor_cache=tensor_cache)
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    def load(self, path: str, subset: dict | None) -> np.ndarray:
+        with self._lock:
+            slot = self._slots.get(path)
+            if slot is not None:
+                # The slot might be overwritten by other threads later on,
+                # so we have to return a copy.
+                return self._frames[slot].copy()
+
+        frame = data_utils.load_variables_from_path(path, subset, self._tensor_cache)
+
+        with self._lock:
+            if path not in self._slots:
+                self._insert(path, frame)
+
+        return frame
+
+    def clear(self):
+        with self._lock:
+            self._slots.clear()
+
+    def _insert(self, path: str, frame: np.ndarray):
+        if self._frames is None:
+            self._frames = np.empty((self._capacity,) + frame.shape, dtype=frame.dtype)
+
+        if len(self._slots) < self._capacity:
+            slot = len(self._slots)
+        else:
+            # Evict the oldest frame.
+            _, slot = self._slots.popitem(last=False)
+
+        self._frames[slot] = frame
+        self._slots[path] = slot
@@ -1,6 +1,8 @@
 from .coordinate import SubregionCoordinate
 from .divider import SubRegionDivider
 from .utils import IsOceanChecker
+from ..observation_store import ObservationStore
+from ..tensor_cache import TensorCache
 from ..tfd_utils import new_py_function
 from ..time_series_addons import SingleTimeStepMixin
 from .. import utils as data_utils
@@ -9,7 +11,6 @@ import pandas as pd
 import tensorflow as tf
 from tc_formation.data.time_series import TimeSeriesTropicalCycloneDataLoader
 from typing import List, Tuple
-import xarray as xr
 
 
 class SubRegionsTimeSeriesTropicalCycloneDataLoader(TimeSeriesTropicalCycloneDataLoader):
@@ -22,10 +23,10 @@ class SubRegionsTimeSeriesTropicalCycloneDataLoader(TimeSeriesTropicalCycloneDat
         try:
             return self._divider
         except AttributeError:
-            data = xr.load_dataset(data_path, engine='netcdf4')
+            latitudes, longitudes = data_utils.load_coordinates_from_path(data_path, self._store)
             self._divider = SubRegionDivider(
-                    data['lat'].values,
-                    data['lon'].values,
+                    latitudes,
+                    longitudes,
                     self._subregion_size,
                     self._subregion_stride)
             return self._divider
@@ -60,6 +61,8 @@ class SubRegionsTimeSeriesTropicalCycloneDataLoader(TimeSeriesTropicalCycloneDat
                             row['Latitude'].numpy(),
                             row['Longitude'].numpy(),
                             negative_subregions_ratio,
+                            self._frame_cache,
+                            self._store,
                         ),
                     inp=[row],
                     Tout=[tf.float32, tf.float32],
@@ -92,14 +95,15 @@ class SubRegionsTimeSeriesTropicalCycloneDataLoader(TimeSeriesTropicalCycloneDat
             will_form: bool,
             latitude: float,
             longitude: float,
-            negative_subregions_ratio: bool) -> Tuple[np.ndarray, np.ndarray]:
+            negative_subregions_ratio: bool,
+            tensor_cache: TensorCache = None,
+            store: ObservationStore = None) -> Tuple[np.ndarray, np.ndarray]:
         # assert len(coords_idx) == len(is_region_ocean) 
         # assert len(coords_deg) == len(coords_idx)
 
         datasets = []
         for path in paths:
-            dataset = xr.open_dataset(path, engine='netcdf4')
-            dataset = data_utils.extract_variables_from_dataset(dataset, subset)
+            dataset = data_utils.load_variables_from_path(path, subset, tensor_cache, store)
             datasets.append(np.expand_dims(dataset, axis=0))
 
         # After this step,
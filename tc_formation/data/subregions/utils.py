@@ -1,6 +1,6 @@
-from global_land_mask import globe
 import numpy as np
 from .coordinate import SubregionCoordinate
+from tc_formation.utils.land_sea_mask import LandSeaMask
 
 
 class IsOceanChecker:
@@ -14,9 +14,7 @@ class IsOceanChecker:
         try:
             return self._ocean_mask
         except AttributeError:
-            lon = np.where(self._longitudes < 180.0, self._longitudes, 360.0 - self._longitudes)
-            yy, xx = np.meshgrid(lon, self._latitudes)
-            self._ocean_mask = globe.is_ocean(xx, yy)
+            self._ocean_mask = LandSeaMask.for_grid(self._latitudes, self._longitudes).ocean
             return self._ocean_mask
 
     def check(self, coord: SubregionCoordinate) -> bool:
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+from . import utils as data_utils
+import hashlib
+import json
+import numpy as np
+import os
+import tempfile
+import xarray as xr
+
+
+class TensorCache:
+    """
+    On-disk cache of the channel-last arrays produced by `extract_variables_from_dataset`.
+
+    Each entry is a raw `.npy` file whose name is derived from
+    the observation path, its mtime and size, the (normalized) `subset`, and the dtype.
+    Therefore, modifying an observation file or changing the subset will never hit a stale entry.
+
+    The cache directory can be shared between several training processes:
+    entries are written to a temporary file and atomically renamed into place,
+    and a reader that races with an eviction simply treats the entry as a miss.
+    Whenever the total size of the cache exceeds `max_size_bytes`,
+    the least recently used entries (by file mtime, which is refreshed on every hit) are evicted.
+    """
+
+    _SUFFIX = '.npy'
+
+    def __init__(self, cache_dir: str, max_size_bytes: int = 50 * 1024 ** 3, dtype=np.float32):
+        """
+        :param cache_dir: directory to store the cached arrays, will be created if it doesn't exist.
+        :param max_size_bytes: the upper limit of the cache size in bytes. Default to 50GB.
+        :param dtype: dtype of the cached arrays.
+        """
+        self._cache_dir = cache_dir
+        self._max_size_bytes = max_size_bytes
+        self._dtype = np.dtype(dtype)
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # Estimated size of the cache directory,
+        # it is only an estimate because other processes might write to the same directory.
+        self._estimated_size = None
+
+    @property
+    def cache_dir(self) -> str:
+        return self._cache_dir
+
+    def key(self, path: str, subset: dict | None, tag: str | None = None) -> str:
+        """
+        :param tag: distinguishes arrays derived from the same observation and subset,
+        e.g. observations after vortex removal with different settings.
+        """
+        stat = os.stat(path)
+        key = [
+            os.path.abspath(path),
+            stat.st_mtime_ns,
+            stat.st_size,
+            data_utils.normalize_subset(subset),
+            self._dtype.str,
+        ]
+        if tag is not None:
+            key.append(tag)
+
+        key = json.dumps(key)
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def get(self, path: str, subset: dict | None, tag: str | None = None) -> np.ndarray | None:
+        entry_path = self._entry_path(self.key(path, subset, tag))
+        try:
+            tensor = np.load(entry_path, allow_pickle=False)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            # The entry is corrupted (e.g. the disk was full), just treat it as a miss.
+            _remove_silently(entry_path)
+            return None
+
+        # Mark the entry as recently used.
+        try:
+            os.utime(entry_path)
+        except FileNotFoundError:
+            pass
+
+        return tensor
+
+    def put(self, path: str, subset: dict | None, tensor: np.ndarray, tag: str | None = None) -> np.ndarray:
+        tensor = np.ascontiguousarray(tensor, dtype=self._dtype)
+        entry_path = self._entry_path(self.key(path, subset, tag))
+
+        # Write to a temporary file in the same directory first,
+        # so other processes will never see a partially written entry.
+        fd, tmp_path = tempfile.mkstemp(dir=self._cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, tensor, allow_pickle=False)
+            os.replace(tmp_path, entry_path)
+        except BaseException:
+            _remove_silently(tmp_path)
+            raise
+
+        self._track_size(tensor.nbytes)
+        return tensor
+
+    def load(self, path: str, subset: dict | None) -> np.ndarray:
+        """
+        Load the channel-last array of the given observation file,
+        decoding it from netcdf only when it is not in the cache yet.
+        """
+        tensor = self.get(path, subset)
+        if tensor is not None:
+            return tensor
+
+        dataset = xr.open_dataset(path, engine='netcdf4')
+        tensor = data_utils.extract_variables_from_dataset(dataset, subset)
+        dataset.close()
+        return self.put(path, subset, tensor)
+
+    def evict(self, max_size_bytes: int | None = None):
+        """
+        Remove the least recently used entries until the cache size is below `max_size_bytes`.
+        """
+        max_size_bytes = self._max_size_bytes if max_size_bytes is None else max_size_bytes
+
+        entries = []
+        for entry in os.scandir(self._cache_dir):
+            if not entry.name.endswith(self._SUFFIX):
+                continue
+
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+
+            entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+        total_size = sum(size for _, size, _ in entries)
+        entries.sort()
+        for _, size, entry_path in entries:
+            if total_size <= max_size_bytes:
+                break
+
+            _remove_silently(entry_path)
+            total_size -= size
+
+        self._estimated_size = total_size
+
+    def clear(self):
+        self.evict(max_size_bytes=0)
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self._cache_dir, f'{key}{self._SUFFIX}')
+
+    def _track_size(self, nbytes: int):
+        # The first scan already accounts for the new entry.
+        if self._estimated_size is None:
+            self.evict()
+            return
+
+        self._estimated_size += nbytes
+        if self._estimated_size > self._max_size_bytes:
+            self.evict()
+
+
+def _remove_silently(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -3,21 +3,47 @@ from collections import OrderedDict
 from datetime import datetime, timedelta
 from functools import partial
 import tc_formation.data.label as label
+import tc_formation.data.observation_index as observation_index
+from tc_formation.data.observation_store import ObservationStore
+from tc_formation.data.sliding_window import SlidingWindowFrameBuffer
+from tc_formation.data.tensor_cache import TensorCache
+from tc_formation.data.vortex_removal_stage import VortexRemovalStage
 import tc_formation.data.tfd_utils as tfd_utils
 import tc_formation.data.utils as data_utils
+import tc_formation.layers.tc_grid as tc_grid
 import numpy as np
 import os
 import pandas as pd
 import tensorflow as tf
 from typing import List, Tuple
-import xarray as xr
 
 
 class TimeSeriesTropicalCycloneDataLoader:
-    def __init__(self, data_shape, previous_hours:List[int] = [6, 12, 18], subset: OrderedDict = None):
+    def __init__(self, data_shape, previous_hours:List[int] = [6, 12, 18], subset: OrderedDict = None, tensor_cache: TensorCache = None, store: ObservationStore = None, sliding_window: bool = False, observation_index_dir: str = None, vortex_removal: VortexRemovalStage = None):
+        # Vortex removal is applied on top of wherever observations are read from.
+        if vortex_removal is not None:
+            if store is not None:
+                store = vortex_removal.wrap(store)
+            else:
+                tensor_cache = vortex_removal.wrap(tensor_cache)
+
         self._data_shape = data_shape
         self._previous_hours = previous_hours
         self._subset = subset
+        self._tensor_cache = tensor_cache
+        self._store = store
+        self._observation_index_dir = observation_index_dir
+
+        # In sliding window mode, samples are processed in chronological order,
+        # and observations shared between neighbouring samples are decoded only once.
+        # It is useless when reading from the observation store.
+        self._frame_buffer = (SlidingWindowFrameBuffer.for_previous_hours(previous_hours, tensor_cache)
+                              if sliding_window and store is None
+                              else None)
+
+    @property
+    def _frame_cache(self):
+        return self._frame_buffer if self._frame_buffer is not None else self._tensor_cache
 
     def _load_tc_csv(self, data_path, leadtimes: List[int] = None) -> pd.DataFrame:
         return label.load_label(
@@ -47,6 +73,47 @@ class TimeSeriesTropicalCycloneDataLoader:
     def _are_valid_paths(cls, paths: List[str]) -> bool:
         return all([os.path.isfile(p) for p in paths])
 
+    def _add_previous_observation_paths(self, paths: pd.Series) -> Tuple[pd.Series, np.ndarray]:
+        # Vectorized version of `_add_previous_observation_data_paths` and `_are_available_paths`.
+        previous_times = sorted(self._previous_hours)
+        return observation_index.add_previous_observation_paths(
+            paths,
+            offsets_hours=previous_times + [0],
+            snapshot_dir=self._observation_index_dir,
+            available_filenames=self._store.filenames if self._store is not None else None)
+
+    def _are_available_paths(self, paths: List[str]) -> bool:
+        # When reading from the observation store,
+        # the original observation files don't have to exist.
+        if self._store is not None:
+            return all([p in self._store for p in paths])
+
+        return self.__class__._are_valid_paths(paths)
+
+    @classmethod
+    def _load_reanalysis(
+            cls,
+            paths: List[str],
+            subset: OrderedDict,
+            tensor_cache: TensorCache = None,
+            store: ObservationStore = None,
+        ) -> np.ndarray:
+        datasets = []
+        for path in paths:
+            dataset = data_utils.load_variables_from_path(path, subset, tensor_cache, store)
+            datasets.append(np.expand_dims(dataset, axis=0))
+        return np.concatenate(datasets, axis=0)
+
+    def _create_tc_grid(self, tc_df: pd.DataFrame, tc_avg_radius_lat_deg: float, clip_threshold: float) -> tc_grid.TCGridProbability:
+        # All observations share the same grid,
+        # so we only need the coordinates of the first one.
+        latitudes, longitudes = data_utils.load_coordinates_from_path(tc_df['Path'].iloc[0][-1], self._store)
+        return tc_grid.TCGridProbability(
+            latitudes,
+            longitudes,
+            tc_avg_radius_lat_deg=tc_avg_radius_lat_deg,
+            clip_threshold=clip_threshold)
+
     @abc.abstractmethod
     def _process_to_dataset(self, tc_df: pd.DataFrame) -> tf.data.Dataset:
         pass
@@ -61,17 +128,16 @@ class TimeSeriesTropicalCycloneDataLoader:
             nonTCRatio=None,
             other_happening_tc_ratio=None,
             **kwargs):
-        cls = TimeSeriesTropicalCycloneDataLoader
-
         # Load TC dataframe.
         print('Dataframe loading.')
         tc_df = self._load_tc_csv(data_path, leadtimes)
         print('Dataframe in memory')
-        tc_df['Path'] = tc_df['Path'].apply(
-                partial(cls._add_previous_observation_data_paths, previous_times=self._previous_hours))
+        tc_df['Path'], valid = self._add_previous_observation_paths(tc_df['Path'])
         print('Add previous hours')
-        tc_df = tc_df[tc_df['Path'].apply(cls._are_valid_paths)]
+        tc_df = tc_df[valid]
         print('Check previous hours valid 2')
+        if self._frame_buffer is not None:
+            tc_df = tc_df.sort_values('Date')
 
         # TODO:
         # can we move this into the dataset pipeline,
@@ -137,16 +203,13 @@ class TimeSeriesTropicalCycloneDataLoader:
             nonTCRatio=None,
             other_happening_tc_ratio=None,
             **kwargs):
-        cls = TimeSeriesTropicalCycloneDataLoader
-
         # Load TC dataframe.
         print('Dataframe loading.')
         tc_df = self._load_tc_csv(data_path, leadtimes)
         print('Dataframe in memory')
-        tc_df['Path'] = tc_df['Path'].apply(
-                partial(cls._add_previous_observation_data_paths, previous_times=self._previous_hours))
+        tc_df['Path'], valid = self._add_previous_observation_paths(tc_df['Path'])
         print('Add previous hours')
-        tc_df = tc_df[tc_df['Path'].apply(cls._are_valid_paths)]
+        tc_df = tc_df[valid]
         print('Check previous hours valid')
         print(f'Remaining rows: {len(tc_df)}')
 
@@ -169,6 +232,8 @@ class TimeSeriesTropicalCycloneDataLoader:
         print('Dataframe loaded')
 
         # Convert to tf dataset.
+        if self._frame_buffer is not None:
+            tc_df = tc_df.sort_values('Date')
         dataset = self._process_to_dataset(tc_df, **kwargs)
 
         if shuffle:
@@ -196,35 +261,42 @@ class TimeSeriesTropicalCycloneWithGridProbabilityDataLoader(TimeSeriesTropicalC
 
         dataset = tf.data.Dataset.from_tensor_slices({
             'Path': np.asarray(tc_df['Path'].sum()).reshape((-1, len(self._previous_hours) + 1)),
-            'TC': tc_df['TC'],
-            'Latitude': tc_df['Latitude'],
-            'Longitude': tc_df['Longitude'],
+            'Centres': tc_grid.ragged_centres(tc_grid.tc_locations_from_labels(
+                tc_df['TC'], tc_df['Latitude'], tc_df['Longitude'])),
         })
         
         print('created dataset')
         
+        # Only the observations are loaded in python,
+        # the groundtruth is generated in-graph from the TC centres.
         dataset = dataset.map(
-            lambda row: tfd_utils.new_py_function(
-                    lambda row: cls._load_reanalysis_and_gt(
-                            [path.decode('utf-8') for path in row['Path'].numpy()],
+            lambda row: (
+                tfd_utils.new_py_function(
+                    lambda paths: cls._load_reanalysis(
+                            [path.decode('utf-8') for path in paths.numpy()],
                             self._subset,
-                            row['TC'].numpy(),
-                            self._data_shape,
-                            row['Latitude'].numpy(),
-                            row['Longitude'].numpy(),
-                            self._tc_avg_radius_lat_deg,
-                            self._clip_threshold,
-                            self._softmax_output,
-                            self._smooth_gt,
+                            self._frame_cache,
+                            self._store,
                         ),
-                    inp=[row],
-                    Tout=[tf.float32, tf.float32],
-                    name='load_observation_and_gt',
+                    inp=[row['Path']],
+                    Tout=tf.float32,
+                    name='load_observation',
                 ),
+                row['Centres'],
+            ),
             num_parallel_calls=tf.data.AUTOTUNE,
             deterministic=False,
         )
 
+        grid = self._create_tc_grid(tc_df, self._tc_avg_radius_lat_deg, self._clip_threshold)
+        dataset = dataset.map(
+            lambda data, centres: (
+                data,
+                tc_grid.probability_to_groundtruth(grid.single(centres), self._softmax_output, self._smooth_gt),
+            ),
+            num_parallel_calls=tf.data.AUTOTUNE,
+        )
+
         # Tensorflow should figure out the shape of the output of previous map,
         # but it doesn't, so we have to do it ourself.
         # https://github.com/tensorflow/tensorflow/issues/31373#issuecomment-524666365
@@ -239,7 +311,7 @@ class TimeSeriesTropicalCycloneWithGridProbabilityDataLoader(TimeSeriesTropicalC
         cls = TimeSeriesTropicalCycloneWithGridProbabilityDataLoader
 
         paths = cls._add_previous_observation_data_paths(data_row['Path'], self._previous_hours)
-        if not cls._are_valid_paths(paths):
+        if not self._are_available_paths(paths):
             raise ValueError('Invalid data path: there are not enough observation paths.')
 
         data, gt = cls._load_reanalysis_and_gt(
@@ -253,6 +325,8 @@ class TimeSeriesTropicalCycloneWithGridProbabilityDataLoader(TimeSeriesTropicalC
             self._clip_threshold,
             self._softmax_output,
             self._smooth_gt,
+            self._frame_cache,
+            self._store,
         )
         return data, gt
 
@@ -280,16 +354,15 @@ class TimeSeriesTropicalCycloneWithGridProbabilityDataLoader(TimeSeriesTropicalC
             clip_threshold: float,
             softmax_output: bool,
             smooth_gt: bool,
+            tensor_cache: TensorCache = None,
+            store: ObservationStore = None,
         ) -> Tuple[np.ndarray, np.ndarray]:
 
-        datasets = []
-        for path in paths:
-            dataset = xr.open_dataset(path, engine='netcdf4')
-            latitudes = dataset['lat']
-            longitudes = dataset['lon']
-            dataset = data_utils.extract_variables_from_dataset(dataset, subset)
-            datasets.append(np.expand_dims(dataset, axis=0))
-        datasets = np.concatenate(datasets, axis=0)
+        datasets = cls._load_reanalysis(paths, subset, tensor_cache, store)
+
+        # All observations share the same grid,
+        # so we only need the coordinates of the last one.
+        latitudes, longitudes = data_utils.load_coordinates_from_path(paths[-1], store)
 
         gt = cls._create_probability_grid_gt(
                 has_tc,
@@ -392,6 +465,8 @@ class TimeSeriesTropicalCycloneWithLocationDataLoader(TimeSeriesTropicalCycloneD
                             row['TC'].numpy(),
                             row['Latitude'].numpy(),
                             row['Longitude'].numpy(),
+                            self._frame_cache,
+                            self._store,
                         ),
                     inp=[row],
                     Tout=[tf.float32, tf.float32],
@@ -419,14 +494,11 @@ class TimeSeriesTropicalCycloneWithLocationDataLoader(TimeSeriesTropicalCycloneD
             has_tc: bool,
             tc_latitudes: float,
             tc_longitudes: float,
+            tensor_cache: TensorCache = None,
+            store: ObservationStore = None,
         ) -> Tuple[np.ndarray, np.ndarray]:
 
-        datasets = []
-        for path in paths:
-            dataset = xr.open_dataset(path, engine='netcdf4')
-            dataset = data_utils.extract_variables_from_dataset(dataset, subset)
-            datasets.append(np.expand_dims(dataset, axis=0))
-        datasets = np.concatenate(datasets, axis=0)
+        datasets = cls._load_reanalysis(paths, subset, tensor_cache, store)
 
         if has_tc:
             if isinstance(tc_latitudes, list):
@@ -1,3 +1,5 @@
+from __future__ import annotations
+
 from collections import OrderedDict
 import numpy as np
 import pandas as pd
@@ -54,6 +56,53 @@ def extract_variables_from_dataset(ds: xr.Dataset, subset: OrderedDict):
     # return data
 
 
+def normalize_subset(subset: OrderedDict | None):
+    """
+    Convert `subset` into a json-serializable list of `[variable, levels]`.
+    The order of variables is kept because it decides the order of channels.
+    """
+    if subset is None:
+        return None
+
+    normalized = []
+    for key, lev in subset.items():
+        if isinstance(lev, bool):
+            normalized.append([key, lev])
+        else:
+            normalized.append([key, [float(l) for l in lev]])
+
+    return normalized
+
+
+def load_variables_from_path(path: str, subset: OrderedDict, tensor_cache=None, store=None):
+    """
+    Open the observation file at `path` and extract the variables in `subset` as channel-last array.
+    If `store` (see `tc_formation.data.observation_store.ObservationStore`) is given,
+    the observation is read from the store instead, and the file at `path` is never opened.
+    Otherwise, if `tensor_cache` (see `tc_formation.data.tensor_cache.TensorCache`) is given,
+    the extracted array will be read from or stored into the cache.
+    """
+    if store is not None:
+        return store.load(path, subset)
+
+    if tensor_cache is not None:
+        return tensor_cache.load(path, subset)
+
+    ds = xr.open_dataset(path, engine='netcdf4')
+    return extract_variables_from_dataset(ds, subset)
+
+
+def load_coordinates_from_path(path: str, store=None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return latitudes and longitudes of the observation at `path`.
+    """
+    if store is not None:
+        return store.latitudes, store.longitudes
+
+    with xr.open_dataset(path, engine='netcdf4') as ds:
+        return ds['lat'].values, ds['lon'].values
+
+
 def split_dataset_into_postive_negative_samples(dataset: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
     positive_samples = dataset[dataset['TC']].reset_index()
     negative_samples = dataset[~dataset['TC']].reset_index()
@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+from . import label as tc_label
+from . import utils as data_utils
+from .best_track_index import BestTrackIndex
+from .observation_store import parse_date_from_observation_path
+from .tensor_cache import TensorCache
+import json
+import numpy as np
+import os
+import pandas as pd
+import threading
+from tc_formation.vortex_removal import vortex_removal as vr
+
+
+class VortexRemovalStage:
+    """
+    Remove vortices of other storms from observations at load time,
+    instead of writing a vortex-removed copy of the whole archive
+    with `scripts/remove_vortex.py` or `scripts/remove_developed_storms.py`.
+
+    The stage has the same `load(path, subset)` interface as `TensorCache`,
+    and it reads observations from its `source`, which can be a `TensorCache` or an `ObservationStore`.
+    Other attributes of the source (e.g. `latitudes` of the store) are passed through,
+    so the stage can be used in place of its source.
+    Data loaders accept a stage through their `vortex_removal` argument,
+    and wrap their own tensor cache or observation store with it.
+
+    If `cache_dir` is given, only observations that are modified are persisted,
+    keyed by the radius, the method and the storm locations,
+    so different radii can share the same cache directory.
+    """
+
+    def __init__(
+            self,
+            storm_locations,
+            radius: float = 10.0,
+            analyzed_vortex: str = 'gaussian',
+            cache_dir: str | None = None,
+            max_cache_size_bytes: int = 50 * 1024 ** 3,
+            source=None):
+        """
+        :param storm_locations: function that returns (lat, lon) of storms to remove from the observation at the given path.
+        :param radius: radius of the region around each storm to apply the removal algorithm.
+        :param analyzed_vortex: how to obtain the analyzed vortex field, see `vortex_removal.ANALYZED_VORTEX_METHODS`.
+        :param cache_dir: where to persist the modified observations, None to disable.
+        :param source: where to read observations from, default to the observation files.
+        """
+        assert analyzed_vortex in vr.ANALYZED_VORTEX_METHODS, f'Invalid analyzed vortex method {analyzed_vortex}'
+        self._storm_locations = storm_locations
+        self._radius = radius
+        self._analyzed_vortex = analyzed_vortex
+        self._cache_dir = cache_dir
+        self._max_cache_size_bytes = max_cache_size_bytes
+        self._cache = (TensorCache(cache_dir, max_size_bytes=max_cache_size_bytes)
+                       if cache_dir is not None
+                       else None)
+        self._source = source
+
+        # All observations share the same grid.
+        self._grid = None
+        self._grid_lock = threading.Lock()
+
+    @classmethod
+    def from_label(
+            cls,
+            label: pd.DataFrame | str,
+            radius: float = 10.0,
+            column: str = 'Other TC Locations',
+            **kwargs) -> VortexRemovalStage:
+        """
+        Remove storms listed in the `Other TC Locations` column of the label file (v4+).
+        Observations which are not in the label are left untouched.
+        """
+        if isinstance(label, str):
+            label = (tc_label.read_parquet_label(label)
+                     if tc_label.is_parquet(label)
+                     else pd.read_csv(label))
+
+        assert column in label.columns, 'Required label file v4+.'
+        locations = dict(zip(
+            (os.path.basename(path) for path in label['Path']),
+            tc_label.parse_locations(label[column])))
+        empty = np.empty((0, 2))
+        return cls(lambda path: locations.get(os.path.basename(path), empty), radius, **kwargs)
+
+    @classmethod
+    def from_best_track(
+            cls,
+            index: BestTrackIndex,
+            radius: float = 10.0,
+            **kwargs) -> VortexRemovalStage:
+        """
+        Remove all storms of the best track at the time of each observation.
+        """
+        def storm_locations(path: str) -> np.ndarray:
+            lats, lons = index.positions_at(parse_date_from_observation_path(path))
+            # Our longitude is from 0 to 360.
+            return np.stack([lats, np.mod(lons, 360)], axis=-1)
+
+        return cls(storm_locations, radius, **kwargs)
+
+    def wrap(self, source) -> VortexRemovalStage:
+        """
+        Return the same stage reading observations from `source`.
+        """
+        return VortexRemovalStage(
+            self._storm_locations,
+            self._radius,
+            analyzed_vortex=self._analyzed_vortex,
+            cache_dir=self._cache_dir,
+            max_cache_size_bytes=self._max_cache_size_bytes,
+            source=source)
+
+    @property
+    def radius(self) -> float:
+        return self._radius
+
+    @property
+    def source(self):
+        return self._source
+
+    def __getattr__(self, name: str):
+        # Only called when the attribute is not found on the stage itself.
+        source = self.__dict__.get('_source')
+        if source is None:
+            raise AttributeError(name)
+
+        return getattr(source, name)
+
+    def __contains__(self, path) -> bool:
+        return path in self._source
+
+    def load(self, path: str, subset: dict | None) -> np.ndarray:
+        centers = self._centers_in_domain(path)
+        if len(centers) == 0:
+            return self._load_source(path, subset)
+
+        # The cache is keyed by the observation file, which doesn't have to exist with the observation store.
+        use_cache = self._cache is not None and os.path.isfile(path)
+        tag = self._cache_tag(centers)
+        if use_cache:
+            tensor = self._cache.get(path, subset, tag)
+            if tensor is not None:
+                return tensor
+
+        tensor = self._load_source(path, subset)
+        minlat, minlon = self._grid[0].min(), self._grid[1].min()
+        tensor = vr.remove_vortex(
+            tensor,
+            # Translate to pixel coordinates, the same as `remove_vortex_ds`.
+            centers - np.asarray([minlat, minlon]),
+            self._radius,
+            analyzed_vortex=self._analyzed_vortex).astype(tensor.dtype, copy=False)
+
+        if use_cache:
+            tensor = self._cache.put(path, subset, tensor, tag)
+
+        return tensor
+
+    def _load_source(self, path: str, subset: dict | None) -> np.ndarray:
+        if self._source is not None:
+            return self._source.load(path, subset)
+
+        return data_utils.load_variables_from_path(path, subset)
+
+    def _centers_in_domain(self, path: str) -> np.ndarray:
+        centers = np.asarray(self._storm_locations(path), dtype=np.float64).reshape((-1, 2))
+        if len(centers) == 0:
+            return centers
+
+        latitudes, longitudes = self._load_grid(path)
+        inside = ((latitudes.min() <= centers[:, 0]) & (centers[:, 0] <= latitudes.max())
+                  & (longitudes.min() <= centers[:, 1]) & (centers[:, 1] <= longitudes.max()))
+        return centers[inside]
+
+    def _load_grid(self, path: str) -> tuple[np.ndarray, np.ndarray]:
+        with self._grid_lock:
+            if self._grid is None:
+                store = self._source if hasattr(self._source, 'latitudes') else None
+                self._grid = data_utils.load_coordinates_from_path(path, store)
+
+            return self._grid
+
+    def _cache_tag(self, centers: np.ndarray) -> str:
+        return json.dumps([
+            'vortex_removal',
+            self._radius,
+            self._analyzed_vortex,
+            np.round(centers, 4).tolist(),
+        ])
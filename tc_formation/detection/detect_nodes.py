@@ -0,0 +1,284 @@
+"""
+Detect tropical cyclone candidates in-process,
+the same as TempestExtremes' `DetectNodes` with:
+    --searchbymin pressfc
+    --closedcontourcmd "pressfc,100.0,5.5,0"
+    --mergedist 6.0
+    --regional
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+from multiprocessing import Pool
+import numpy as np
+import os
+import pandas as pd
+from scipy import ndimage
+import xarray as xr
+
+
+NODE_COLUMNS = ['i', 'j', 'lon', 'lat', 'pressfc']
+
+# Neighbours of a grid point on a regional mesh, without wrapping around the boundaries.
+_NEIGHBOURHOOD = np.ones((3, 3), dtype=bool)
+
+
+def parse_date(nc_file_path: str) -> datetime:
+    """
+    The date is embedded in the filename: `<prefix>_%Y%m%d_%H_%M[_<suffix>].nc`
+    """
+    filename, _ = os.path.splitext(os.path.basename(nc_file_path))
+    _, date, hour, minute, *_ = filename.split('_')
+    return datetime.strptime(f'{date}_{hour}_{minute}', '%Y%m%d_%H_%M')
+
+
+def great_circle_distance(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """
+    Great circle distance (in degrees) between points given in degrees.
+    All arguments are broadcast together.
+    """
+    lat1, lon1, lat2, lon2 = (np.deg2rad(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+    # Haversine formula, which is well-conditioned for small distances.
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return np.rad2deg(2 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0))))
+
+
+def detect_nodes(
+        pressure: np.ndarray,
+        latitudes: np.ndarray,
+        longitudes: np.ndarray,
+        closed_contour_delta: float = 100.0,
+        closed_contour_dist: float = 5.5,
+        merge_dist: float = 6.0) -> pd.DataFrame:
+    """
+    Detect candidates in one time slice.
+
+    :param pressure: surface pressure (Pa) of shape (lat, lon).
+    :param latitudes: 1D array of latitudes of the grid.
+    :param longitudes: 1D array of longitudes of the grid.
+    :param closed_contour_delta: pressure must rise by at least this amount along every path
+        from the candidate to the `closed_contour_dist` great circle distance.
+    :param closed_contour_dist: radius (in degrees) of the closed contour.
+    :param merge_dist: only the lowest candidate is kept among candidates within this distance (in degrees).
+    :returns: a data frame with `NODE_COLUMNS` columns, `i` and `j` are indices of longitude and latitude.
+    """
+    pressure = np.asarray(pressure, dtype=np.float64)
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    assert pressure.shape == (len(latitudes), len(longitudes)), 'Pressure must be of shape (lat, lon).'
+
+    # Local minima among their neighbours.
+    # Boundaries are not wrapped, and the outside of the domain never is a lower neighbour.
+    is_minimum = pressure == ndimage.minimum_filter(
+        pressure, footprint=_NEIGHBOURHOOD, mode='constant', cval=np.inf)
+    is_minimum &= np.isfinite(pressure)
+    lat_idx, lon_idx = np.nonzero(is_minimum)
+
+    # The same order as `DetectNodes`: merge first, then check closed contours.
+    keep = _merge_candidates(
+        pressure[lat_idx, lon_idx], latitudes[lat_idx], longitudes[lon_idx], merge_dist)
+    lat_idx, lon_idx = lat_idx[keep], lon_idx[keep]
+
+    closed = _has_closed_contour(
+        pressure, latitudes, longitudes, lat_idx, lon_idx, closed_contour_delta, closed_contour_dist)
+    lat_idx, lon_idx = lat_idx[closed], lon_idx[closed]
+
+    return pd.DataFrame({
+        'i': lon_idx,
+        'j': lat_idx,
+        'lon': longitudes[lon_idx],
+        'lat': latitudes[lat_idx],
+        'pressfc': pressure[lat_idx, lon_idx],
+    }, columns=NODE_COLUMNS)
+
+
+def _merge_candidates(
+        values: np.ndarray,
+        latitudes: np.ndarray,
+        longitudes: np.ndarray,
+        merge_dist: float) -> np.ndarray:
+    """
+    :returns: boolean mask of candidates that have no lower candidates within `merge_dist`.
+    """
+    if len(values) < 2 or merge_dist <= 0:
+        return np.ones(len(values), dtype=bool)
+
+    distances = great_circle_distance(
+        latitudes[:, None], longitudes[:, None], latitudes[None, :], longitudes[None, :])
+
+    # Ties are broken by the order of candidates, so exactly one of them is kept.
+    order = np.arange(len(values))
+    lower = ((values[None, :] < values[:, None])
+             | ((values[None, :] == values[:, None]) & (order[None, :] < order[:, None])))
+    return ~np.any(lower & (distances <= merge_dist), axis=1)
+
+
+def _has_closed_contour(
+        pressure: np.ndarray,
+        latitudes: np.ndarray,
+        longitudes: np.ndarray,
+        lat_idx: np.ndarray,
+        lon_idx: np.ndarray,
+        delta: float,
+        dist: float) -> np.ndarray:
+    """
+    A candidate has a closed contour if the region connected to it,
+    in which pressure is lower than the candidate's pressure plus `delta`,
+    doesn't reach any grid point farther than `dist` from the candidate.
+
+    Windows around all candidates are stacked and labelled at once,
+    so the flood fill is done in a single `ndimage.label` call.
+    """
+    nb_candidates = len(lat_idx)
+    if nb_candidates == 0:
+        return np.zeros(0, dtype=bool)
+
+    # The windows must contain grid points just outside of the contour,
+    # longitudes are closer together toward the poles.
+    dlat = np.min(np.abs(np.diff(latitudes))) if len(latitudes) > 1 else dist
+    dlon = np.min(np.abs(np.diff(longitudes))) if len(longitudes) > 1 else dist
+    max_abs_lat = min(np.max(np.abs(latitudes)) + dist, 85.0)
+    half_h = int(np.ceil(dist / dlat)) + 1
+    half_w = int(np.ceil(dist / (dlon * np.cos(np.deg2rad(max_abs_lat))))) + 1
+
+    # Outside of the domain is never inside of the contour.
+    padded = np.pad(pressure, ((half_h, half_h), (half_w, half_w)), constant_values=np.inf)
+
+    rows = lat_idx[:, None] + np.arange(2 * half_h + 1)[None, :]
+    cols = lon_idx[:, None] + np.arange(2 * half_w + 1)[None, :]
+    windows = padded[rows[:, :, None], cols[:, None, :]]
+
+    candidate_values = pressure[lat_idx, lon_idx]
+    inside = windows < (candidate_values + delta)[:, None, None]
+
+    # Connect grid points within the same window only.
+    structure = np.zeros((3, 3, 3), dtype=bool)
+    structure[1] = _NEIGHBOURHOOD
+    labels, _ = ndimage.label(inside, structure=structure)
+    connected = labels == labels[:, half_h, half_w][:, None, None]
+
+    # Distance of each grid point in the windows to the candidate,
+    # padded grid points are never connected so their distance doesn't matter.
+    window_lats = latitudes[np.clip(rows - half_h, 0, len(latitudes) - 1)]
+    window_lons = longitudes[np.clip(cols - half_w, 0, len(longitudes) - 1)]
+    distances = great_circle_distance(
+        window_lats[:, :, None],
+        window_lons[:, None, :],
+        latitudes[lat_idx][:, None, None],
+        longitudes[lon_idx][:, None, None])
+
+    return ~np.any(connected & (distances > dist), axis=(1, 2))
+
+
+def detect_nodes_in_file(path: str, variable: str = 'pressfc', **kwargs) -> pd.DataFrame:
+    """
+    Detect candidates in one of our NetCDF files, which has `lat` and `lon` coordinates.
+    If the file has a time dimension, each time slice is processed separately,
+    otherwise the date is parsed from the filename.
+
+    :returns: a data frame with `Date` and `NODE_COLUMNS` columns.
+    """
+    with xr.open_dataset(path, engine='netcdf4') as ds:
+        latitudes = ds['lat'].values
+        longitudes = ds['lon'].values
+        field = ds[variable]
+
+        if 'time' in field.dims:
+            dates = pd.to_datetime(ds['time'].values)
+            slices = field.transpose('time', 'lat', 'lon').values
+        else:
+            dates = [parse_date(path)]
+            slices = field.transpose('lat', 'lon').values[None, ...]
+
+    nodes = []
+    for date, pressure in zip(dates, slices):
+        df = detect_nodes(pressure, latitudes, longitudes, **kwargs)
+        df.insert(0, 'Date', pd.Timestamp(date))
+        nodes.append(df)
+
+    return pd.concat(nodes, ignore_index=True)
+
+
+def _detect_nodes_in_file_kwargs(args):
+    path, kwargs = args
+    return detect_nodes_in_file(path, **kwargs)
+
+
+def detect_nodes_in_files(paths: list[str], processes: int | None = None, **kwargs) -> list[pd.DataFrame]:
+    """
+    Detect candidates in all files in parallel.
+
+    :returns: a data frame for each file, in the same order as `paths`.
+    """
+    with Pool(processes) as pool:
+        return pool.map(_detect_nodes_in_file_kwargs, [(path, kwargs) for path in paths])
+
+
+def write_nodes_file(nodes: pd.DataFrame, path: str, dates: list[datetime] | None = None):
+    """
+    Write candidates in the same format as `DetectNodes` output,
+    so that it can be read by `StitchNodes --in_fmt "lon,lat,pressfc"`.
+    Each time slice begins with `year month day count hour` line,
+    followed by a line for each candidate: `i j lon lat pressfc`.
+
+    :param dates: dates of all time slices, including ones without any candidates,
+        default to dates of the given candidates.
+    """
+    if dates is None:
+        dates = nodes['Date'].unique()
+
+    # Candidates are grouped by date once, instead of filtering all candidates for every date.
+    nodes_by_date = dict(iter(nodes.groupby('Date')))
+    no_nodes = nodes.iloc[:0]
+
+    lines = []
+    for date in sorted(pd.Timestamp(d) for d in dates):
+        df = nodes_by_date.get(date, no_nodes)
+        lines.append(f'{date.year}\t{date.month:02d}\t{date.day:02d}\t{len(df)}\t{date.hour}\n')
+        lines.extend(
+            f'\t{row.i}\t{row.j}\t{row.lon:.6f}\t{row.lat:.6f}\t{row.pressfc:.6e}\n'
+            for row in df.itertuples(index=False))
+
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as outfile:
+        outfile.writelines(lines)
+    os.replace(tmp_path, path)
+
+
+def read_nodes_file(
+        path: str,
+        columns: tuple[str, ...] = ('lon', 'lat', 'pressfc'),
+        nb_indices: int = 2) -> pd.DataFrame:
+    """
+    Read candidates from a file in `DetectNodes` output format,
+    either written by `write_nodes_file` or by `DetectNodes` itself.
+
+    :param columns: names of the columns following the grid indices, the same as `StitchNodes --in_fmt`.
+    :param nb_indices: number of grid indices of each candidate, 2 for regional grids.
+    :returns: a data frame with `Date`, grid indices and `columns` columns.
+    """
+    index_columns = ['i', 'j'][:nb_indices]
+    dates = []
+    rows = []
+    with open(path, 'r') as infile:
+        for line in infile:
+            fields = line.split()
+            if not fields:
+                continue
+
+            if not line[0].isspace():
+                # Header of a time slice: `year month day count hour`.
+                year, month, day, _, hour = (int(f) for f in fields[:5])
+                date = datetime(year, month, day, hour)
+                continue
+
+            dates.append(date)
+            rows.append(fields[:nb_indices + len(columns)])
+
+    df = pd.DataFrame(rows, columns=index_columns + list(columns))
+    df[index_columns] = df[index_columns].astype(np.int64)
+    df[list(columns)] = df[list(columns)].astype(np.float64)
+    df.insert(0, 'Date', pd.to_datetime(dates))
+    return df
@@ -0,0 +1,222 @@
+"""
+Stitch detected candidates into tracks in-process,
+the same as TempestExtremes' `StitchNodes` with:
+    --range 8.0
+    --mintime "54h"
+    --maxgap "24h"
+    --threshold "lat,<=,50.0,10;lat,>=,-50.0,10"
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import operator
+import os
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from .detect_nodes import read_nodes_file
+
+
+# (column, operator, value, minimum number of nodes satisfying it) of each threshold.
+DEFAULT_THRESHOLDS = (
+    ('lat', '<=', 50.0, 10),
+    ('lat', '>=', -50.0, 10),
+)
+
+_OPERATORS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '=': operator.eq,
+    '!=': operator.ne,
+}
+
+# Columns of the nodes which are not carried over to tracks.
+_NODE_ONLY_COLUMNS = ('Date', 'i', 'j', 'lat', 'lon')
+
+
+def read_nodes(paths: str | list[str], **kwargs) -> pd.DataFrame:
+    """
+    Read candidates from `DetectNodes` output files (.dat),
+    or from our own format, i.e. `detect_nodes` data frames saved as .csv or .parquet.
+
+    :param kwargs: passed to `read_nodes_file` for .dat files.
+    """
+    if isinstance(paths, str):
+        paths = [paths]
+
+    def read(path: str) -> pd.DataFrame:
+        _, ext = os.path.splitext(path)
+        if ext == '.dat':
+            return read_nodes_file(path, **kwargs)
+        elif ext == '.parquet':
+            return pd.read_parquet(path)
+
+        return pd.read_csv(path, parse_dates=['Date'])
+
+    return pd.concat([read(path) for path in paths], ignore_index=True)
+
+
+def stitch_nodes(
+        nodes: pd.DataFrame,
+        max_range: float = 8.0,
+        min_time_hours: float = 54.0,
+        max_gap_hours: float = 24.0,
+        thresholds=DEFAULT_THRESHOLDS) -> np.ndarray:
+    """
+    Link candidates across time into tracks.
+
+    Time slices are processed in order, and all tracks which are still active,
+    i.e. their last node is within `max_gap_hours` before the current time,
+    are extended at once: each track takes the nearest unused candidate within `max_range`,
+    closer pairs first, using KD-trees of the track ends and the candidates.
+    Candidates that are not taken begin new tracks.
+
+    :param nodes: data frame with `Date`, `lat` and `lon` columns, and columns used by `thresholds`.
+    :param max_range: maximum great circle distance (in degrees) between consecutive nodes of a track.
+    :param min_time_hours: minimum duration of a track.
+    :param max_gap_hours: maximum time between consecutive nodes of a track.
+    :param thresholds: (column, operator, value, count) tuples,
+        a track is kept only if at least `count` of its nodes satisfy each of them.
+    :returns: track id of each node, -1 for nodes of tracks that are filtered out.
+    """
+    dates = nodes['Date'].values.astype('datetime64[ns]')
+    xyz = _to_cartesian(nodes['lat'].values, nodes['lon'].values)
+    max_chord = 2 * np.sin(np.deg2rad(max_range) / 2)
+    max_gap = np.timedelta64(int(max_gap_hours * 3600), 's')
+
+    order = np.argsort(dates, kind='stable')
+    unique_dates, starts = np.unique(dates[order], return_index=True)
+    starts = np.append(starts, len(order))
+
+    track_ids = np.full(len(nodes), -1, dtype=np.int64)
+    nb_tracks = 0
+
+    # Last node of each active track.
+    active_tracks = np.zeros(0, dtype=np.int64)
+    active_ends = np.zeros(0, dtype=np.int64)
+
+    for date, start, end in zip(unique_dates, starts[:-1], starts[1:]):
+        candidates = order[start:end]
+
+        still_active = (date - dates[active_ends]) <= max_gap
+        active_tracks, active_ends = active_tracks[still_active], active_ends[still_active]
+
+        taken = np.zeros(len(candidates), dtype=bool)
+        if len(active_tracks) > 0:
+            pairs = cKDTree(xyz[active_ends]).sparse_distance_matrix(
+                cKDTree(xyz[candidates]), max_chord, output_type='ndarray')
+            pairs = pairs[np.argsort(pairs['v'], kind='stable')]
+
+            extended = np.zeros(len(active_tracks), dtype=bool)
+            for track, candidate, _ in pairs:
+                if extended[track] or taken[candidate]:
+                    continue
+
+                extended[track] = taken[candidate] = True
+                track_ids[candidates[candidate]] = active_tracks[track]
+                active_ends[track] = candidates[candidate]
+
+        new_candidates = candidates[~taken]
+        new_tracks = np.arange(nb_tracks, nb_tracks + len(new_candidates))
+        track_ids[new_candidates] = new_tracks
+        nb_tracks += len(new_candidates)
+
+        active_tracks = np.concatenate([active_tracks, new_tracks])
+        active_ends = np.concatenate([active_ends, new_candidates])
+
+    keep = _tracks_satisfying(nodes, track_ids, nb_tracks, dates, min_time_hours, thresholds)
+    return np.where(keep[track_ids], track_ids, -1)
+
+
+def _tracks_satisfying(
+        nodes: pd.DataFrame,
+        track_ids: np.ndarray,
+        nb_tracks: int,
+        dates: np.ndarray,
+        min_time_hours: float,
+        thresholds) -> np.ndarray:
+    """
+    :returns: boolean mask of tracks satisfying the minimum duration and all thresholds.
+    """
+    if nb_tracks == 0:
+        return np.zeros(0, dtype=bool)
+
+    seconds = (dates - dates.min()).astype('timedelta64[s]').astype(np.float64)
+    first = np.full(nb_tracks, np.inf)
+    last = np.full(nb_tracks, -np.inf)
+    np.minimum.at(first, track_ids, seconds)
+    np.maximum.at(last, track_ids, seconds)
+    keep = (last - first) >= min_time_hours * 3600
+
+    for column, op, value, count in thresholds:
+        satisfied = _OPERATORS[op](nodes[column].values, value)
+        keep &= np.bincount(track_ids, weights=satisfied.astype(np.float64), minlength=nb_tracks) >= count
+
+    return keep
+
+
+def nodes_to_tracks(
+        nodes: pd.DataFrame,
+        track_ids: np.ndarray,
+        basin: str = 'MM',
+        nature: str = 'TS') -> pd.DataFrame:
+    """
+    Convert stitched nodes to a track data frame with the same columns as IBTrACS,
+    so it can be used in place of the best track by `load_best_track` and `create_labels_v2.py`.
+    Other columns of the nodes (e.g. `pressfc`) are kept with upper case names.
+
+    Storm ids are `<year>-<number>`, numbered by the first time of tracks within each year.
+
+    :param basin: basin of all tracks, default to `MM` (missing) as detected tracks have no basin.
+    :param nature: nature of all nodes, default to `TS` as every stitched track is considered a storm.
+    """
+    tracked = track_ids >= 0
+    df = nodes[tracked].copy()
+    df['_track'] = track_ids[tracked]
+
+    # Track ids are given in order of the first time of tracks,
+    # so tracks are in the same order as the best track.
+    df = df.sort_values(['_track', 'Date'], kind='stable')
+
+    years = df.groupby('_track')['Date'].min().dt.year
+    numbers = years.groupby(years).cumcount() + 1
+    sids = years.astype(str) + '-' + numbers.astype(str)
+
+    tracks = pd.DataFrame({
+        'SID': df['_track'].map(sids).values,
+        'ISO_TIME': df['Date'].dt.strftime('%Y-%m-%d %H:%M:%S').values,
+        'NATURE': nature,
+        'LAT': df['lat'].values,
+        'LON': df['lon'].values,
+        'BASIN': basin,
+    })
+    for column in df.columns:
+        if column not in _NODE_ONLY_COLUMNS and column != '_track':
+            tracks[column.upper()] = df[column].values
+
+    return tracks
+
+
+def write_tracks(tracks: pd.DataFrame, path: str):
+    """
+    Write tracks as an IBTrACS .csv file, which has a row of units below the header,
+    so it can be read by `load_best_track`.
+    """
+    units = {'ISO_TIME': 'Year-Month-Day Hour:Minute:Second', 'LAT': 'degrees_north', 'LON': 'degrees_east'}
+
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as outfile:
+        outfile.write(','.join(tracks.columns) + '\n')
+        outfile.write(','.join(units.get(column, '') for column in tracks.columns) + '\n')
+        tracks.to_csv(outfile, header=False, index=False)
+    os.replace(tmp_path, path)
+
+
+def _to_cartesian(latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    # Points on the unit sphere, so chord length is monotonic with great circle distance.
+    lat = np.deg2rad(np.asarray(latitudes, dtype=np.float64))
+    lon = np.deg2rad(np.asarray(longitudes, dtype=np.float64))
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1)
@@ -1,34 +1,61 @@
-from global_land_mask import globe
+from __future__ import annotations
+
+from functools import lru_cache
 import numpy as np
+from tc_formation.utils.land_sea_mask import LandSeaMask
 import xarray as xr
 
 
+# Variables required to compute the genesis potential index.
+GPI_VARIABLES = ('absvprs', 'ugrdprs', 'vgrdprs', 'tmpsfc', 'hgtprs', 'rhprs')
+
+# All outputs of `genesis_potential_components()`.
+COMPONENTS = (
+    'vorticity',
+    'corriolis',
+    'vertical_shear',
+    'ocean_thermal',
+    'moist_stability',
+    'relative_humidity',
+    'ocean_mask',
+    'thermal',
+    'dynamic',
+    'gpi',
+)
+
+
 def vorticity_parameter(ds: xr.Dataset) -> np.ndarray:
-    vorticity_950 = ds['absvprs'].sel(lev=950).values
+    return _vorticity(_pressure_levels(ds, 'absvprs')[..., _level_index(ds['lev'].values, 950), :, :])
+
+
+def _vorticity(vorticity_950: np.ndarray) -> np.ndarray:
     # TODO: do we need to multiply with 1e6?
     return vorticity_950 + 5.
 
 
 def corriolis_parameter(ds: xr.Dataset) -> np.ndarray:
-    lat = ds.lat
-    lon = ds.lon
-
-    # TODO: rotation rate of the Earth.
-    omega = 1
-
-    _, yy = np.meshgrid(lon, lat)
-    return 2 * omega * np.sin(yy * np.pi / 180.0)
+    corriolis, _ = static_fields(ds.lat.values, ds.lon.values)
+    return corriolis
 
 
 def vertical_shear_parameter(ds: xr.Dataset) -> np.ndarray:
-    # Wind field at 950mb.
-    u_wind_950 = ds['ugrdprs'].sel(lev=950).values
-    v_wind_950 = ds['vgrdprs'].sel(lev=950).values
-
-    # Wind field at 200mb.
-    u_wind_200 = ds['ugrdprs'].sel(lev=200).values
-    v_wind_200 = ds['vgrdprs'].sel(lev=200).values
-
+    u_wind = _pressure_levels(ds, 'ugrdprs')
+    v_wind = _pressure_levels(ds, 'vgrdprs')
+    levels = ds['lev'].values
+    return _vertical_shear(
+        # Wind field at 950mb.
+        u_wind[..., _level_index(levels, 950), :, :],
+        v_wind[..., _level_index(levels, 950), :, :],
+        # Wind field at 200mb.
+        u_wind[..., _level_index(levels, 200), :, :],
+        v_wind[..., _level_index(levels, 200), :, :])
+
+
+def _vertical_shear(
+        u_wind_950: np.ndarray,
+        v_wind_950: np.ndarray,
+        u_wind_200: np.ndarray,
+        v_wind_200: np.ndarray) -> np.ndarray:
     # Vertical wind shear.
     u_vertical = u_wind_200 - u_wind_950
     v_vertical = v_wind_200 - v_wind_950
@@ -43,32 +70,43 @@ def vertical_shear_parameter(ds: xr.Dataset) -> np.ndarray:
 
 
 def ocean_thermal_energy(ds: xr.Dataset) -> np.ndarray:
-    surface_temp = ds['tmpsfc'].values
+    return _ocean_thermal_energy(ds['tmpsfc'].values)
+
+
+def _ocean_thermal_energy(surface_temp: np.ndarray) -> np.ndarray:
     surface_temp = surface_temp - 273.15 - 26
     return np.where(surface_temp > 0, surface_temp, 1e-6)
 
 
 def moist_stability_parameter(ds: xr.Dataset) -> np.ndarray:
-    potential_temp_surface = ds['hgtprs'].sel(lev=1000).values
-    potential_temp_500 = ds['hgtprs'].sel(lev=500).values
+    hgt = _pressure_levels(ds, 'hgtprs')
+    levels = ds['lev'].values
+    return _moist_stability(
+        hgt[..., _level_index(levels, 1000), :, :],
+        hgt[..., _level_index(levels, 500), :, :])
+
+
+def _moist_stability(potential_temp_surface: np.ndarray, potential_temp_500: np.ndarray) -> np.ndarray:
     diff = potential_temp_500 - potential_temp_surface
     # return np.ones_like(diff, dtype=np.float64)
     return diff / 500.0 + 5.
 
 
 def relative_humidity_parameter(ds: xr.Dataset) -> np.ndarray:
-    rh_700_500 = ds['rhprs'].sel(lev=slice(700, 500)).values
-    mean_rh = np.mean(rh_700_500, axis=0)
+    rh = _pressure_levels(ds, 'rhprs')
+    return _relative_humidity(rh[..., _levels_between(ds['lev'].values, 500, 700), :, :])
+
+
+def _relative_humidity(rh_700_500: np.ndarray) -> np.ndarray:
+    mean_rh = np.mean(rh_700_500, axis=-3)
     rh = (mean_rh - 40.0) / 70.0
 
     return np.clip(rh, 0.0, 1.0)
 
 
 def ocean_mask(ds: xr.Dataset) -> np.ndarray:
-    lon = np.where(ds.lon < 180.0, ds.lon, 360.0 - ds.lon)
-    yy, xx = np.meshgrid(lon, ds.lat)
-    ocean_mask = globe.is_ocean(xx, yy)
-    return np.where(ocean_mask, 1, 1e-6)
+    _, mask = static_fields(ds.lat.values, ds.lon.values)
+    return mask
 
 
 def thermal_parameter(ds: xr.Dataset) -> np.ndarray:
@@ -86,6 +124,100 @@ def dynamic_parameter(ds: xr.Dataset) -> np.ndarray:
 
 
 def genesis_potential_index(ds: xr.Dataset) -> np.ndarray:
-    thermal = thermal_parameter(ds)
-    dynamic = dynamic_parameter(ds)
-    return thermal * dynamic * ocean_mask(ds)
+    return genesis_potential_components(ds)['gpi']
+
+
+def genesis_potential_components(ds: xr.Dataset) -> dict[str, np.ndarray]:
+    """
+    Compute all components of the genesis potential index in one pass.
+
+    The dataset can be a single observation, or a stack of observations
+    with extra leading dimensions (e.g. `time`), in which case every component
+    is computed for the whole stack at once.
+    Static fields (`corriolis` and `ocean_mask`) are of shape (lat, lon),
+    other components are of shape (..., lat, lon).
+
+    :returns: a dictionary of all `COMPONENTS`.
+    """
+    levels = ds['lev'].values
+    lev_950 = _level_index(levels, 950)
+    lev_200 = _level_index(levels, 200)
+
+    # Each variable is converted to numpy only once,
+    # and levels are selected by position.
+    u_wind = _pressure_levels(ds, 'ugrdprs')
+    v_wind = _pressure_levels(ds, 'vgrdprs')
+    hgt = _pressure_levels(ds, 'hgtprs')
+    rh = _pressure_levels(ds, 'rhprs')
+
+    components = dict(
+        vorticity=_vorticity(_pressure_levels(ds, 'absvprs')[..., lev_950, :, :]),
+        vertical_shear=_vertical_shear(
+            u_wind[..., lev_950, :, :],
+            v_wind[..., lev_950, :, :],
+            u_wind[..., lev_200, :, :],
+            v_wind[..., lev_200, :, :]),
+        ocean_thermal=_ocean_thermal_energy(ds['tmpsfc'].transpose(..., 'lat', 'lon').values),
+        moist_stability=_moist_stability(
+            hgt[..., _level_index(levels, 1000), :, :],
+            hgt[..., _level_index(levels, 500), :, :]),
+        relative_humidity=_relative_humidity(rh[..., _levels_between(levels, 500, 700), :, :]),
+    )
+    components['corriolis'], components['ocean_mask'] = static_fields(ds.lat.values, ds.lon.values)
+
+    components['thermal'] = (components['ocean_thermal']
+                             * components['moist_stability']
+                             * components['relative_humidity'])
+    components['dynamic'] = (components['vorticity']
+                             * components['corriolis']
+                             * components['vertical_shear'])
+    components['gpi'] = components['thermal'] * components['dynamic'] * components['ocean_mask']
+    return {name: components[name] for name in COMPONENTS}
+
+
+def static_fields(latitudes: np.ndarray, longitudes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Coriolis parameter and ocean mask of the grid,
+    which are computed only once per grid.
+    Returned arrays are read-only.
+    """
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    return _static_fields(latitudes.tobytes(), longitudes.tobytes())
+
+
+@lru_cache(maxsize=16)
+def _static_fields(latitudes_bytes: bytes, longitudes_bytes: bytes) -> tuple[np.ndarray, np.ndarray]:
+    lat = np.frombuffer(latitudes_bytes, dtype=np.float64)
+    lon = np.frombuffer(longitudes_bytes, dtype=np.float64)
+
+    # TODO: rotation rate of the Earth.
+    omega = 1
+
+    _, yy = np.meshgrid(lon, lat)
+    corriolis = 2 * omega * np.sin(yy * np.pi / 180.0)
+
+    ocean = LandSeaMask.for_grid(lat, lon).ocean
+    mask = np.where(ocean, 1, 1e-6)
+
+    # Static fields are memoized, so they must not be modified by callers.
+    corriolis.setflags(write=False)
+    mask.setflags(write=False)
+    return corriolis, mask
+
+
+def _pressure_levels(ds: xr.Dataset, name: str) -> np.ndarray:
+    # Levels, latitudes and longitudes are the last three axes.
+    return ds[name].transpose(..., 'lev', 'lat', 'lon').values
+
+
+def _level_index(levels: np.ndarray, lev: float) -> int:
+    idx = np.flatnonzero(levels == lev)
+    if len(idx) == 0:
+        raise KeyError(f'Level {lev} not found in {levels}')
+
+    return int(idx[0])
+
+
+def _levels_between(levels: np.ndarray, low: float, high: float) -> np.ndarray:
+    return np.flatnonzero((levels >= low) & (levels <= high))
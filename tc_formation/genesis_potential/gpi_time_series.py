@@ -0,0 +1,229 @@
+"""
+Genesis potential index time series over whole archives of observations,
+so the GPI can be used as a baseline without computing it per label row.
+"""
+from __future__ import annotations
+
+from . import genesis_potential_index as gpi
+from multiprocessing import Pool
+import netCDF4
+import numpy as np
+import os
+import pandas as pd
+from tc_formation.data.observation_store import parse_date_from_observation_path
+import xarray as xr
+
+
+# Components which depend on time.
+TIME_COMPONENTS = tuple(c for c in gpi.COMPONENTS if c not in ('corriolis', 'ocean_mask'))
+
+
+def load_stack(paths: list[str]) -> xr.Dataset:
+    """
+    Stack the variables required by the GPI of the given observation files along a new `time` dimension.
+    """
+    datasets = []
+    for path in paths:
+        with xr.open_dataset(path, engine='netcdf4') as ds:
+            datasets.append(ds[list(gpi.GPI_VARIABLES)].load())
+
+    dates = pd.to_datetime([parse_date_from_observation_path(p) for p in paths])
+    return xr.concat(datasets, dim=pd.Index(dates, name='time'))
+
+
+def compute_chunk(
+        paths: list[str],
+        components: tuple[str, ...] = TIME_COMPONENTS) -> xr.Dataset:
+    """
+    Compute GPI components of the given observation files in one pass.
+
+    :returns: a dataset with a (time, lat, lon) float32 variable for each component.
+    """
+    stack = load_stack(paths)
+    values = gpi.genesis_potential_components(stack)
+    return xr.Dataset(
+        {name: (('time', 'lat', 'lon'), values[name].astype(np.float32)) for name in components},
+        coords=dict(time=stack['time'], lat=stack['lat'], lon=stack['lon']))
+
+
+def _compute_chunk(args) -> xr.Dataset:
+    paths, components = args
+    return compute_chunk(paths, components)
+
+
+class MonthlyClimatology:
+    """
+    Monthly means of GPI components, accumulated chunk by chunk,
+    so the whole time series never has to be in memory.
+    """
+
+    def __init__(self):
+        self._sums: dict[str, np.ndarray] = {}
+        self._counts = np.zeros(12, dtype=np.int64)
+        self._coords = None
+
+    def update(self, ds: xr.Dataset):
+        months = ds['time'].dt.month.values - 1
+        self._counts += np.bincount(months, minlength=12)
+        for name, var in ds.data_vars.items():
+            if 'time' not in var.dims:
+                continue
+
+            values = var.transpose('time', ...).values
+            if name not in self._sums:
+                self._sums[name] = np.zeros((12,) + values.shape[1:], dtype=np.float64)
+
+            for month in np.unique(months):
+                self._sums[name][month] += values[months == month].sum(axis=0, dtype=np.float64)
+
+        if self._coords is None:
+            self._coords = dict(lat=ds['lat'].values, lon=ds['lon'].values)
+
+    def result(self) -> xr.Dataset:
+        """
+        :returns: a dataset with a (month, lat, lon) variable for each component,
+            months without any observation are NaN.
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = {name: (('month', 'lat', 'lon'), (s / self._counts[:, None, None]).astype(np.float32))
+                     for name, s in self._sums.items()}
+
+        return xr.Dataset(
+            means,
+            coords=dict(month=np.arange(1, 13), **(self._coords or {})))
+
+
+def monthly_climatology(ds: xr.Dataset | str, chunk_size: int = 1024) -> xr.Dataset:
+    """
+    Monthly means of an existing GPI time series, written by `build_time_series()`.
+    The time series is read `chunk_size` times at a time.
+    """
+    if isinstance(ds, str):
+        ds = open_time_series(ds)
+
+    climatology = MonthlyClimatology()
+    for start in range(0, ds.sizes['time'], chunk_size):
+        climatology.update(ds.isel(time=slice(start, start + chunk_size)))
+
+    return climatology.result()
+
+
+def build_time_series(
+        paths: list[str],
+        output_path: str,
+        components: tuple[str, ...] = TIME_COMPONENTS,
+        processes: int = 8,
+        chunk_size: int = 64,
+        climatology_path: str | None = None) -> xr.Dataset | None:
+    """
+    Compute GPI components of all observation files, and write them as a single time series.
+
+    Files are sorted by date and split into chunks of `chunk_size` files,
+    which are computed in parallel and appended to the output in order,
+    so memory usage is bounded by the chunks in flight.
+    Static fields (`corriolis` and `ocean_mask`) are written once as (lat, lon) variables.
+
+    :param output_path: .zarr directory (requires `zarr`), or NetCDF file otherwise.
+    :param climatology_path: where to write monthly means of the components, None to disable.
+    :returns: monthly means of the components if `climatology_path` is given.
+    """
+    assert len(paths) > 0, 'No observation file given.'
+    assert all(c in TIME_COMPONENTS for c in components), f'Components must be in {TIME_COMPONENTS}'
+    paths = sorted(paths, key=parse_date_from_observation_path)
+    chunks = [(paths[i:i + chunk_size], tuple(components)) for i in range(0, len(paths), chunk_size)]
+
+    writer = (_ZarrWriter(output_path)
+              if output_path.rstrip(os.sep).endswith('.zarr')
+              else _NetCDFWriter(output_path))
+    climatology = MonthlyClimatology() if climatology_path is not None else None
+
+    with Pool(processes) as pool:
+        for ds in pool.imap(_compute_chunk, chunks):
+            writer.append(ds)
+            if climatology is not None:
+                climatology.update(ds)
+
+    with xr.open_dataset(paths[0], engine='netcdf4') as ds:
+        corriolis, ocean_mask = gpi.static_fields(ds['lat'].values, ds['lon'].values)
+    writer.close(dict(corriolis=corriolis, ocean_mask=ocean_mask))
+
+    if climatology is None:
+        return None
+
+    result = climatology.result()
+    result.to_netcdf(climatology_path)
+    return result
+
+
+def open_time_series(path: str) -> xr.Dataset:
+    if path.rstrip(os.sep).endswith('.zarr'):
+        return xr.open_zarr(path)
+
+    return xr.open_dataset(path, engine='netcdf4')
+
+
+class _NetCDFWriter:
+    """
+    Append chunks along an unlimited `time` dimension with `netCDF4`,
+    which xarray cannot do.
+    The file is written to a temporary path first, and moved into place on `close()`.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._tmp_path = f'{path}.tmp'
+        self._nc = None
+        self._nb_times = 0
+
+    def append(self, ds: xr.Dataset):
+        if self._nc is None:
+            self._create(ds)
+
+        nb_times = ds.sizes['time']
+        times = slice(self._nb_times, self._nb_times + nb_times)
+        self._nc['time'][times] = (ds['time'].values - np.datetime64('1970-01-01')) / np.timedelta64(1, 'h')
+        for name, var in ds.data_vars.items():
+            self._nc[name][times] = var.values
+
+        self._nb_times += nb_times
+
+    def _create(self, ds: xr.Dataset):
+        self._nc = netCDF4.Dataset(self._tmp_path, 'w')
+        self._nc.createDimension('time', None)
+        self._nc.createDimension('lat', ds.sizes['lat'])
+        self._nc.createDimension('lon', ds.sizes['lon'])
+
+        time = self._nc.createVariable('time', 'f8', ('time',))
+        time.units = 'hours since 1970-01-01 00:00:00'
+        time.calendar = 'standard'
+        for name in ('lat', 'lon'):
+            self._nc.createVariable(name, 'f8', (name,))[:] = ds[name].values
+
+        for name in ds.data_vars:
+            self._nc.createVariable(
+                name, 'f4', ('time', 'lat', 'lon'),
+                zlib=True, chunksizes=(1, ds.sizes['lat'], ds.sizes['lon']))
+
+    def close(self, static_fields: dict[str, np.ndarray]):
+        for name, values in static_fields.items():
+            self._nc.createVariable(name, 'f4', ('lat', 'lon'))[:] = values
+
+        self._nc.close()
+        os.replace(self._tmp_path, self._path)
+
+
+class _ZarrWriter:
+    def __init__(self, path: str):
+        self._path = path
+        self._created = False
+
+    def append(self, ds: xr.Dataset):
+        if self._created:
+            ds.to_zarr(self._path, append_dim='time')
+        else:
+            ds.to_zarr(self._path, mode='w')
+            self._created = True
+
+    def close(self, static_fields: dict[str, np.ndarray]):
+        xr.Dataset({name: (('lat', 'lon'), values.astype(np.float32))
+                    for name, values in static_fields.items()}).to_zarr(self._path, mode='a')
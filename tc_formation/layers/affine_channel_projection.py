@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import numpy as np
+import tensorflow as tf
+
+from ..data.scaler_pca import ScalerPCA
+
+
+class AffineChannelProjection(tf.keras.layers.Layer):
+    """
+    Affine projection of the channel axis: `inputs @ kernel + bias`,
+    which is a 1x1 convolution done as a single float32 matmul.
+
+    Standard scaling followed by PCA projection, i.e.
+    `SklearnStandardScaler` followed by `SklearnPCALayer`, is folded into one such projection:
+    `((x - mean) / std - pca_mean) @ components_T
+    == x @ (components_T / std[:, None]) - (mean / std + pca_mean) @ components_T`.
+    """
+
+    def __init__(self, kernel: np.ndarray, bias: np.ndarray, **kwargs) -> None:
+        """
+        :param kernel: array of shape (C, n_components).
+        :param bias: array of shape (n_components,).
+        """
+        super().__init__(**kwargs)
+        kernel = np.asarray(kernel, dtype=np.float32)
+        bias = np.asarray(bias, dtype=np.float32)
+        assert kernel.ndim == 2 and bias.shape == kernel.shape[1:], 'Kernel must be (C, n) and bias must be (n,).'
+
+        self.kernel = tf.Variable(kernel, trainable=False, dtype=tf.float32)
+        self.bias = tf.Variable(bias, trainable=False, dtype=tf.float32)
+
+    @classmethod
+    def from_sklearn(cls, scaler, pca, whiten: bool = False, **kwargs) -> AffineChannelProjection:
+        """
+        Fold fitted scaler and PCA into the projection.
+        Both sklearn objects (`StandardScaler`, `PCA`/`IncrementalPCA`) and `ScalerPCA` are accepted.
+
+        :param whiten: whether to also divide each component by its standard deviation.
+        """
+        scale = np.asarray(scaler.scale_, dtype=np.float64)
+        mean = np.asarray(scaler.mean_, dtype=np.float64)
+        components_T = np.asarray(pca.components_, dtype=np.float64).T
+
+        # sklearn's PCA centers the scaled values with its own `mean_`,
+        # while `ScalerPCA.mean_` is the mean of the scaler, and scaled values are already centered.
+        pca_mean = 0. if isinstance(pca, ScalerPCA) else np.asarray(getattr(pca, 'mean_', 0.), dtype=np.float64)
+
+        kernel = components_T / scale[:, None]
+        bias = -(mean / scale + pca_mean) @ components_T
+        if whiten:
+            std = np.sqrt(np.asarray(pca.explained_variance_, dtype=np.float64))
+            kernel = kernel / std
+            bias = bias / std
+
+        return cls(kernel, bias, **kwargs)
+
+    @classmethod
+    def load(cls, path: str, whiten: bool = False, **kwargs) -> AffineChannelProjection:
+        """
+        Load from the artifact saved by `ScalerPCA.save()`.
+        """
+        scaler_pca = ScalerPCA.load(path)
+        return cls.from_sklearn(scaler_pca, scaler_pca, whiten=whiten, **kwargs)
+
+    def call(self, inputs):
+        # `inputs` is of shape (..., C),
+        # `tensordot` flattens all leading axes so the projection is a single matmul.
+        inputs = tf.cast(inputs, tf.float32)
+        return tf.tensordot(inputs, self.kernel, axes=1) + self.bias
+
+    def compute_output_shape(self, input_shape):
+        return tuple(input_shape[:-1]) + (self.bias.shape[0],)
+
+    def get_config(self):
+        config = super().get_config()
+        config.update(
+            kernel=self.kernel.numpy().tolist(),
+            bias=self.bias.numpy().tolist())
+        return config
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+import numpy as np
+import tensorflow as tf
+
+from ..genesis_potential import genesis_potential_index as gpi
+
+
+# Channels required to compute the genesis potential index,
+# `rhprs@700..500` is a list of channels of relative humidity from 700mb to 500mb.
+# The vertical shear only uses the u-component of the wind, so `vgrdprs` is not required.
+REQUIRED_CHANNELS = (
+    'absvprs@950',
+    'ugrdprs@950',
+    'ugrdprs@200',
+    'tmpsfc',
+    'hgtprs@1000',
+    'hgtprs@500',
+    'rhprs@700..500',
+)
+
+
+class GenesisPotentialIndex(tf.keras.layers.Layer):
+    """
+    Compute the genesis potential index and its components from a batch of channel-last observations,
+    with the same formulas as `tc_formation.genesis_potential.genesis_potential_index`,
+    so the GPI can be computed inside `tf.data` map or the model
+    instead of being precomputed from the netcdf files.
+
+    Inputs are of shape (..., lat, lon, C), and outputs are of shape (..., lat, lon, C + n)
+    when the components are appended to the inputs, or (..., lat, lon, n) otherwise.
+    """
+
+    def __init__(
+            self,
+            latitudes: np.ndarray,
+            longitudes: np.ndarray,
+            channels: dict,
+            components: tuple[str, ...] = ('gpi',),
+            append: bool = True,
+            **kwargs) -> None:
+        """
+        :param latitudes: latitudes of the grid.
+        :param longitudes: longitudes of the grid.
+        :param channels: index of each of `REQUIRED_CHANNELS` in the inputs,
+            `rhprs@700..500` maps to a list of indices.
+        :param components: components to output, see `genesis_potential_index.COMPONENTS`.
+        :param append: whether to append the components to the inputs.
+        """
+        super().__init__(**kwargs)
+        missing = [c for c in REQUIRED_CHANNELS if c not in channels]
+        assert not missing, f'Missing channels {missing}'
+        assert all(c in gpi.COMPONENTS for c in components), f'Components must be in {gpi.COMPONENTS}'
+
+        self._latitudes = np.asarray(latitudes, dtype=np.float64)
+        self._longitudes = np.asarray(longitudes, dtype=np.float64)
+        self._channels = {name: (list(map(int, idx)) if isinstance(idx, (list, tuple, np.ndarray)) else int(idx))
+                          for name, idx in channels.items()}
+        assert len(self._channels['rhprs@700..500']) > 0, 'At least one relative humidity channel is required.'
+        self._components = tuple(components)
+        self._append = append
+
+        # Static fields are the same for every observation of the grid.
+        corriolis, ocean_mask = gpi.static_fields(self._latitudes, self._longitudes)
+        self._corriolis = tf.constant(corriolis, dtype=tf.float32)
+        self._ocean_mask = tf.constant(ocean_mask, dtype=tf.float32)
+
+    @classmethod
+    def from_subset(
+            cls,
+            subset: OrderedDict,
+            latitudes: np.ndarray,
+            longitudes: np.ndarray,
+            **kwargs) -> GenesisPotentialIndex:
+        """
+        Figure out the channels from the subset used to load observations,
+        i.e. channels are in the same order as `data_utils.extract_variables_from_dataset()`.
+        Relative humidity channels are all `rhprs` levels of the subset from 700mb to 500mb.
+        """
+        channels = {}
+        rh = []
+        idx = 0
+        for key, lev in subset.items():
+            if isinstance(lev, bool):
+                if lev:
+                    channels[key] = idx
+                    idx += 1
+                continue
+
+            for level in lev:
+                channels[f'{key}@{level}'] = idx
+                if key == 'rhprs' and 500 <= level <= 700:
+                    rh.append(idx)
+                idx += 1
+
+        channels['rhprs@700..500'] = rh
+        return cls(latitudes, longitudes, channels, **kwargs)
+
+    def call(self, inputs):
+        inputs = tf.cast(inputs, tf.float32)
+        components = self.components(inputs)
+        outputs = tf.stack(
+            [tf.broadcast_to(components[name], tf.shape(inputs)[:-1]) for name in self._components],
+            axis=-1)
+
+        if self._append:
+            return tf.concat([inputs, outputs], axis=-1)
+
+        return outputs
+
+    def components(self, inputs) -> dict[str, tf.Tensor]:
+        """
+        All components of the GPI, each of shape (..., lat, lon).
+        """
+        channel = lambda name: inputs[..., self._channels[name]]
+
+        components = dict(
+            corriolis=self._corriolis,
+            ocean_mask=self._ocean_mask,
+            vorticity=channel('absvprs@950') + 5.,
+            # sqrt(u^2), the same as `vertical_shear_parameter()`.
+            vertical_shear=tf.abs(channel('ugrdprs@200') - channel('ugrdprs@950')),
+        )
+
+        surface_temp = channel('tmpsfc') - 273.15 - 26
+        components['ocean_thermal'] = tf.where(surface_temp > 0, surface_temp, 1e-6)
+        components['moist_stability'] = (channel('hgtprs@500') - channel('hgtprs@1000')) / 500.0 + 5.
+
+        mean_rh = tf.reduce_mean(tf.gather(inputs, self._channels['rhprs@700..500'], axis=-1), axis=-1)
+        components['relative_humidity'] = tf.clip_by_value((mean_rh - 40.0) / 70.0, 0.0, 1.0)
+
+        components['thermal'] = (components['ocean_thermal']
+                                 * components['moist_stability']
+                                 * components['relative_humidity'])
+        components['dynamic'] = (components['vorticity']
+                                 * components['corriolis']
+                                 * components['vertical_shear'])
+        components['gpi'] = components['thermal'] * components['dynamic'] * components['ocean_mask']
+        return components
+
+    def compute_output_shape(self, input_shape):
+        nb_outputs = len(self._components)
+        if self._append:
+            nb_outputs += input_shape[-1]
+
+        return tuple(input_shape[:-1]) + (nb_outputs,)
+
+    def get_config(self):
+        config = super().get_config()
+        config.update(
+            latitudes=self._latitudes.tolist(),
+            longitudes=self._longitudes.tolist(),
+            channels=self._channels,
+            components=list(self._components),
+            append=self._append)
+        return config
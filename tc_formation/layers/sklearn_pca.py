@@ -3,6 +3,8 @@ from __future__ import annotations
 import numpy as np
 import tensorflow as tf
 
+from ..data.scaler_pca import ScalerPCA
+
 
 class SklearnPCALayer(tf.keras.layers.Layer):
     def __init__(self, components: np.ndarray, variances: np.ndarray | None = None) -> None:
@@ -18,6 +20,15 @@ class SklearnPCALayer(tf.keras.layers.Layer):
             tf.Variable(variances, trainable=False, dtype=tf.float32)
             if variances is not None else None)
 
+    @classmethod
+    def load(cls, path: str) -> SklearnPCALayer:
+        """
+        Load from the artifact saved by `ScalerPCA.save()`.
+        The inputs should already be scaled, e.g. by `SklearnStandardScaler.load(path)`.
+        """
+        pca = ScalerPCA.load(path)
+        return cls(pca.components_, pca.explained_variance_)
+
     def call(self, inputs):
         # `inputs` is of shape (B, W, H, C)
         return tf.einsum('bwhc,cn->bwhn', inputs, self.components_T)
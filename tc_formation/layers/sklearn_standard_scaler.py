@@ -1,7 +1,11 @@
+from __future__ import annotations
+
 import numpy as np
 from sklearn.preprocessing import StandardScaler
 import tensorflow as tf
 
+from ..data.scaler_pca import ScalerPCA
+
 
 class SklearnStandardScaler(tf.keras.layers.Layer):
     def __init__(self, scaler: StandardScaler) -> None:
@@ -11,6 +15,13 @@ class SklearnStandardScaler(tf.keras.layers.Layer):
         self.means = tf.Variable(scaler.mean_, trainable=False)
         self.stds = tf.Variable(np.sqrt(scaler.var_), trainable=False)
 
+    @classmethod
+    def load(cls, path: str) -> SklearnStandardScaler:
+        """
+        Load from the artifact saved by `ScalerPCA.save()`.
+        """
+        return cls(ScalerPCA.load(path))
+
     def call(self, inputs):
         return (inputs - self.means) / self.stds
 
@@ -23,6 +34,13 @@ class SklearnStandardScalerInverse(tf.keras.layers.Layer):
         self.means = tf.Variable(scaler.mean_, trainable=False)
         self.stds = tf.Variable(np.sqrt(scaler.var_), trainable=False)
 
+    @classmethod
+    def load(cls, path: str) -> SklearnStandardScalerInverse:
+        """
+        Load from the artifact saved by `ScalerPCA.save()`.
+        """
+        return cls(ScalerPCA.load(path))
+
     def call(self, inputs):
         return inputs * self.stds + self.means
 
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import numpy as np
+import tensorflow as tf
+
+
+class TCGridProbability(tf.keras.layers.Layer):
+    """
+    Produce the TC probability grid of a batch of observations
+    from the TC centres of each observation.
+
+    Each TC contributes an RBF kernel `exp(-d^2 / (2 * r^2))`, where `d` is in degree,
+    and values below `clip_threshold` are set to 0, which is the same as
+    `TimeSeriesTropicalCycloneWithGridProbabilityDataLoader._create_probability_grid_gt`.
+    However, instead of evaluating the kernel over the whole domain for each TC,
+    the kernel is only evaluated inside the window of grid points within the clip radius,
+    then these windows are scattered into the output grid.
+    """
+
+    def __init__(
+            self,
+            latitudes: np.ndarray,
+            longitudes: np.ndarray,
+            tc_avg_radius_lat_deg: float = 3,
+            clip_threshold: float = 0.1,
+            **kwargs) -> None:
+        """
+        :param latitudes: latitudes of the grid, must be evenly spaced.
+        :param longitudes: longitudes of the grid, must be evenly spaced.
+        """
+        super().__init__(**kwargs)
+        assert 0 < clip_threshold < 1, 'Clip threshold must be in (0, 1).'
+
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        self._lat_step = _uniform_step(latitudes, 'latitudes')
+        self._lon_step = _uniform_step(longitudes, 'longitudes')
+        self._latitudes = latitudes
+        self._longitudes = longitudes
+        self._tc_avg_radius_lat_deg = tc_avg_radius_lat_deg
+        self._clip_threshold = clip_threshold
+
+        # Distance (in degree) where the kernel falls below the clip threshold.
+        clip_radius = tc_avg_radius_lat_deg * np.sqrt(-2 * np.log(clip_threshold))
+        lat_half_window = int(np.ceil(clip_radius / abs(self._lat_step))) + 1
+        lon_half_window = int(np.ceil(clip_radius / abs(self._lon_step))) + 1
+
+        # Precomputed coordinate tensors.
+        self._lat_axis = tf.constant(latitudes, dtype=tf.float32)
+        self._lon_axis = tf.constant(longitudes, dtype=tf.float32)
+        self._lat_offsets = tf.range(-lat_half_window, lat_half_window + 1)
+        self._lon_offsets = tf.range(-lon_half_window, lon_half_window + 1)
+
+    @property
+    def latitudes(self) -> np.ndarray:
+        return self._latitudes
+
+    @property
+    def longitudes(self) -> np.ndarray:
+        return self._longitudes
+
+    @property
+    def grid_shape(self) -> tuple[int, int]:
+        return len(self._latitudes), len(self._longitudes)
+
+    def call(self, centres: tf.RaggedTensor) -> tf.Tensor:
+        """
+        :param centres: ragged tensor of shape (B, None, 2), each centre is a (lat, lon) pair.
+        :returns: accumulated probability of shape (B, lat, lon).
+        """
+        nb_lat, nb_lon = self.grid_shape
+        batch_size = centres.nrows(out_type=tf.int32)
+        batch_idx = centres.value_rowids(out_type=tf.int32)
+        points = tf.cast(centres.flat_values, tf.float32)
+        lat, lon = points[:, 0], points[:, 1]
+
+        # Index of the nearest grid point of each centre.
+        lat_idx = tf.cast(tf.round((lat - float(self._latitudes[0])) / self._lat_step), tf.int32)
+        lon_idx = tf.cast(tf.round((lon - float(self._longitudes[0])) / self._lon_step), tf.int32)
+
+        # Windows of grid points around each centre: (N, Kh) and (N, Kw).
+        lat_window = lat_idx[:, None] + self._lat_offsets[None, :]
+        lon_window = lon_idx[:, None] + self._lon_offsets[None, :]
+        lat_valid = (lat_window >= 0) & (lat_window < nb_lat)
+        lon_valid = (lon_window >= 0) & (lon_window < nb_lon)
+        lat_window = tf.clip_by_value(lat_window, 0, nb_lat - 1)
+        lon_window = tf.clip_by_value(lon_window, 0, nb_lon - 1)
+
+        # RBF kernel inside the windows: (N, Kh, Kw).
+        lat_diff = tf.gather(self._lat_axis, lat_window) - lat[:, None]
+        lon_diff = tf.gather(self._lon_axis, lon_window) - lon[:, None]
+        dist_sq = lat_diff[:, :, None] ** 2 + lon_diff[:, None, :] ** 2
+        prob = tf.exp(-dist_sq / (2 * self._tc_avg_radius_lat_deg ** 2))
+        valid = lat_valid[:, :, None] & lon_valid[:, None, :] & (prob >= self._clip_threshold)
+        prob = tf.where(valid, prob, tf.zeros_like(prob))
+
+        # Stamp the windows into the output grid.
+        window_shape = tf.shape(prob)
+        indices = tf.stack([
+            tf.broadcast_to(batch_idx[:, None, None], window_shape),
+            tf.broadcast_to(lat_window[:, :, None], window_shape),
+            tf.broadcast_to(lon_window[:, None, :], window_shape),
+        ], axis=-1)
+        grid = tf.zeros((batch_size, nb_lat, nb_lon), dtype=tf.float32)
+        return tf.tensor_scatter_nd_add(grid, tf.reshape(indices, (-1, 3)), tf.reshape(prob, (-1,)))
+
+    def single(self, centres: tf.Tensor) -> tf.Tensor:
+        """
+        Same as `call()`, but for a single observation,
+        where `centres` is a tensor of shape (None, 2).
+        Useful inside `tf.data` map before batching.
+        """
+        centres = tf.RaggedTensor.from_tensor(tf.reshape(centres, (1, -1, 2)))
+        return self(centres)[0]
+
+    def get_config(self):
+        config = super().get_config()
+        config.update(
+            latitudes=self._latitudes.tolist(),
+            longitudes=self._longitudes.tolist(),
+            tc_avg_radius_lat_deg=self._tc_avg_radius_lat_deg,
+            clip_threshold=self._clip_threshold)
+        return config
+
+
+def probability_to_groundtruth(prob: tf.Tensor, softmax_output: bool, smooth_gt: bool = False) -> tf.Tensor:
+    """
+    Convert probability grid of shape (..., lat, lon) to groundtruth of shape (..., lat, lon, 1 or 2),
+    the same as `_create_probability_grid_gt`.
+    """
+    has_tc = prob > 0
+    positive = tf.where(has_tc, prob if smooth_gt else tf.ones_like(prob), tf.zeros_like(prob))
+    if not softmax_output:
+        return positive[..., None]
+
+    negative = tf.where(has_tc, tf.zeros_like(prob), tf.ones_like(prob))
+    return tf.stack([negative, positive], axis=-1)
+
+
+def probability_to_mask(prob: tf.Tensor, clip_threshold: float, inside: float = 1.0) -> tf.Tensor:
+    """
+    Convert probability grid of shape (..., lat, lon) to mask of shape (..., lat, lon, 1),
+    where grid points with probability at least `clip_threshold` are `inside`, and others are `1 - inside`.
+    """
+    mask = tf.where(prob >= clip_threshold, inside, 1.0 - inside)
+    return mask[..., None]
+
+
+def _uniform_step(axis: np.ndarray, name: str) -> float:
+    assert len(axis) > 1, f'{name} must have at least 2 values.'
+    steps = np.diff(axis)
+    assert np.allclose(steps, steps[0]), f'{name} must be evenly spaced.'
+    return float(steps[0])
+
+
+def ragged_centres(locations) -> tf.RaggedTensor:
+    """
+    Pack TC centres of each observation into a ragged tensor of shape (N, None, 2).
+
+    :param locations: for each observation, an array-like of (lat, lon) pairs, which can be empty.
+    """
+    locations = [np.asarray(loc, dtype=np.float32).reshape((-1, 2)) for loc in locations]
+    return tf.RaggedTensor.from_row_lengths(
+        np.concatenate(locations + [np.empty((0, 2), dtype=np.float32)], axis=0),
+        np.asarray([len(loc) for loc in locations], dtype=np.int64))
+
+
+def tc_locations_from_labels(has_tc, latitudes, longitudes) -> list:
+    """
+    Convert label columns `TC`, `Latitude` and `Longitude` into list of (lat, lon) pairs,
+    where `Latitude` and `Longitude` of each row can be either a scalar or a list (when observations are grouped by date).
+    Observations without TC have no centre.
+    """
+    return [np.stack([np.atleast_1d(lat), np.atleast_1d(lon)], axis=-1) if tc else np.empty((0, 2))
+            for tc, lat, lon in zip(has_tc, latitudes, longitudes)]
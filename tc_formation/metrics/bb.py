@@ -1,5 +1,4 @@
 import cv2 as cv
-from functools import partial
 import numpy as np
 import tensorflow as tf
 from tensorflow.keras.metrics import Metric
@@ -86,6 +85,162 @@ def bb_confusion_matrix(gt, pred, iou_threshold=0.5, pred_threshold=0.5):
     return tp, 0, fp, fn
 
 
+def _foreground(y, threshold):
+    """
+    Foreground mask of shape (B, H, W) of a batch of outputs,
+    the same as the label image of `extract_bounding_boxes()`.
+    """
+    y = tf.convert_to_tensor(y)
+    if y.shape.rank == 3:
+        return y > threshold
+    if y.shape[-1] == 2:
+        # `argmax` picks the background on ties.
+        return y[..., 1] > y[..., 0]
+
+    return y[..., 0] > threshold
+
+
+def connected_component_boxes(mask):
+    """
+    Bounding boxes of 8-connected components of a batch of masks,
+    which are the same as the outer contours of `cv.findContours()`, in the same order.
+
+    Each pixel is labelled by its raster index, and the minimum label is propagated
+    to neighbours until convergence, so each component ends up labelled by
+    the raster index of its first pixel, which is where `cv.findContours()` starts tracing it.
+    Labels are exact in float32 for images smaller than 2^24 pixels.
+
+    :param mask: boolean tensor of shape (B, H, W).
+    :returns: a tuple of boxes (B, K, 4) of (x, y, w, h) and validity mask (B, K),
+        where K is the maximum number of components in a sample.
+    """
+    mask = tf.convert_to_tensor(mask, dtype=tf.bool)
+    shape = tf.shape(mask)
+    batch_size, height, width = shape[0], shape[1], shape[2]
+    nb_pixels = height * width
+
+    background = tf.cast(nb_pixels, tf.float32)
+    raster = tf.cast(tf.reshape(tf.range(nb_pixels), (1, height, width)), tf.float32)
+    labels = tf.where(mask, tf.broadcast_to(raster, shape), background)
+
+    def propagate(labels, _):
+        neighbours_min = -tf.nn.max_pool2d(-labels[..., None], ksize=3, strides=1, padding='SAME')[..., 0]
+        new_labels = tf.where(mask, tf.minimum(labels, neighbours_min), background)
+        return new_labels, tf.reduce_any(new_labels < labels)
+
+    labels, _ = tf.while_loop(
+        lambda _, changed: changed,
+        propagate,
+        (labels, tf.constant(True)))
+
+    # Pixels of all components.
+    pixels = tf.where(mask)
+    pixel_labels = tf.cast(tf.gather_nd(labels, pixels), tf.int64)
+    batch_idx, y, x = pixels[:, 0], pixels[:, 1], pixels[:, 2]
+
+    # Segment of each component.
+    nb_pixels = tf.cast(nb_pixels, tf.int64)
+    component_keys, segments = tf.unique(batch_idx * nb_pixels + pixel_labels)
+    nb_components = tf.shape(component_keys)[0]
+    x_min = tf.math.unsorted_segment_min(x, segments, nb_components)
+    x_max = tf.math.unsorted_segment_max(x, segments, nb_components)
+    y_min = tf.math.unsorted_segment_min(y, segments, nb_components)
+    y_max = tf.math.unsorted_segment_max(y, segments, nb_components)
+    boxes = tf.stack([x_min, y_min, x_max - x_min + 1, y_max - y_min + 1], axis=-1)
+
+    # `cv.findContours()` lists contours in reverse order of where they start.
+    component_batch = component_keys // nb_pixels
+    component_start = component_keys % nb_pixels
+    order = tf.argsort(component_batch * nb_pixels + (nb_pixels - 1 - component_start))
+    boxes = tf.gather(boxes, order)
+    component_batch = tf.gather(component_batch, order)
+
+    # Position of each component within its sample.
+    counts = tf.math.bincount(
+        tf.cast(component_batch, tf.int32), minlength=batch_size, maxlength=batch_size, dtype=tf.int64)
+    sample_starts = tf.cumsum(counts, exclusive=True)
+    positions = tf.range(tf.cast(nb_components, tf.int64)) - tf.gather(sample_starts, component_batch)
+
+    padded_shape = tf.stack([tf.cast(batch_size, tf.int64), tf.reduce_max(counts)])
+    indices = tf.stack([component_batch, positions], axis=-1)
+    padded_boxes = tf.scatter_nd(indices, boxes, tf.concat([padded_shape, tf.constant([4], tf.int64)], axis=0))
+    valid = tf.scatter_nd(indices, tf.ones_like(positions, dtype=tf.int32), padded_shape) > 0
+    return padded_boxes, valid
+
+
+def pairwise_iou(boxes1, boxes2):
+    """
+    IoU between all pairs of boxes, the same as `bb_iou()`.
+
+    :param boxes1: tensor of shape (..., N, 4) of (x, y, w, h).
+    :param boxes2: tensor of shape (..., M, 4) of (x, y, w, h).
+    :returns: tensor of shape (..., N, M).
+    """
+    boxes1 = tf.cast(boxes1, tf.float64)[..., :, None, :]
+    boxes2 = tf.cast(boxes2, tf.float64)[..., None, :, :]
+
+    x1 = tf.maximum(boxes1[..., 0], boxes2[..., 0])
+    y1 = tf.maximum(boxes1[..., 1], boxes2[..., 1])
+    x2 = tf.minimum(boxes1[..., 0] + boxes1[..., 2], boxes2[..., 0] + boxes2[..., 2])
+    y2 = tf.minimum(boxes1[..., 1] + boxes1[..., 3], boxes2[..., 1] + boxes2[..., 3])
+
+    intersection = tf.where((x1 < x2) & (y1 < y2), (x2 - x1) * (y2 - y1), tf.zeros_like(x1))
+    union = boxes1[..., 2] * boxes1[..., 3] + boxes2[..., 2] * boxes2[..., 3] - intersection
+    return tf.math.divide_no_nan(intersection, union)
+
+
+def greedy_match_counts(iou, gt_valid, pred_valid, iou_threshold):
+    """
+    Match groundtruth boxes in order to the remaining predicted box with the highest IoU,
+    the same as `bb_confusion_matrix()`, for all samples of a batch at once.
+
+    :param iou: tensor of shape (B, N, M).
+    :param gt_valid: boolean tensor of shape (B, N).
+    :param pred_valid: boolean tensor of shape (B, M).
+    :returns: a tuple of (true positive, false positive, false negative) of the whole batch.
+    """
+    nb_gt = tf.shape(iou)[1]
+    pred_idx = tf.range(tf.shape(iou)[2])
+
+    def match(k, available, tp, fn):
+        # Unavailable predictions never match.
+        row = tf.where(available, iou[:, k, :], -tf.ones_like(iou[:, k, :]))
+        best = tf.reduce_max(row, axis=-1, keepdims=True)
+        # The first of the best predictions, as `max()` does.
+        best_idx = tf.reduce_min(
+            tf.where(row == best, pred_idx[None, :], tf.shape(iou)[2]), axis=-1)
+
+        matched = gt_valid[:, k] & (best[:, 0] >= iou_threshold)
+        taken = (pred_idx[None, :] == best_idx[:, None]) & matched[:, None]
+        return (k + 1,
+                available & ~taken,
+                tp + tf.reduce_sum(tf.cast(matched, tf.int64)),
+                fn + tf.reduce_sum(tf.cast(gt_valid[:, k] & ~matched, tf.int64)))
+
+    _, available, tp, fn = tf.while_loop(
+        lambda k, *_: k < nb_gt,
+        match,
+        (tf.constant(0), pred_valid, tf.constant(0, tf.int64), tf.constant(0, tf.int64)))
+
+    fp = tf.reduce_sum(tf.cast(available, tf.int64))
+    return tp, fp, fn
+
+
+def tf_iou_confusion_matrix(y_true, y_pred, iou_threshold=0.5, pred_threshold=0.5):
+    """
+    Graph-compatible `BBoxesIoUMetric.iou_confusion_matrix()`.
+
+    Noted that holes inside blobs are ignored,
+    while `cv.findContours()` with `RETR_LIST` also reports their contours as boxes.
+
+    :returns: a tuple of (true positive, false positive, false negative) of the whole batch.
+    """
+    gt_boxes, gt_valid = connected_component_boxes(_foreground(y_true, pred_threshold))
+    pred_boxes, pred_valid = connected_component_boxes(_foreground(y_pred, pred_threshold))
+    iou = pairwise_iou(gt_boxes, pred_boxes)
+    return greedy_match_counts(iou, gt_valid, pred_valid, iou_threshold)
+
+
 class BBoxesIoUMetric(Metric):
     def __init__(self, iou_threshold=0.5, pred_threshold=0.5, name=None):
         super().__init__(name)
@@ -97,12 +252,11 @@ class BBoxesIoUMetric(Metric):
         self._fn = self.add_weight(name='fn', initializer='zeros', dtype=tf.int64)
 
     def update_state(self, y_true, y_pred, sample_weight=None):
-        tp, fp, fn = tf.numpy_function(
-                partial(BBoxesIoUMetric.iou_confusion_matrix,
-                    iou_threshold=self._iou_threshold,
-                    pred_threshold=self._pred_threshold),
-                [y_true, y_pred],
-                [tf.int64, tf.int64, tf.int64])
+        tp, fp, fn = tf_iou_confusion_matrix(
+            y_true,
+            y_pred,
+            iou_threshold=self._iou_threshold,
+            pred_threshold=self._pred_threshold)
 
         self._tp.assign_add(tf.cast(tp, dtype=tf.int64))
         self._fp.assign_add(tf.cast(fp, dtype=tf.int64))
@@ -0,0 +1,175 @@
+"""
+Offline evaluation of grid predictions with bounding boxes,
+for a whole stack of predictions at once.
+
+Unlike `bb.bb_confusion_matrix()`, which computes IoU one pair at a time
+and matches greedily in groundtruth order,
+boxes of all samples are extracted with a single labelling pass,
+IoU matrices are computed with broadcasting,
+and matching is done once per IoU threshold on the same matrices.
+"""
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+from scipy import ndimage
+from scipy.optimize import linear_sum_assignment
+
+
+# How to match groundtruth boxes to predicted boxes:
+# * `hungarian`: maximum number of matches, ties broken by total IoU.
+# * `greedy`: pairs in decreasing order of IoU.
+# * `sequential`: groundtruth boxes in order, each with the remaining box of the highest IoU,
+#   which is the same as `bb.bb_confusion_matrix()`.
+MATCHING_METHODS = ('hungarian', 'greedy', 'sequential')
+
+# 8-connectivity within each sample, and no connectivity across samples.
+_STACK_STRUCTURE = np.zeros((3, 3, 3), dtype=bool)
+_STACK_STRUCTURE[1] = True
+
+
+def foreground(y: np.ndarray, threshold: float = 0.5) -> np.ndarray:
+    """
+    Foreground mask of shape (N, H, W) of a stack of outputs of shape (N, H, W) or (N, H, W, 1 or 2),
+    the same as the label image of `bb.extract_bounding_boxes()`.
+    """
+    y = np.asarray(y)
+    if y.ndim == 3:
+        return y > threshold
+    if y.shape[-1] == 2:
+        return np.argmax(y, axis=-1) == 1
+
+    return y[..., 0] > threshold
+
+
+def extract_boxes(mask: np.ndarray) -> list[np.ndarray]:
+    """
+    Bounding boxes of 8-connected components of each mask of the stack,
+    in the same order as `bb.extract_bounding_boxes()`.
+
+    :param mask: boolean array of shape (N, H, W).
+    :returns: for each sample, an array of shape (n, 4) of (x, y, w, h).
+    """
+    labels, _ = ndimage.label(mask, structure=_STACK_STRUCTURE)
+    objects = ndimage.find_objects(labels)
+
+    boxes = [[] for _ in range(len(mask))]
+    # Labels are in raster order of the first pixel of components,
+    # while `cv.findContours()` lists them in reverse.
+    for sl in reversed(objects):
+        sample, ys, xs = sl
+        boxes[sample.start].append((xs.start, ys.start, xs.stop - xs.start, ys.stop - ys.start))
+
+    return [np.asarray(b, dtype=np.float64).reshape((-1, 4)) for b in boxes]
+
+
+def iou_matrix(boxes1: np.ndarray, boxes2: np.ndarray) -> np.ndarray:
+    """
+    IoU between all pairs of boxes, the same as `bb.bb_iou()`.
+
+    :param boxes1: array of shape (n, 4) of (x, y, w, h).
+    :param boxes2: array of shape (m, 4) of (x, y, w, h).
+    :returns: array of shape (n, m).
+    """
+    boxes1 = np.asarray(boxes1, dtype=np.float64)[:, None, :]
+    boxes2 = np.asarray(boxes2, dtype=np.float64)[None, :, :]
+
+    x1 = np.maximum(boxes1[..., 0], boxes2[..., 0])
+    y1 = np.maximum(boxes1[..., 1], boxes2[..., 1])
+    x2 = np.minimum(boxes1[..., 0] + boxes1[..., 2], boxes2[..., 0] + boxes2[..., 2])
+    y2 = np.minimum(boxes1[..., 1] + boxes1[..., 3], boxes2[..., 1] + boxes2[..., 3])
+
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    union = boxes1[..., 2] * boxes1[..., 3] + boxes2[..., 2] * boxes2[..., 3] - intersection
+    return intersection / union
+
+
+def match_boxes(iou: np.ndarray, iou_threshold: float, method: str = 'hungarian') -> int:
+    """
+    :param iou: IoU matrix of shape (n groundtruth boxes, m predicted boxes).
+    :returns: number of matched pairs, i.e. true positives.
+    """
+    assert method in MATCHING_METHODS, f'Invalid matching method {method}, must be one of {MATCHING_METHODS}'
+    if iou.size == 0:
+        return 0
+
+    valid = iou >= iou_threshold
+    if method == 'hungarian':
+        # Every match outweighs any total IoU, so the number of matches is maximized first.
+        weight = np.where(valid, min(iou.shape) + 1 + iou, 0.)
+        rows, cols = linear_sum_assignment(weight, maximize=True)
+        return int(np.count_nonzero(valid[rows, cols]))
+
+    if method == 'greedy':
+        gt_idx, pred_idx = np.nonzero(valid)
+        order = np.argsort(-iou[gt_idx, pred_idx], kind='stable')
+        gt_used = np.zeros(iou.shape[0], dtype=bool)
+        pred_used = np.zeros(iou.shape[1], dtype=bool)
+        for g, p in zip(gt_idx[order], pred_idx[order]):
+            if not (gt_used[g] or pred_used[p]):
+                gt_used[g] = pred_used[p] = True
+        return int(np.count_nonzero(gt_used))
+
+    available = np.ones(iou.shape[1], dtype=bool)
+    tp = 0
+    for row in iou:
+        row = np.where(available, row, -1.)
+        best = int(np.argmax(row))
+        if row[best] >= iou_threshold:
+            available[best] = False
+            tp += 1
+    return tp
+
+
+def evaluate(
+        y_true: np.ndarray,
+        y_pred: np.ndarray,
+        iou_thresholds=(0.1, 0.2, 0.3, 0.4, 0.5),
+        pred_threshold: float = 0.5,
+        method: str = 'hungarian') -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Evaluate a stack of predictions against groundtruths at all IoU thresholds in one pass.
+
+    :param y_true: groundtruths of shape (N, H, W) or (N, H, W, 1 or 2).
+    :param y_pred: predictions of the same shape as `y_true`.
+    :param pred_threshold: threshold to binarize both groundtruths and predictions, the same as `bb.bb_confusion_matrix()`.
+    :param method: how to match boxes, see `MATCHING_METHODS`.
+    :returns: a tuple of data frames:
+        * per sample: `Sample`, `IoU Threshold`, `TP`, `FP`, `FN`.
+        * aggregate: `IoU Threshold`, `TP`, `FP`, `FN`, `Precision`, `Recall`.
+    """
+    assert len(y_true) == len(y_pred), 'Groundtruths and predictions must have the same number of samples.'
+    gt_boxes = extract_boxes(foreground(y_true, pred_threshold))
+    pred_boxes = extract_boxes(foreground(y_pred, pred_threshold))
+    ious = [iou_matrix(gt, pred) for gt, pred in zip(gt_boxes, pred_boxes)]
+
+    nb_gt = np.asarray([len(b) for b in gt_boxes])
+    nb_pred = np.asarray([len(b) for b in pred_boxes])
+    iou_thresholds = np.asarray(iou_thresholds, dtype=np.float64)
+
+    # (threshold, sample)
+    tp = np.asarray([[match_boxes(iou, threshold, method) for iou in ious] for threshold in iou_thresholds],
+                    dtype=np.int64).reshape((len(iou_thresholds), len(ious)))
+    fp = nb_pred[None, :] - tp
+    fn = nb_gt[None, :] - tp
+
+    per_sample = pd.DataFrame({
+        'Sample': np.tile(np.arange(len(ious)), len(iou_thresholds)),
+        'IoU Threshold': np.repeat(iou_thresholds, len(ious)),
+        'TP': tp.ravel(),
+        'FP': fp.ravel(),
+        'FN': fn.ravel(),
+    })
+
+    total_tp, total_fp, total_fn = tp.sum(axis=1), fp.sum(axis=1), fn.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        aggregate = pd.DataFrame({
+            'IoU Threshold': iou_thresholds,
+            'TP': total_tp,
+            'FP': total_fp,
+            'FN': total_fn,
+            'Precision': total_tp / (total_tp + total_fp),
+            'Recall': total_tp / (total_tp + total_fn),
+        })
+
+    return per_sample, aggregate
@@ -0,0 +1,191 @@
+"""
+Ocean mask rasterized once per (latitude, longitude) grid,
+so land/sea checks become array indexing instead of geometry work.
+"""
+from __future__ import annotations
+
+import hashlib
+import numpy as np
+import os
+import tempfile
+
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'tc_formation', 'land_sea_mask')
+
+# Where the ocean geometry is from:
+# * `global_land_mask`: the `global_land_mask` package, which is a 1km raster.
+# * `natural_earth`: Natural Earth 110m ocean polygons, read with `cartopy` and `fiona`.
+SOURCES = ('global_land_mask', 'natural_earth')
+
+
+class LandSeaMask:
+    """
+    Boolean ocean mask of shape (lat, lon) on the given grid.
+
+    Use `LandSeaMask.for_grid()` to create the mask,
+    which is rasterized only once per grid and source:
+    it is reused within the same process, and persisted to `cache_dir` to be reused across processes.
+    """
+
+    # Masks created in this process.
+    _created: dict[str, LandSeaMask] = {}
+
+    def __init__(self, latitudes: np.ndarray, longitudes: np.ndarray, ocean: np.ndarray):
+        assert ocean.shape == (len(latitudes), len(longitudes)), 'Ocean mask must be of shape (lat, lon).'
+        self._latitudes = np.asarray(latitudes, dtype=np.float64)
+        self._longitudes = np.asarray(longitudes, dtype=np.float64)
+        self._ocean = np.asarray(ocean, dtype=bool)
+
+    @property
+    def latitudes(self) -> np.ndarray:
+        return self._latitudes
+
+    @property
+    def longitudes(self) -> np.ndarray:
+        return self._longitudes
+
+    @property
+    def ocean(self) -> np.ndarray:
+        return self._ocean
+
+    @property
+    def land(self) -> np.ndarray:
+        return ~self._ocean
+
+    @classmethod
+    def for_grid(
+            cls,
+            latitudes: np.ndarray,
+            longitudes: np.ndarray,
+            source: str = 'global_land_mask',
+            cache_dir: str | None = DEFAULT_CACHE_DIR) -> LandSeaMask:
+        """
+        :param latitudes: latitudes of the grid.
+        :param longitudes: longitudes of the grid, either in 0 to 360E or -180W to 180E.
+        :param source: where the ocean geometry is from, see `SOURCES`.
+        :param cache_dir: where to persist the rasterized mask, None to disable.
+        """
+        assert source in SOURCES, f'Invalid source {source}, must be one of {SOURCES}'
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        key = _grid_key(latitudes, longitudes, source)
+
+        mask = cls._created.get(key)
+        if mask is not None:
+            return mask
+
+        path = None if cache_dir is None else os.path.join(cache_dir, f'{key}.npy')
+        if path is not None and os.path.isfile(path):
+            ocean = np.load(path)
+        else:
+            ocean = _RASTERIZERS[source](latitudes, longitudes)
+            if path is not None:
+                _save(path, ocean)
+
+        mask = cls(latitudes, longitudes, ocean)
+        cls._created[key] = mask
+        return mask
+
+    @classmethod
+    def global_mask(
+            cls,
+            resolution: float = 0.1,
+            source: str = 'natural_earth',
+            cache_dir: str | None = DEFAULT_CACHE_DIR) -> LandSeaMask:
+        """
+        Mask of the whole globe, for point queries at arbitrary positions.
+        """
+        latitudes = np.linspace(-90, 90, int(round(180 / resolution)) + 1)
+        longitudes = np.linspace(0, 360, int(round(360 / resolution)), endpoint=False)
+        return cls.for_grid(latitudes, longitudes, source=source, cache_dir=cache_dir)
+
+    def is_ocean(self, lat, lon):
+        """
+        Whether the given positions are on ocean,
+        answered by the nearest grid point of the mask.
+        Positions can be scalars or arrays of the same shape.
+        """
+        lat_idx = _nearest_index(self._latitudes, np.asarray(lat, dtype=np.float64))
+        lon_idx = _nearest_index(self._longitudes, self._wrap_longitudes(np.asarray(lon, dtype=np.float64)))
+        result = self._ocean[lat_idx, lon_idx]
+        return bool(result) if np.ndim(result) == 0 else result
+
+    def ocean_fraction(self, lat_slice: slice, lon_slice: slice) -> float:
+        """
+        Fraction of ocean grid points inside the given index slices.
+        """
+        return float(np.mean(self._ocean[lat_slice, lon_slice]))
+
+    def _wrap_longitudes(self, lon: np.ndarray) -> np.ndarray:
+        # Convert to the longitude convention of the grid.
+        if np.min(self._longitudes) >= 0:
+            return np.mod(lon, 360)
+
+        return np.where(lon >= 180, lon - 360, lon)
+
+
+def _to_180(longitudes: np.ndarray) -> np.ndarray:
+    # Both sources expect longitude from -180W to 180E,
+    # while our longitude is from 0 to 360.
+    return np.where(longitudes < 180, longitudes, longitudes - 360)
+
+
+def _rasterize_global_land_mask(latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    from global_land_mask import globe
+
+    lon, lat = np.meshgrid(_to_180(longitudes), latitudes)
+    return globe.is_ocean(lat, lon)
+
+
+def _rasterize_natural_earth(latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    import cartopy.io.shapereader as shpreader
+    import fiona
+    import shapely
+    import shapely.geometry as sgeom
+
+    with fiona.open(shpreader.natural_earth(resolution='110m', category='physical', name='ocean')) as geoms:
+        ocean = sgeom.MultiPolygon([sgeom.shape(geom['geometry']) for geom in geoms])
+
+    # Vectorized point-in-polygon over all grid points.
+    shapely.prepare(ocean)
+    lon, lat = np.meshgrid(_to_180(longitudes), latitudes)
+    return shapely.contains_xy(ocean, lon, lat)
+
+
+_RASTERIZERS = {
+    'global_land_mask': _rasterize_global_land_mask,
+    'natural_earth': _rasterize_natural_earth,
+}
+
+
+def _grid_key(latitudes: np.ndarray, longitudes: np.ndarray, source: str) -> str:
+    h = hashlib.sha256()
+    h.update(source.encode('utf-8'))
+    h.update(latitudes.tobytes())
+    h.update(longitudes.tobytes())
+    return h.hexdigest()
+
+
+def _nearest_index(axis: np.ndarray, values: np.ndarray) -> np.ndarray:
+    if axis[0] > axis[-1]:
+        # Descending axis.
+        return len(axis) - 1 - _nearest_index(axis[::-1], values)
+
+    right = np.clip(np.searchsorted(axis, values), 1, len(axis) - 1)
+    left = right - 1
+    return np.where(np.abs(values - axis[left]) <= np.abs(axis[right] - values), left, right)
+
+
+def _save(path: str, ocean: np.ndarray):
+    # Write to a temporary file first,
+    # so other processes never read a partially written mask.
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.npy')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, ocean)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -1,12 +1,13 @@
 from __future__ import annotations
 
 
+from functools import lru_cache
 import numpy as np
 import numpy.typing as npt
-from scipy.ndimage.interpolation import geometric_transform
+from scipy.ndimage import map_coordinates
 
 
-def cartesian_2_polar(img: npt.NDArray[np.float32], order=3):
+def cartesian_2_polar(img: npt.NDArray[np.float32], order=3, n_theta: int = 360):
     """
     This function will convert images in cartesian coordinate into polar coordinate.
     It does this by assuming that the origin of the polar coordinate is the center of the image.
@@ -14,24 +15,14 @@ def cartesian_2_polar(img: npt.NDArray[np.float32], order=3):
     so if the image is (H, W, C) then the output will be (radius, theta, C)
     """
     h, w, c = img.shape
-    w_center = w / 2
-    h_center = h / 2
 
     # Maximum radius is the half of the diagonal.
     max_radius = int(np.sqrt(h*h + w*w) / 2.)
 
-    def _polar_2_cartesian_coords(polar_coords):
-        radius, theta, c = polar_coords
-        theta = theta * np.pi / 180
-        y = h_center - radius * np.sin(theta)
-        x = w_center + radius * np.cos(theta)
-
-        return y, x, c
-
-    return geometric_transform(
+    y, x = _polar_sampling_coords(h, w, max_radius, n_theta)
+    return map_coordinates(
         img,
-        _polar_2_cartesian_coords,
-        output_shape=(max_radius, 360, c),
+        _with_channel_coords(y, x, c),
         order=order,
         mode='constant',
         cval=np.nan)
@@ -41,27 +32,57 @@ def polar_2_cartesian(img: npt.NDArray[np.float32], original_img_shape: tuple[in
     """
     This will perform the inverse operation of the above.
     """
-    assert img.shape[1] == 360, 'Theta must be 360 degrees.'
+    h, w, c = original_img_shape
+    radius, theta = _cartesian_sampling_coords(h, w, img.shape[1])
+    return map_coordinates(
+        img,
+        _with_channel_coords(radius, theta, c),
+        order=order,
+        mode='nearest')
+
+
+@lru_cache(maxsize=128)
+def _polar_sampling_coords(h: int, w: int, max_radius: int, n_theta: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    (y, x) position in the cartesian image of each (radius, theta) pixel of the polar image.
+    """
+    h_center, w_center = h / 2, w / 2
+    radius = np.arange(max_radius, dtype=np.float64)[:, None]
+    theta = np.arange(n_theta, dtype=np.float64)[None, :] * (2 * np.pi / n_theta)
+
+    y = h_center - radius * np.sin(theta)
+    x = w_center + radius * np.cos(theta)
+    return _read_only(y), _read_only(x)
+
 
-    h, w, _ = original_img_shape
+@lru_cache(maxsize=128)
+def _cartesian_sampling_coords(h: int, w: int, n_theta: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    (radius, theta) position in the polar image of each (y, x) pixel of the cartesian image.
+    """
     h_center, w_center = h / 2, w / 2
+    y, x = np.meshgrid(np.arange(h, dtype=np.float64), np.arange(w, dtype=np.float64), indexing='ij')
 
-    def _cartesian_2_polar_coords(cartesian_coord: tuple[int, int, int]):
-        y, x, c = cartesian_coord
+    radius = np.sqrt((h_center - y)**2 + (x - w_center)**2)
+    theta = np.arctan2(h_center - y, x - w_center)
 
-        radius = np.sqrt((h_center - y)**2 + (x - w_center)**2)
-        theta = np.arctan2(h_center - y, x - w_center)
+    # Convert theta to the index of the polar image.
+    theta = np.where(theta >= 0, theta, 2 * np.pi + theta) * (n_theta / (2 * np.pi))
+    return _read_only(radius), _read_only(theta)
 
-        # Convert theta to degrees.
-        theta = theta * 180. / np.pi
-        theta = theta if theta >= 0 else 360 + theta
 
-        # return 1, 1, 1
-        return radius, theta, c
+def _with_channel_coords(first: np.ndarray, second: np.ndarray, nb_channels: int) -> np.ndarray:
+    # All channels are sampled at the same positions,
+    # so they are transformed by a single `map_coordinates` call.
+    shape = first.shape + (nb_channels,)
+    return np.stack([
+        np.broadcast_to(first[..., None], shape),
+        np.broadcast_to(second[..., None], shape),
+        np.broadcast_to(np.arange(nb_channels, dtype=np.float64), shape),
+    ])
 
-    return geometric_transform(
-        img,
-        _cartesian_2_polar_coords,
-        output_shape=original_img_shape,
-        order=order,
-        mode='nearest')
+
+def _read_only(value: np.ndarray) -> np.ndarray:
+    # Coordinates are memoized, so they must not be modified by callers.
+    value.setflags(write=False)
+    return value
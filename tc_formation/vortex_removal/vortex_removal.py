@@ -1,35 +1,96 @@
+from collections import defaultdict
+from functools import lru_cache
 import numpy as np
-from typing import Tuple
+from typing import List, Sequence, Tuple
 import xarray as xr
 
 
 from . import polar_transformations as pt
 
 
-def remove_vortex_ds(dataset: xr.Dataset, centers: np.ndarray, radius: float) -> xr.Dataset:
-    dataset = dataset.copy(deep=True)
-    minlat = np.min(dataset.lat)
-    minlon = np.min(dataset.lon)
+# Smoothing parameters of Kurihara's basic field filter, applied in this order.
+_KURIHARA_M_VALUES = (2, 3, 4, 2, 5, 6, 7, 2, 8, 9, 2)
 
-    # Translate to pixel coordinates, (0, 0) at top-left corner.
-    centers = np.asarray(centers) - np.asarray([minlat, minlon])
+# How to obtain the analyzed vortex field from the disturbance field:
+# * `gaussian`: weight the disturbance field by a gaussian kernel, see `_obtain_analyzed_vortex_field_1()`.
+# * `polar`: Kurihara's filter in polar coordinate, see `_obtain_analyzed_vortex_field()`.
+ANALYZED_VORTEX_METHODS = ('gaussian', 'polar')
 
-    for variable, data in dataset.data_vars.items():
-        # print('Processing variable', variable)
-        data_values = data.values
-        if len(data_values.shape) > 2:
-            data_values = np.transpose(data_values, [1, 2, 0])
 
-        processed_data = remove_vortex(data_values, centers, radius)
+def remove_vortex_ds(dataset: xr.Dataset, centers: np.ndarray, radius: float, analyzed_vortex: str = 'gaussian') -> xr.Dataset:
+    return remove_vortex_ds_batch([dataset], [centers], radius, analyzed_vortex=analyzed_vortex)[0]
 
-        if len(processed_data.shape) > 2:
-            processed_data = np.transpose(processed_data, [2, 0, 1])
 
-        data = xr.DataArray(processed_data, coords=data.coords, dims=data.dims)
-        dataset[variable] = data
-        # break
+def remove_vortex_ds_batch(
+        datasets: Sequence[xr.Dataset],
+        centers: Sequence[np.ndarray],
+        radius: float,
+        analyzed_vortex: str = 'gaussian') -> List[xr.Dataset]:
+    """
+    Remove tropical cyclones vortex from many datasets of the same grid at once.
 
-    return dataset
+    All (lat, lon) variables of all datasets are stacked into one preallocated array
+    of shape (dataset, channel, lat, lon), which is updated in place,
+    so there is no deep copy of the datasets, nor a copy per variable.
+
+    Parameters
+    ----------
+        datasets: Sequence[xr.Dataset]
+            Datasets with the same variables and the same grid.
+        centers: Sequence[np.ndarray]
+            (lat, lon) positions of the tropical cyclone centers of each dataset.
+        radius: float
+            Radius of of the TC region to apply the removal algorithm.
+        analyzed_vortex: str
+            How to obtain the analyzed vortex field, see `ANALYZED_VORTEX_METHODS`.
+    """
+    if len(datasets) == 0:
+        return []
+
+    layout = _variables_layout(datasets[0])
+    nb_channels = sum(stop - start for _, start, stop in layout)
+    dtype = np.result_type(*(datasets[0][name].dtype for name, _, _ in layout))
+    grid_shape = datasets[0]['lat'].size, datasets[0]['lon'].size
+
+    fields = np.empty((len(datasets), nb_channels) + grid_shape, dtype=dtype)
+    pixel_centers = []
+    for i, dataset in enumerate(datasets):
+        for name, start, stop in layout:
+            fields[i, start:stop] = dataset[name].values.reshape((-1,) + grid_shape)
+
+        # Translate to pixel coordinates, (0, 0) at top-left corner.
+        minlat = np.min(dataset.lat.values)
+        minlon = np.min(dataset.lon.values)
+        pixel_centers.append(
+            np.asarray(centers[i], dtype=np.float64).reshape((-1, 2)) - np.asarray([minlat, minlon]))
+
+    remove_vortex_batch(fields, pixel_centers, radius, analyzed_vortex=analyzed_vortex, out=fields)
+
+    results = []
+    for i, dataset in enumerate(datasets):
+        data = {name: dataset[name].values for name in dataset.data_vars}
+        for name, start, stop in layout:
+            data[name] = fields[i, start:stop].reshape(dataset[name].shape).astype(dataset[name].dtype, copy=False)
+        results.append(dataset.copy(deep=False, data=data))
+
+    return results
+
+
+def _variables_layout(dataset: xr.Dataset) -> List[Tuple[str, int, int]]:
+    """
+    Channel range of each (lat, lon) variable in the stacked array.
+    """
+    layout = []
+    start = 0
+    for name, data in dataset.data_vars.items():
+        if data.dims[-2:] != ('lat', 'lon'):
+            continue
+
+        stop = start + int(np.prod(data.shape[:-2], dtype=np.int64))
+        layout.append((name, start, stop))
+        start = stop
+
+    return layout
 
 
 def remove_vortex(
@@ -37,14 +98,15 @@ def remove_vortex(
         centers: np.ndarray,
         radius: float,
         min_size: float = 3,
-        min_size_for_analyzed_vortex: float = 5) -> np.ndarray:
+        min_size_for_analyzed_vortex: float = 5,
+        analyzed_vortex: str = 'gaussian') -> np.ndarray:
     """
     Remove tropical cyclones vortex from the field.
 
     Parameters
     ----------
         field: np.ndarray
-            2D observation field.
+            2D observation field, or 3D field of shape (lat, lon, channel).
         centers: np.ndarray
             Position of the tropical cyclone centers.
         radius: float
@@ -53,6 +115,8 @@ def remove_vortex(
             Minimum domain size to be considered for vortex removal.
         min_size_for_analyzed_vortex: float
             Minimum domain size to be considered for analyzing vortex.
+        analyzed_vortex: str
+            How to obtain the analyzed vortex field, see `ANALYZED_VORTEX_METHODS`.
 
     Returns
     -------
@@ -60,51 +124,137 @@ def remove_vortex(
         The field with the same shape as the original field,
         but with TC removed.
     """
-    field = np.copy(field)
-    for center in centers:
-        x_min, x_max, y_min, y_max = _extract_centered_region_coords(field, center, radius)
-        if (x_max - x_min < min_size) or (y_max - y_min < min_size):
-            continue
+    fields = field[None, None] if field.ndim == 2 else np.moveaxis(field, -1, 0)[None]
+    fields = remove_vortex_batch(
+        fields, [centers], radius,
+        min_size=min_size,
+        min_size_for_analyzed_vortex=min_size_for_analyzed_vortex,
+        analyzed_vortex=analyzed_vortex)
+    return fields[0, 0] if field.ndim == 2 else np.moveaxis(fields[0], 0, -1)
+
+
+def remove_vortex_batch(
+        fields: np.ndarray,
+        centers: Sequence[np.ndarray],
+        radius: float,
+        min_size: float = 3,
+        min_size_for_analyzed_vortex: float = 5,
+        analyzed_vortex: str = 'gaussian',
+        out: np.ndarray = None) -> np.ndarray:
+    """
+    Remove tropical cyclones vortex from a batch of fields.
 
-        tc_field = field[x_min:x_max, y_min:y_max]
-        basic_field = _obtain_basic_field(tc_field)
-        # print('== center', center, 'xminmax', x_min, x_max, 'yminmax', y_min, y_max)
-        # print('tc_field', tc_field[:5, :5])
-        # print('basic field', basic_field[:5, :5])
-
-        # Maybe this assumption was not correct?
-        # We further assume that within this region,
-        # most of the disturbances are from the TC.
-        # Thus, the basic field is enough,
-        # no need to further extract the non-hurricane disturbance field.
-        # field[x_min:x_max, y_min:y_max] = basic_field
-
-        if (x_max - x_min < min_size_for_analyzed_vortex) or (y_max - y_min < min_size_for_analyzed_vortex):
-            field[x_min:x_max, y_min:y_max] = basic_field
-            continue
+    Parameters
+    ----------
+        fields: np.ndarray
+            Fields of shape (batch, channel, lat, lon).
+        centers: Sequence[np.ndarray]
+            Position (in pixel coordinates) of the tropical cyclone centers of each field.
+        analyzed_vortex: str
+            How to obtain the analyzed vortex field, see `ANALYZED_VORTEX_METHODS`.
+        out: np.ndarray
+            Where to write the result, can be `fields` itself to process in place.
+            Default to a copy of `fields`.
 
-        # TODO: probably in the beginning,
-        # the extracted field should be square.
-        # Then, if the domain size is too small (probably < 5-7 deg),
-        # we can assume that within the domain, most of the disturbance is from the TC,
-        # else we can have to subtract the analyzed vortex field.
-        disturbance_field = tc_field - basic_field
+    Returns
+    -------
+    np.ndarray
+        `out`, where TC vortices are removed.
+    """
+    assert analyzed_vortex in ANALYZED_VORTEX_METHODS, f'Invalid analyzed vortex method {analyzed_vortex}'
+
+    if out is None:
+        out = np.array(fields, copy=True)
+    elif out is not fields:
+        out[...] = fields
+
+    # Centers of the same field are processed one after another,
+    # as in the original algorithm, the next center sees the updated field.
+    # But centers of different fields are processed together,
+    # where regions of the same size are stacked and filtered at once.
+    nb_rounds = max((len(c) for c in centers), default=0)
+    for k in range(nb_rounds):
+        regions = defaultdict(list)
+        for i, field_centers in enumerate(centers):
+            if k >= len(field_centers):
+                continue
+
+            x_min, x_max, y_min, y_max = _extract_centered_region_coords(out[i, 0], field_centers[k], radius)
+            if (x_max - x_min < min_size) or (y_max - y_min < min_size):
+                continue
+
+            regions[(x_max - x_min, y_max - y_min)].append((i, x_min, x_max, y_min, y_max))
+
+        for (h, w), members in regions.items():
+            tc_fields = np.stack([out[i, :, x_min:x_max, y_min:y_max] for i, x_min, x_max, y_min, y_max in members])
+            basic_fields = _basic_fields(tc_fields)
+
+            if (h < min_size_for_analyzed_vortex) or (w < min_size_for_analyzed_vortex):
+                environmental_fields = basic_fields
+            else:
+                # The environmental field is the original field minus the analyzed vortex field.
+                disturbance_fields = tc_fields - basic_fields
+                environmental_fields = tc_fields - _analyzed_vortex_fields(disturbance_fields, analyzed_vortex)
+
+            for (i, x_min, x_max, y_min, y_max), environmental_field in zip(members, environmental_fields):
+                out[i, :, x_min:x_max, y_min:y_max] = environmental_field
+
+    return out
+
+
+def _analyzed_vortex_fields(disturbance_fields: np.ndarray, method: str) -> np.ndarray:
+    """
+    Analyzed vortex fields of a stack of disturbance fields of shape (..., channel, h, w).
+    """
+    h, w = disturbance_fields.shape[-2:]
+    if method == 'gaussian':
+        return disturbance_fields * _gauss_kernel(h, w, var=16)
+
+    # The polar transformations work with channel-last fields.
+    fields = disturbance_fields.reshape((-1, h, w))
+    vortex = _obtain_analyzed_vortex_field(np.moveaxis(fields, 0, -1))
+    return np.moveaxis(vortex, -1, 0).reshape(disturbance_fields.shape)
+
+
+@lru_cache(maxsize=None)
+def _kurihara_operator(n: int) -> np.ndarray:
+    """
+    Matrix of all smoothing stencils of Kurihara's filter along an axis of length `n`,
+    so that `operator @ x` is the same as applying the stencils one after another to `x`.
+    The end points are left unchanged.
+    """
+    operator = np.eye(n)
+    inner = np.arange(1, n - 1)
+    for m in _KURIHARA_M_VALUES:
+        K = .5 / (1 - np.cos(2 * np.pi / m))
+        stencil = np.eye(n)
+        stencil[inner, inner - 1] += K
+        stencil[inner, inner] -= 2 * K
+        stencil[inner, inner + 1] += K
+        operator = stencil @ operator
 
-        # Now, we will obtain the analyzed vortex field.
-        # analyzed_vortex_field = _obtain_analyzed_vortex_field(disturbance_field)
-        analyzed_vortex_field = _obtain_analyzed_vortex_field_1(disturbance_field)
+    operator.setflags(write=False)
+    return operator
 
-        # Then, the environmental field is the original field minus the vortex field.
-        environmental_field = tc_field - analyzed_vortex_field
 
-        # TODO: apply further smoothing the smooth the edges of the basic field.
+def _basic_fields(tc_fields: np.ndarray) -> np.ndarray:
+    """
+    Basic fields of a stack of fields of shape (..., h, w):
+    first smoothing along the zonal direction, then along the meridional direction.
+    """
+    h, w = tc_fields.shape[-2:]
+    return _kurihara_operator(h) @ tc_fields @ _kurihara_operator(w).T
 
-        # Finally, reassign the field.
-        field[x_min:x_max, y_min:y_max] = environmental_field
-        # field[x_min:x_max, y_min:y_max] = disturbance_field
-        # field[x_min:x_max, y_min:y_max] = analyzed_vortex_field
 
-    return field
+@lru_cache(maxsize=None)
+def _gauss_kernel(h: int, w: int, var: float) -> np.ndarray:
+    # This is the same kernel as in `_obtain_analyzed_vortex_field_1()`.
+    yy, xx = np.meshgrid(np.arange(w, dtype=np.float32), np.arange(h, dtype=np.float32))
+    yy -= h / 2.
+    xx -= w / 2.
+    kernel = np.exp(-(xx**2 + yy**2)/(2*var))
+    kernel.setflags(write=False)
+    return kernel
 
 
 def _extract_centered_region_coords(field: np.ndarray, center: Tuple[float, float], radius: float) -> Tuple[int, int, int, int]:
@@ -140,31 +290,17 @@ def _obtain_basic_field(tc_field: np.ndarray) -> np.ndarray:
     """
     Obtaining basic field as described in the paper by
     [Kurihara et al. 1993](https://journals.ametsoc.org/view/journals/mwre/121/7/1520-0493_1993_121_2030_aisohm_2_0_co_2.xml)
-    """
-    def apply_filter_first_dim(field: np.ndarray, m: float) -> np.ndarray:
-        """This will mutate the field parameter."""
-        K = .5 / (1 - np.cos(2 * np.pi / m))
-        field[1:-1] += K * (field[2:] + field[:-2] - 2 * field[1:-1])
-        return field
 
-    # In the paper,
-    # Kurihara shows the procedure as followed:
-    #
-    # 1. Iteratively smoothing along the zonal direction.
-    m_values = [2, 3, 4, 2, 5, 6, 7, 2, 8, 9, 2]
-    tc_field = np.copy(_transpose(tc_field))
-    for m in m_values:
-        tc_field = apply_filter_first_dim(tc_field, m)
-
-    # 2. Iteratively smoothing along the meridional direction.
-    tc_field = _transpose(tc_field)
-    for m in m_values:
-        tc_field = apply_filter_first_dim(tc_field, m)
+    In the paper,
+    Kurihara shows the procedure as followed:
+    1. Iteratively smoothing along the zonal direction.
+    2. Iteratively smoothing along the meridional direction.
+    Each of them is a linear operator, see `_kurihara_operator()`.
+    """
+    if tc_field.ndim == 2:
+        return _basic_fields(tc_field)
 
-    # why I didn't transpose again?
-    # Now I do, but why I didn't do it before?
-    # No, you shouldn't, because you've transposed before doing all these stuffs.
-    return tc_field
+    return np.moveaxis(_basic_fields(np.moveaxis(tc_field, -1, 0)), 0, -1)
 
 
 def _obtain_analyzed_vortex_field_1(disturbance_field: np.ndarray) -> np.ndarray:
@@ -208,17 +344,11 @@ def _obtain_analyzed_vortex_field(disturbance_field: np.ndarray) -> np.ndarray:
     # Adjust r.
     r = np.where(r > r0, r0, r)
 
-    print('w', w, 'h', h)
-    print('cartesian', disturbance_field[:5, :5])
-    print('polar', disturbance_field_polar[:5, :5])
-    print(disturbance_field_polar[r0, :5])
-
     # hd_bar has shape (theta, c)
     hD_bar = np.nansum(disturbance_field_polar[r0], axis=0) / (2 * np.pi)
     # E_r has shape (r,)
     E_r = ((np.exp(-(r0 - r)**2 / l**2) - np.exp(-r0**2/l**2))
             / (1. - np.exp(-r0**2/l**2)))
-    print(f'{r0=},\n{l=},\n{hD_bar=},\n{E_r=},\n')
 
     # Calculate the analyzed vortex field.
     analyzed_vortex_polar = disturbance_field_polar - (
@@ -226,12 +356,10 @@ def _obtain_analyzed_vortex_field(disturbance_field: np.ndarray) -> np.ndarray:
         + hD_bar[None, ...]*(1 - E_r[..., None, None]))
 
     # Return the analyzed vortex in the original coordinate.
-    print('analyzed vortex polar', analyzed_vortex_polar[:5, :5])
     analyzed_vortex = pt.polar_2_cartesian(
         analyzed_vortex_polar,
         disturbance_field.shape,
         order=1)
-    print('analyzed vortex', analyzed_vortex[:5, :5, 0])#, analyzed_vortex_polar[1, 1, 1])
 
     return analyzed_vortex if not has_2_dim else analyzed_vortex[..., 0]
 